@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CaliperTrackingConfig(AppConfig):
     name = 'openedx_caliper_tracking'
     verbose_name = "Open edX Caliper Tracking"
+
+    def ready(self):
+        from openedx_caliper_tracking.lookup_cache import connect_invalidation_signals
+        from openedx_caliper_tracking.url_templates import register_url_templates
+        connect_invalidation_signals()
+        register_url_templates()
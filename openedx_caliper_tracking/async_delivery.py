@@ -0,0 +1,162 @@
+"""
+asyncio based engine for delivering caliper events to the REST endpoint.
+
+The engine runs its own event loop in a dedicated thread so that many
+requests can be in flight at the same time without one thread per request.
+It requires the optional ``aiohttp`` package.
+"""
+import asyncio
+import logging
+import threading
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_IN_FLIGHT = 200
+DEFAULT_REQUEST_DEADLINE = 10  # in seconds
+DEFAULT_MAX_PENDING = 1000
+
+
+def is_async_delivery_available():
+    """
+    Return True if the packages required by the asyncio engine are installed.
+    """
+    return aiohttp is not None
+
+
+def _create_aiohttp_session(pool_size):
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=pool_size))
+
+
+class AsyncDeliveryEngine(object):
+    """
+    Send POST requests from a dedicated event loop thread.
+
+    At most ``max_in_flight`` requests are sent at the same time and every
+    request must finish within ``deadline`` seconds of being sent. The time
+    spent waiting for a free slot does not count towards the deadline.
+
+    At most ``max_pending`` requests are accepted, sent or waiting for a
+    slot, at the same time. ``submit`` blocks the calling thread beyond that.
+    """
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, deadline=DEFAULT_REQUEST_DEADLINE,
+                 max_pending=DEFAULT_MAX_PENDING, session_factory=None):
+        self.max_in_flight = max_in_flight
+        self.deadline = deadline
+        self.max_pending = max_pending
+        self.session_factory = session_factory or (lambda: _create_aiohttp_session(max_in_flight))
+
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._pending_lock = threading.Lock()
+        self.pending = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.timed_out = 0
+        self.failed = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name='caliper-async-delivery')
+        self._thread.daemon = True
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    async def _setup(self):
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._session = self.session_factory()
+
+    def submit(self, url, data, headers, callback):
+        """
+        Schedule a POST request without waiting for it.
+
+        ``callback`` is called from the event loop thread with the HTTP status
+        code of the response, 504 if the deadline was missed or 500 if the
+        request could not be sent.
+
+        Blocks while ``max_pending`` requests are pending.
+        """
+        self._pending.acquire()
+        with self._pending_lock:
+            self.pending += 1
+        try:
+            return asyncio.run_coroutine_threadsafe(self._send(url, data, headers, callback), self._loop)
+        except Exception:
+            self._release_pending()
+            raise
+
+    def _release_pending(self):
+        with self._pending_lock:
+            self.pending -= 1
+        self._pending.release()
+
+    async def _send(self, url, data, headers, callback):
+        try:
+            async with self._semaphore:
+                self.in_flight += 1
+                try:
+                    status_code = await asyncio.wait_for(self._post(url, data, headers), self.deadline)
+                    self.completed += 1
+                except asyncio.TimeoutError:
+                    status_code = 504
+                    self.timed_out += 1
+                except Exception as ex:  # pylint: disable=broad-except
+                    LOGGER.error('Could not send caliper events to {}: {}'.format(url, ex))
+                    status_code = 500
+                    self.failed += 1
+                finally:
+                    self.in_flight -= 1
+
+            try:
+                callback(status_code)
+            except Exception as ex:  # pylint: disable=broad-except
+                LOGGER.exception('Delivery callback failed: {}'.format(ex))
+        finally:
+            self._release_pending()
+
+    async def _post(self, url, data, headers):
+        async with self._session.post(url, data=data, headers=headers) as response:
+            await response.read()
+            return response.status
+
+    def get_stats(self):
+        """
+        Return the number of requests in flight and the request counters.
+        """
+        return {
+            'max_in_flight': self.max_in_flight,
+            'pending': self.pending,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'timed_out': self.timed_out,
+            'failed': self.failed,
+        }
+
+    def close(self, timeout=5):
+        """
+        Wait for the pending requests, close the session and stop the event loop.
+        """
+        if self._loop.is_closed():
+            return
+
+        async def _shutdown():
+            pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            if pending:
+                await asyncio.wait(pending, timeout=timeout)
+            await self._session.close()
+
+        try:
+            asyncio.run_coroutine_threadsafe(_shutdown(), self._loop).result(timeout + 1)
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.error('Could not shut down the async delivery engine cleanly: {}'.format(ex))
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self._loop.close()
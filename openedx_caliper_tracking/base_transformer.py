@@ -11,7 +11,7 @@ CALIPER_EVENT_CONTEXT = 'http://purl.imsglobal.org/ctx/caliper/v1p1'
 
 def base_transformer(event):
     """Transforms event into caliper format
-    @param event: unprocessed event dict
+    @param event: unprocessed event, a TrackingEvent
     """
     caliper_event = {}
 
@@ -0,0 +1,116 @@
+"""
+Buffer that groups items together and hands them over in batches.
+"""
+import logging
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class EventBatcher(object):
+    """
+    Collect items and pass them to ``flush_callback`` as a single list.
+
+    A batch is flushed as soon as it holds ``max_records`` items, its size
+    reaches ``max_bytes`` or its oldest item has waited ``max_wait_ms``. An
+    item that would take the batch over ``max_bytes`` starts a new batch.
+    """
+
+    def __init__(self, flush_callback, max_records=100, max_bytes=512 * 1024, max_wait_ms=1000):
+        self.flush_callback = flush_callback
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._items = []
+        self._size = 0
+        self._first_added_at = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._timer = None
+
+    def __len__(self):
+        with self._condition:
+            return len(self._items)
+
+    def add(self, item, size=0):
+        """
+        Add an item of the given size (in bytes) to the current batch.
+        """
+        batches = []
+        with self._condition:
+            if self._closed:
+                batches.append([item])
+            else:
+                if self._items and self._size + size > self.max_bytes:
+                    # Keep the batch under max_bytes unless a single item exceeds it.
+                    batches.append(self._take_batch())
+
+                self._items.append(item)
+                self._size += size
+                if self._first_added_at is None:
+                    self._first_added_at = time.time()
+                    self._start_timer()
+                    self._condition.notify()
+
+                if len(self._items) >= self.max_records or self._size >= self.max_bytes:
+                    batches.append(self._take_batch())
+
+        for batch in batches:
+            self._flush_batch(batch)
+
+    def flush(self):
+        """
+        Flush the current batch, if any, immediately.
+        """
+        with self._condition:
+            batch = self._take_batch()
+        if batch:
+            self._flush_batch(batch)
+
+    def close(self):
+        """
+        Flush the pending items and stop the timer thread.
+
+        Items added after closing are flushed immediately.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self.flush()
+
+    def _take_batch(self):
+        batch, self._items = self._items, []
+        self._size = 0
+        self._first_added_at = None
+        return batch
+
+    def _flush_batch(self, batch):
+        try:
+            self.flush_callback(batch)
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.exception('Could not flush a batch of {} items: {}'.format(len(batch), ex))
+
+    def _start_timer(self):
+        if self._timer is None or not self._timer.is_alive():
+            self._timer = threading.Thread(target=self._run_timer, name='caliper-batcher')
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run_timer(self):
+        while True:
+            with self._condition:
+                while self._first_added_at is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+
+                remaining = self._first_added_at + self.max_wait - time.time()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                batch = self._take_batch()
+
+            if batch:
+                self._flush_batch(batch)
@@ -0,0 +1,143 @@
+"""
+Helpers shared by the benchmark management commands.
+
+The benchmarks use the event fixtures shipped in ``tests/current``. Every
+fixture is caliperized with the transformers of this app. Transformers that
+need data of a running LMS (users, teams, URL patterns) fall back to the
+caliperized event recorded for the fixture in ``tests/expected``.
+"""
+import json
+import logging
+import os
+import queue
+import re
+import threading
+
+from openedx_caliper_tracking.base_transformer import base_transformer
+from openedx_caliper_tracking.caliper_config import EVENT_MAPPING
+from openedx_caliper_tracking.tasks import set_task_enqueuer
+from openedx_caliper_tracking.tracking_event import TrackingEvent
+
+LOGGER = logging.getLogger(__name__)
+
+FIXTURES_DIR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests')
+TIMESTAMP = re.compile(r'^\d{4}-\d\d-\d\d[T ]\d\d:\d\d')
+
+
+def load_fixture_events():
+    """
+    Return a list of ``(fixture name, raw event, caliperized event)`` tuples.
+    """
+    fixtures = []
+    current_dir = os.path.join(FIXTURES_DIR_PATH, 'current')
+    for name in sorted(os.listdir(current_dir)):
+        if not name.endswith('.json'):
+            continue
+
+        with open(os.path.join(current_dir, name)) as current:
+            event = json.loads(current.read())
+
+        try:
+            tracking_event = TrackingEvent(event)
+            caliper_event = EVENT_MAPPING[event['event_type']](tracking_event, base_transformer(tracking_event))
+        except Exception:  # pylint: disable=broad-except
+            with open(os.path.join(FIXTURES_DIR_PATH, 'expected', name)) as expected:
+                caliper_event = json.loads(expected.read())
+
+        fixtures.append((name[:-len('.json')], event, caliper_event))
+    return fixtures
+
+
+def load_fixture_timestamps():
+    """
+    Return every timestamp string found in the raw fixture events.
+    """
+    timestamps = []
+    values = [event for _, event, _ in load_fixture_events()]
+    while values:
+        value = values.pop()
+        if isinstance(value, dict):
+            values.extend(value.values())
+        elif isinstance(value, list):
+            values.extend(value)
+        elif isinstance(value, str) and TIMESTAMP.match(value):
+            timestamps.append(value)
+    return sorted(timestamps)
+
+
+def load_transformable_events():
+    """
+    Return the raw fixture events that the transformers can caliperize in the current environment.
+    """
+    events = []
+    for _, event, _ in load_fixture_events():
+        try:
+            tracking_event = TrackingEvent(json.loads(json.dumps(event)))
+            EVENT_MAPPING[event['event_type']](tracking_event, base_transformer(tracking_event))
+        except Exception:  # pylint: disable=broad-except
+            continue
+        events.append(event)
+    return events
+
+
+class InlineCeleryWorker(object):
+    """
+    Run the delivery tasks enqueued with ``tasks.enqueue_task`` in a thread of the current process.
+
+    Used as a context manager, it is set as the enqueuer of the delivery
+    tasks so that the benchmarks do not need a Celery broker. The given
+    tasks are run by the worker, any other task is handed over to Celery.
+    The size of the arguments of the enqueued tasks, serialized as JSON, is
+    counted in ``bytes_enqueued``. Tasks that raise are logged and counted
+    in ``failed``.
+    """
+
+    def __init__(self, *tasks):
+        self.tasks = tasks
+        self.enqueued = 0
+        self.bytes_enqueued = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._previous_enqueuer = None
+        self._thread = threading.Thread(target=self._run, name='caliper-inline-celery-worker')
+        self._thread.daemon = True
+
+    def enqueue(self, task, *args):
+        """
+        Queue a task for the worker thread.
+        """
+        if task not in self.tasks:
+            return task.delay(*args)
+        self.enqueued += 1
+        self.bytes_enqueued += len(json.dumps(args))
+        self._queue.put((task, args))
+
+    def _run(self):
+        while True:
+            task, args = self._queue.get()
+            try:
+                if task is None:
+                    return
+                task(*args)
+            except Exception as ex:  # pylint: disable=broad-except
+                self.failed += 1
+                LOGGER.exception('Inline run of task {} failed: {}'.format(task.name, ex))
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """
+        Wait until the enqueued tasks have run.
+        """
+        self._queue.join()
+
+    def __enter__(self):
+        self._previous_enqueuer = set_task_enqueuer(self.enqueue)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.join()
+        self._queue.put((None, None))
+        self._thread.join()
+        set_task_enqueuer(self._previous_enqueuer)
@@ -1,4 +1,5 @@
 from openedx_caliper_tracking import transformers as ctf
+from openedx_caliper_tracking.dispatcher import PRIORITY_HIGH, PRIORITY_LOW
 
 """
 Mapping of events to their transformer functions
@@ -201,3 +202,47 @@ EVENT_MAPPING = {
     'edx.bi.user.org_email.opted_in': ctf.edx_bi_user_org_email_events,
     'edx.bi.verify.submitted': ctf.edx_bi_verify_submitted,
 }
+
+"""
+Delivery priority of events, events not listed here are of normal priority.
+
+Under backpressure the REST dispatcher sheds low priority events first.
+"""
+
+EVENT_PRIORITIES = {
+    'edx.certificate.created': PRIORITY_HIGH,
+    'edx.course.enrollment.activated': PRIORITY_HIGH,
+    'edx.course.enrollment.deactivated': PRIORITY_HIGH,
+    'edx.course.enrollment.mode_changed': PRIORITY_HIGH,
+    'edx.course.enrollment.upgrade.succeeded': PRIORITY_HIGH,
+    'edx.grades.problem.rescored': PRIORITY_HIGH,
+    'edx.grades.problem.score_overridden': PRIORITY_HIGH,
+    'edx.grades.problem.state_deleted': PRIORITY_HIGH,
+    'edx.grades.problem.submitted': PRIORITY_HIGH,
+    'edx.special_exam.timed.attempt.submitted': PRIORITY_HIGH,
+    'openassessmentblock.create_submission': PRIORITY_HIGH,
+    'problem_check': PRIORITY_HIGH,
+    'problem_graded': PRIORITY_HIGH,
+    'problem_rescore': PRIORITY_HIGH,
+
+    'edx.ui.lms.link_clicked': PRIORITY_LOW,
+    'hide_transcript': PRIORITY_LOW,
+    'page_close': PRIORITY_LOW,
+    'seek_video': PRIORITY_LOW,
+    'show_transcript': PRIORITY_LOW,
+    'speed_change_video': PRIORITY_LOW,
+    'textbook.pdf.chapter.navigated': PRIORITY_LOW,
+    'textbook.pdf.display.scaled': PRIORITY_LOW,
+    'textbook.pdf.outline.toggled': PRIORITY_LOW,
+    'textbook.pdf.page.navigated': PRIORITY_LOW,
+    'textbook.pdf.page.scrolled': PRIORITY_LOW,
+    'textbook.pdf.search.highlight.toggled': PRIORITY_LOW,
+    'textbook.pdf.search.navigatednext': PRIORITY_LOW,
+    'textbook.pdf.searchcasesensitivity.toggled': PRIORITY_LOW,
+    'textbook.pdf.thumbnail.navigated': PRIORITY_LOW,
+    'textbook.pdf.thumbnails.toggled': PRIORITY_LOW,
+    'textbook.pdf.zoom.buttons.changed': PRIORITY_LOW,
+    'textbook.pdf.zoom.menu.changed': PRIORITY_LOW,
+    'video_hide_cc_menu': PRIORITY_LOW,
+    'video_show_cc_menu': PRIORITY_LOW,
+}
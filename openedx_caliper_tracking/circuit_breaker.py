@@ -0,0 +1,115 @@
+"""
+Circuit breaker protecting the delivery of events from a failing endpoint.
+"""
+import logging
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30  # in seconds
+DEFAULT_HALF_OPEN_CALLS = 1
+
+
+class CircuitBreaker(object):
+    """
+    Closed, open and half-open circuit breaker.
+
+    The circuit opens after ``failure_threshold`` consecutive failures. While
+    it is open requests are refused until ``reset_timeout`` seconds have
+    passed, then up to ``half_open_calls`` trial requests are let through at
+    a time. A successful trial closes the circuit, a failed one opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT,
+                 half_open_calls=DEFAULT_HALF_OPEN_CALLS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trials = 0
+
+        self.short_circuited = 0
+        self.transitions = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def allow_request(self):
+        """
+        Return True if a request may be sent now.
+        """
+        with self._lock:
+            if self._state == STATE_OPEN:
+                if time.time() < self._opened_at + self.reset_timeout:
+                    self.short_circuited += 1
+                    return False
+                self._transition(STATE_HALF_OPEN)
+
+            if self._state == STATE_HALF_OPEN:
+                if self._trials >= self.half_open_calls:
+                    self.short_circuited += 1
+                    return False
+                self._trials += 1
+
+            return True
+
+    def record_success(self):
+        """
+        Record a request that reached the endpoint.
+        """
+        with self._lock:
+            self._failures = 0
+            if self._state == STATE_HALF_OPEN:
+                self._trials = max(self._trials - 1, 0)
+                self._transition(STATE_CLOSED)
+
+    def record_failure(self):
+        """
+        Record a request that failed because of the endpoint.
+        """
+        with self._lock:
+            self._failures += 1
+            if self._state == STATE_HALF_OPEN:
+                self._trials = max(self._trials - 1, 0)
+                self._transition(STATE_OPEN)
+            elif self._state == STATE_CLOSED and self._failures >= self.failure_threshold:
+                self._transition(STATE_OPEN)
+
+    def _transition(self, state):
+        previous, self._state = self._state, state
+        self.transitions += 1
+        if state == STATE_OPEN:
+            self._opened_at = time.time()
+            self._trials = 0
+            LOGGER.error('Circuit breaker for {} is now open after {} consecutive failures ({} -> {}).'.format(
+                self.name, self._failures, previous, state))
+        elif state == STATE_HALF_OPEN:
+            self._trials = 0
+            LOGGER.warning('Circuit breaker for {} is now half-open, probing the endpoint.'.format(self.name))
+        else:
+            LOGGER.info('Circuit breaker for {} is now closed, the endpoint has recovered.'.format(self.name))
+
+    def get_stats(self):
+        """
+        Return the state and the counters of the circuit breaker.
+        """
+        with self._lock:
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'short_circuited': self.short_circuited,
+                'transitions': self.transitions,
+            }
@@ -0,0 +1,83 @@
+"""
+Compression of the request bodies sent to the REST endpoint.
+
+``gzip`` is always available, ``zstd`` requires the optional ``zstandard`` package.
+"""
+import gzip
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+COMPRESSION_ENCODINGS = (GZIP, ZSTD)
+
+DEFAULT_COMPRESSION_LEVELS = {
+    GZIP: 6,
+    ZSTD: 3,
+}
+DEFAULT_COMPRESSION_MIN_BYTES = 1024
+
+_ZSTD_COMPRESSORS = threading.local()
+
+
+def is_compression_available(encoding):
+    """
+    Return True if the given content encoding can be used.
+    """
+    if encoding == GZIP:
+        return True
+    if encoding == ZSTD:
+        return zstandard is not None
+    return False
+
+
+def _get_zstd_compressor(level):
+    # ZstdCompressor objects must not be shared between threads.
+    compressors = getattr(_ZSTD_COMPRESSORS, 'compressors', None)
+    if compressors is None:
+        compressors = _ZSTD_COMPRESSORS.compressors = {}
+    if level not in compressors:
+        compressors[level] = zstandard.ZstdCompressor(level=level)
+    return compressors[level]
+
+
+def compress(payload, encoding, level=None):
+    """
+    Compress the payload with the given content encoding.
+
+    @params
+    payload: (bytes) data to compress
+    encoding: (str) either "gzip" or "zstd"
+    level: (int) compression level, the default level of the encoding if None
+    """
+    if level is None:
+        level = DEFAULT_COMPRESSION_LEVELS[encoding]
+
+    if encoding == GZIP:
+        return gzip.compress(payload, compresslevel=level)
+    if encoding == ZSTD:
+        return _get_zstd_compressor(level).compress(payload)
+    raise ValueError('Unknown content encoding: {}'.format(encoding))
+
+
+def compress_request_body(payload, headers, encoding, level=None, min_bytes=DEFAULT_COMPRESSION_MIN_BYTES):
+    """
+    Return the request body and headers, compressed if the body is large enough.
+
+    @params
+    payload: (bytes) request body
+    headers: (dict) request headers, left unchanged
+    encoding: (str) either "gzip" or "zstd"
+    level: (int) compression level
+    min_bytes: (int) bodies smaller than this are sent uncompressed
+    """
+    if not encoding or len(payload) < min_bytes:
+        return payload, headers
+
+    headers = dict(headers)
+    headers['Content-Encoding'] = encoding
+    return compress(payload, encoding, level), headers
@@ -0,0 +1,468 @@
+"""
+Dead letters of the caliper events that could not be delivered to Kafka.
+
+Once the retries of an event are exhausted, the event is stored along with
+the reason of its failure in a dead-letter topic (``DEAD_LETTER_TOPIC``), in
+local segment files (``DEAD_LETTER_DIRECTORY``) or in both, in addition to
+the ``caliper_delivery_failure`` log. The ``caliper_replay_dead_letters``
+management command sends them again to the topics they were meant for.
+
+Dead letters are written to the segment files first. They are sent to the
+dead-letter topic from a thread of their own, with a producer created by
+that thread and that never blocks on a full buffer: a failed delivery is
+reported from the I/O thread of the producer of the events, which must not
+wait on itself, and while the brokers are unreachable.
+
+Segment files hold a JSON dead letter per line. Every process appends to the
+active segment under an exclusive lock, and a replay seals the active
+segment by renaming it before reading it, so that dead letters written in
+the meantime start a new active segment.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from kafka import KafkaConsumer
+from kafka.errors import KafkaError, KafkaTimeoutError
+from kafka.structs import OffsetAndMetadata
+
+from openedx_caliper_tracking.kafka_utils import (create_kafka_producer, get_kafka_producer_configurations,
+                                                  get_message_key, get_topic_name, send_caliper_event)
+from openedx_caliper_tracking.process_local import ProcessLocal
+from openedx_caliper_tracking.utils import convert_datetime
+
+LOGGER = logging.getLogger(__name__)
+
+ACTIVE_SEGMENT = 'active.jsonl'
+SEGMENT_SUFFIX = '.jsonl'
+OFFSET_SUFFIX = '.offset'
+
+DEFAULT_REPLAY_RATE = 100  # events per second
+DEFAULT_REPLAY_BATCH_SIZE = 100
+DEFAULT_REPLAY_CONSUMER_GROUP = 'caliper-dead-letter-replay'
+REPLAY_POLL_TIMEOUT = 5000  # in ms
+DEFAULT_DEAD_LETTER_QUEUE_SIZE = 10000
+
+
+def get_dead_letter_topic():
+    """
+    Return the dead-letter topic, or None if dead letters are not sent to Kafka.
+    """
+    return getattr(settings, 'CALIPER_KAFKA_SETTINGS', {}).get('DEAD_LETTER_TOPIC')
+
+
+def get_dead_letter_directory():
+    """
+    Return the directory of the dead-letter segments, or None if they are not stored locally.
+    """
+    return getattr(settings, 'CALIPER_KAFKA_SETTINGS', {}).get('DEAD_LETTER_DIRECTORY')
+
+
+def make_dead_letter(event, event_type, error, attempts):
+    """
+    Return the dead letter of an event along with its failure metadata.
+
+    @params
+    event: (dict) caliperized event
+    event_type: (str) type of the event
+    error: (str) name of the error the delivery failed with
+    attempts: (int) number of delivery attempts made
+    """
+    return {
+        'event': event,
+        'event_type': event_type,
+        'topic': get_topic_name(event_type),
+        'error': error,
+        'attempts': attempts,
+        'failed_at': convert_datetime(datetime.now(timezone.utc)),
+    }
+
+
+class DeadLetterSegments(object):
+    """
+    Segment files holding a JSON dead letter per line.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def active_path(self):
+        return os.path.join(self.directory, ACTIVE_SEGMENT)
+
+    def _open_active_segment(self):
+        """
+        Open the active segment locked, making sure it has not been sealed in the meantime.
+        """
+        while True:
+            segment = open(self.active_path, 'a')
+            fcntl.flock(segment, fcntl.LOCK_EX)
+            try:
+                if os.fstat(segment.fileno()).st_ino == os.stat(self.active_path).st_ino:
+                    return segment
+            except OSError:
+                pass
+            segment.close()
+
+    def append(self, dead_letters):
+        """
+        Append dead letters to the active segment.
+        """
+        with self._open_active_segment() as segment:
+            segment.write(''.join(json.dumps(dead_letter) + '\n' for dead_letter in dead_letters))
+            segment.flush()
+
+    def seal(self):
+        """
+        Rename the active segment so that it can be replayed, if it holds any dead letter.
+        """
+        with self._open_active_segment() as segment:
+            if not os.fstat(segment.fileno()).st_size:
+                return
+            # time_ns keeps the sealed segments ordered by name.
+            os.rename(self.active_path, os.path.join(
+                self.directory, '{:020d}{}'.format(time.time_ns(), SEGMENT_SUFFIX)))
+
+    def sealed_segments(self):
+        """
+        Return the paths of the sealed segments, oldest first.
+        """
+        return [
+            os.path.join(self.directory, name) for name in sorted(os.listdir(self.directory))
+            if name.endswith(SEGMENT_SUFFIX) and name != ACTIVE_SEGMENT
+        ]
+
+    def read(self, path):
+        """
+        Yield the ``(offset, dead letter)`` pairs of a sealed segment not replayed yet.
+
+        ``offset`` is the position following the dead letter, to pass to ``commit``.
+        """
+        with open(path, 'rb') as segment:
+            segment.seek(self._load_offset(path))
+            for line in iter(segment.readline, b''):
+                try:
+                    dead_letter = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    LOGGER.error('Skipping malformed dead letter in {}.'.format(path))
+                    continue
+                yield segment.tell(), dead_letter
+
+    def commit(self, path, offset):
+        """
+        Persist the position up to which a sealed segment has been replayed.
+        """
+        with open(path + OFFSET_SUFFIX + '.tmp', 'w') as offset_file:
+            offset_file.write(str(offset))
+        os.replace(path + OFFSET_SUFFIX + '.tmp', path + OFFSET_SUFFIX)
+
+    def remove(self, path):
+        """
+        Delete a fully replayed segment.
+        """
+        for name in (path, path + OFFSET_SUFFIX):
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+    def _load_offset(self, path):
+        try:
+            with open(path + OFFSET_SUFFIX) as offset_file:
+                return int(offset_file.read())
+        except (IOError, OSError, ValueError):
+            return 0
+
+
+def write_dead_letter(event, event_type, error, attempts):
+    """
+    Store an event whose retries are exhausted in the configured dead-letter destinations.
+
+    @params
+    event: (dict) caliperized event
+    event_type: (str) type of the event
+    error: (str) name of the error the delivery failed with
+    attempts: (int) number of delivery attempts made
+    """
+    topic = get_dead_letter_topic()
+    directory = get_dead_letter_directory()
+    if not topic and not directory:
+        return
+
+    dead_letter = make_dead_letter(event, event_type, error, attempts)
+    if directory:
+        try:
+            DeadLetterSegments(directory).append([dead_letter])
+        except (IOError, OSError) as ex:
+            LOGGER.error('Could not write dead letter of event ({}) to {}: {}'.format(event_type, directory, ex))
+
+    if topic:
+        try:
+            get_dead_letter_sender().submit(topic, dead_letter, get_message_key(event))
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.error('Could not send dead letter of event ({}) to kafka topic {}: {}'.format(
+                event_type, topic, ex.__class__.__name__))
+
+
+class DeadLetterSender(object):
+    """
+    Thread sending dead letters to the dead-letter topic with a producer of its own.
+
+    ``submit`` never blocks. Dead letters that do not fit in the queue, or in
+    the buffer of the producer (``max_block_ms`` is 0), are logged and dropped.
+    The producer is created by the sender thread when it gets its first dead
+    letter, and again for the next one if it could not be created.
+    """
+
+    def __init__(self, configurations, producer_class=None, queue_size=DEFAULT_DEAD_LETTER_QUEUE_SIZE):
+        self.configurations = dict(configurations, max_block_ms=0)
+        self.producer_class = producer_class
+        self.producer = None
+        self.dropped = 0
+
+        self._queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._run, name='caliper-dead-letter-sender')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, topic, dead_letter, key=None):
+        """
+        Queue a dead letter for the sender thread.
+        """
+        try:
+            self._queue.put_nowait((topic, dead_letter, key))
+        except queue.Full:
+            self._log_dropped(dead_letter, topic, 'queue is full')
+
+    def _log_dropped(self, dead_letter, topic, reason):
+        self.dropped += 1
+        LOGGER.error('Could not send dead letter of event ({}) to kafka topic {}: {}'.format(
+            dead_letter['event_type'], topic, reason))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                topic, dead_letter, key = item
+                try:
+                    if self.producer is None:
+                        self.producer = create_kafka_producer(self.configurations, self.producer_class)
+                    future = self.producer.send(topic, dead_letter, key=key)
+                except Exception as ex:  # pylint: disable=broad-except
+                    self._log_dropped(dead_letter, topic, ex.__class__.__name__)
+                    continue
+                future.add_errback(
+                    lambda ex, dead_letter=dead_letter, topic=topic: self._log_dropped(
+                        dead_letter, topic, ex.__class__.__name__)
+                )
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout=None):
+        """
+        Wait until the queued dead letters are handed to the producer and flushed.
+        """
+        self._queue.join()
+        if self.producer is not None:
+            self.producer.flush(timeout)
+
+    def close(self, timeout=5):
+        """
+        Send the queued dead letters and stop the sender thread.
+        """
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self.producer is None:
+            return
+        try:
+            self.producer.close(timeout=timeout)
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.error('Could not close the dead-letter producer cleanly: {}'.format(ex))
+
+
+_DEAD_LETTER_SENDER = ProcessLocal(DeadLetterSender, on_discard=lambda sender: sender.close())
+
+
+def get_dead_letter_sender():
+    """
+    Return the dead-letter sender of the current process.
+    """
+    return _DEAD_LETTER_SENDER.get((
+        get_kafka_producer_configurations(),
+        settings.CALIPER_KAFKA_SETTINGS.get('PRODUCER_CLASS'),
+        settings.CALIPER_KAFKA_SETTINGS.get('DEAD_LETTER_QUEUE_MAX', DEFAULT_DEAD_LETTER_QUEUE_SIZE),
+    ))
+
+
+def stop_dead_letter_sender():
+    """
+    Send the queued dead letters and stop the dead-letter sender of the current process, if any.
+    """
+    _DEAD_LETTER_SENDER.reset()
+
+
+atexit.register(stop_dead_letter_sender)
+
+
+class DeadLetterReplayer(object):
+    """
+    Send dead letters back to their topics in batches, at most ``rate`` events per second.
+
+    Dead letters that fail again are written back to the dead-letter
+    destinations with one more attempt.
+    """
+
+    def __init__(self, producer, rate=DEFAULT_REPLAY_RATE, batch_size=DEFAULT_REPLAY_BATCH_SIZE):
+        self.producer = producer
+        self.rate = rate
+        self.batch_size = batch_size
+        self.replayed = 0
+        self.failed = 0
+        self._started = None
+        self._handled = 0
+
+    def replay_batch(self, dead_letters):
+        """
+        Replay a batch of dead letters. Returns the number of them delivered.
+        """
+        if self._started is None:
+            self._started = time.monotonic()
+
+        sent = []
+        failed = []
+        for dead_letter in dead_letters:
+            event = dead_letter['event']
+            topic = dead_letter.get('topic') or get_topic_name(dead_letter.get('event_type'))
+            try:
+                sent.append((dead_letter, send_caliper_event(self.producer, topic, event)))
+            except KafkaError as error:
+                failed.append((dead_letter, error))
+
+        if sent:
+            self.producer.flush()
+        for dead_letter, future in sent:
+            if not (future.is_done and future.succeeded()):
+                failed.append((dead_letter, future.exception or KafkaTimeoutError()))
+
+        for dead_letter, error in failed:
+            write_dead_letter(
+                dead_letter['event'],
+                dead_letter.get('event_type'),
+                error.__class__.__name__,
+                dead_letter.get('attempts', 0) + 1,
+            )
+
+        delivered = len(dead_letters) - len(failed)
+        self.replayed += delivered
+        self.failed += len(failed)
+        self._throttle(len(dead_letters))
+        return delivered
+
+    def _throttle(self, count):
+        self._handled += count
+        if not self.rate:
+            return
+        delay = self._started + self._handled / float(self.rate) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def replay_segments(self, segments, max_events=None):
+        """
+        Replay the dead letters of local segments, sealing the active segment first.
+
+        Stops early if a whole batch fails, as the brokers are most likely still unreachable.
+        """
+        segments.seal()
+        for path in segments.sealed_segments():
+            batch = []
+            for offset, dead_letter in segments.read(path):
+                batch.append(dead_letter)
+                if len(batch) == self.batch_size or self._is_limit_reached(len(batch), max_events):
+                    if not self._replay_and_commit(segments, path, offset, batch):
+                        return False
+                    batch = []
+                    if self._is_limit_reached(0, max_events):
+                        return True
+
+            if batch and not self._replay_and_commit(segments, path, offset, batch):
+                return False
+            segments.remove(path)
+        return True
+
+    def _replay_and_commit(self, segments, path, offset, batch):
+        delivered = self.replay_batch(batch)
+        segments.commit(path, offset)
+        return delivered > 0
+
+    def replay_topic(self, consumer, max_events=None):
+        """
+        Replay the dead letters of the dead-letter topic up to the end offsets it had when the replay started.
+
+        Dead letters that fail again are written back to the topic after
+        those offsets, they are left to the next replay. The offsets of the
+        consumer group are committed after every batch.
+        """
+        end_offsets = None
+        while not self._is_limit_reached(0, max_events):
+            max_records = self.batch_size
+            if max_events:
+                max_records = min(max_records, max_events - self.replayed - self.failed)
+            records = consumer.poll(timeout_ms=REPLAY_POLL_TIMEOUT, max_records=max_records)
+            if end_offsets is None:
+                end_offsets = consumer.end_offsets(list(consumer.assignment()))
+
+            batch = {}
+            skipped = False
+            for partition, partition_records in records.items():
+                kept = [record for record in partition_records if record.offset < end_offsets.get(partition, 0)]
+                skipped = skipped or len(kept) < len(partition_records)
+                if kept:
+                    batch[partition] = kept
+                if partition in end_offsets and consumer.position(partition) >= end_offsets[partition]:
+                    consumer.pause(partition)
+
+            dead_letters = [record.value for partition_records in batch.values() for record in partition_records]
+            if not dead_letters:
+                if skipped:
+                    continue
+                return True
+
+            delivered = self.replay_batch(dead_letters)
+            consumer.commit(dict(
+                (partition, OffsetAndMetadata(partition_records[-1].offset + 1, None))
+                for partition, partition_records in batch.items()
+            ))
+            if not delivered:
+                return False
+        return True
+
+    def _is_limit_reached(self, pending, max_events):
+        return bool(max_events) and self.replayed + self.failed + pending >= max_events
+
+
+def get_dead_letter_consumer(topic, group_id=DEFAULT_REPLAY_CONSUMER_GROUP):
+    """
+    Return a KafkaConsumer of the dead-letter topic using the connection settings of the producer.
+    """
+    configurations = dict(
+        (key, value) for key, value in get_kafka_producer_configurations().items()
+        if key in KafkaConsumer.DEFAULT_CONFIG
+    )
+    return KafkaConsumer(
+        topic,
+        group_id=group_id,
+        enable_auto_commit=False,
+        auto_offset_reset='earliest',
+        value_deserializer=lambda v: json.loads(v.decode('utf-8')),
+        **configurations
+    )
@@ -0,0 +1,145 @@
+"""
+Process wide HTTP client used to deliver caliper events to the REST endpoint.
+
+A single ``requests.Session`` is kept per process so that the TCP/TLS
+connections to ``CALIPER_DELIVERY_ENDPOINT`` are reused between events.
+The client is rebuilt automatically after a fork or a configuration change.
+"""
+import logging
+import os
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from openedx_caliper_tracking.process_local import ProcessLocal
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 3.05  # in seconds
+DEFAULT_READ_TIMEOUT = 5  # in seconds
+
+KAFKA_REST_CONTENT_TYPE = 'application/vnd.kafka.json.v2+json'
+
+
+def get_delivery_settings():
+    """
+    Return the optional ``CALIPER_DELIVERY_SETTINGS`` dict.
+    """
+    return getattr(settings, 'CALIPER_DELIVERY_SETTINGS', None) or {}
+
+
+def get_delivery_headers(content_type=KAFKA_REST_CONTENT_TYPE):
+    """
+    Return the headers required by the REST endpoint.
+    """
+    return {
+        'Authorization': 'Bearer {}'.format(settings.CALIPER_DELIVERY_AUTH_TOKEN),
+        'Content-Type': content_type,
+    }
+
+
+class CaliperDeliveryClient(object):
+    """
+    Keep-alive HTTP client with a bounded connection pool and default timeouts.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT):
+        self.pid = os.getpid()
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+        self._stats_lock = threading.Lock()
+        self.requests_sent = 0
+        self.requests_failed = 0
+
+    def post(self, url, **kwargs):
+        """
+        Send a POST request using the pooled session.
+
+        The configured timeouts are used unless ``timeout`` is given explicitly.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        try:
+            response = self.session.post(url, **kwargs)
+        except requests.exceptions.RequestException:
+            with self._stats_lock:
+                self.requests_failed += 1
+            raise
+
+        with self._stats_lock:
+            self.requests_sent += 1
+        return response
+
+    def get_pool_stats(self):
+        """
+        Return a dict describing the state of the connection pools.
+        """
+        pools = []
+        pool_manager = self.adapter.poolmanager
+        for key in list(pool_manager.pools.keys()):
+            pool = pool_manager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                'host': pool.host,
+                'port': pool.port,
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle_connections': sum(1 for conn in list(pool.pool.queue) if conn is not None),
+            })
+
+        with self._stats_lock:
+            return {
+                'pid': self.pid,
+                'pool_size': self.pool_size,
+                'requests_sent': self.requests_sent,
+                'requests_failed': self.requests_failed,
+                'pools': pools,
+            }
+
+    def close(self):
+        """
+        Close all the pooled connections.
+        """
+        self.session.close()
+
+
+def _close_client(client):
+    client.close()
+
+
+_CLIENT = ProcessLocal(CaliperDeliveryClient, on_discard=_close_client)
+
+
+def get_delivery_client():
+    """
+    Return the delivery client of the current process.
+
+    A new client is created lazily on first use, in a forked child process
+    and whenever the configuration in ``CALIPER_DELIVERY_SETTINGS`` changes.
+    """
+    delivery_settings = get_delivery_settings()
+    return _CLIENT.get((
+        delivery_settings.get('POOL_SIZE', DEFAULT_POOL_SIZE),
+        delivery_settings.get('CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+        delivery_settings.get('READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+    ))
+
+
+def reset_delivery_client():
+    """
+    Drop the delivery client of the current process.
+
+    The connections inherited from a parent process are not closed because
+    the parent process may still be using them.
+    """
+    _CLIENT.reset()
@@ -0,0 +1,218 @@
+"""
+Background dispatcher that moves the delivery of events out of the request thread.
+"""
+import collections
+import logging
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+OVERFLOW_SPILL_TO_DISK = 'spill_to_disk'
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_SPILL_TO_DISK)
+
+PRIORITY_HIGH = 'high'
+PRIORITY_NORMAL = 'normal'
+PRIORITY_LOW = 'low'
+# Most important first, workers always drain the first non-empty queue.
+PRIORITY_CLASSES = (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+
+
+class DeliveryDispatcher(object):
+    """
+    Bounded in-process queues drained by a pool of delivery worker threads.
+
+    ``deliver`` is called by the workers with the arguments given to
+    ``submit``. Every priority class has its own queue and the workers
+    always take the next event from the most important non-empty queue.
+    The queues share a capacity of ``queue_size`` events.
+
+    When the queues are full, the oldest queued event of a less important
+    class is shed to make room for the new one. If there is none, the
+    ``overflow_policy`` decides whether the oldest event of the same class
+    or the new event is dropped, or whether the new event is handed to
+    ``spill``, which is called with the arguments given to ``submit`` and
+    returns False if it could not store them. Dropped events are counted
+    per label.
+    """
+
+    def __init__(self, deliver, queue_size=10000, worker_threads=2,
+                 overflow_policy=OVERFLOW_DROP_OLDEST, spill=None):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError('Unknown overflow policy: {}'.format(overflow_policy))
+        if overflow_policy == OVERFLOW_SPILL_TO_DISK and spill is None:
+            raise ValueError('A spill function is required for the {} policy'.format(overflow_policy))
+
+        self.deliver = deliver
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.spill = spill
+
+        self._queues = collections.OrderedDict(
+            (priority, collections.deque()) for priority in PRIORITY_CLASSES
+        )
+        self._queued = 0
+        self._condition = threading.Condition()
+        self._idle = threading.Condition(self._condition)
+        self._closed = False
+        self._in_progress = 0
+
+        self.submitted = 0
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.shed = collections.Counter()
+
+        self._workers = []
+        for index in range(worker_threads):
+            worker = threading.Thread(target=self._run_worker, name='caliper-dispatcher-{}'.format(index))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, *args, priority=PRIORITY_NORMAL, label=None):
+        """
+        Queue the given delivery arguments without blocking.
+
+        Returns False if the arguments were dropped, or not accepted because
+        the dispatcher is closed. Arguments spilled by ``spill`` are accepted.
+
+        @params
+        priority: (str) one of ``PRIORITY_CLASSES``
+        label: (str) name the arguments are counted under when they are shed
+        """
+        if priority not in self._queues:
+            raise ValueError('Unknown priority class: {}'.format(priority))
+
+        spill = None
+        with self._condition:
+            if self._closed:
+                return False
+
+            self.submitted += 1
+            accepted = True
+            if self._queued >= self.queue_size:
+                victims = self._get_shedding_queue(priority)
+                if victims is None and self.overflow_policy == OVERFLOW_DROP_OLDEST and self._queues[priority]:
+                    victims = self._queues[priority]
+
+                if victims is not None:
+                    self._queued -= 1
+                    self._shed(victims.popleft()[0])
+                elif self.overflow_policy == OVERFLOW_SPILL_TO_DISK:
+                    spill = args
+                    accepted = False
+                else:
+                    self._shed(label)
+                    return False
+
+            if accepted:
+                self._queues[priority].append((label, args))
+                self._queued += 1
+                self._condition.notify()
+
+        if spill is not None:
+            return self._spill(spill, label)
+        return accepted
+
+    def join(self, timeout=None):
+        """
+        Wait until the queue is drained. Returns False on timeout.
+        """
+        with self._condition:
+            return self._idle.wait_for(
+                lambda: not self._queued and not self._in_progress, timeout
+            )
+
+    @property
+    def closed(self):
+        """
+        True once the dispatcher no longer accepts arguments.
+        """
+        return self._closed
+
+    def close(self, timeout=5):
+        """
+        Deliver the queued events and stop the worker threads.
+        """
+        self.join(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def get_stats(self):
+        """
+        Return the queue depth and the delivery counters.
+        """
+        with self._condition:
+            return {
+                'queue_depth': self._queued,
+                'queue_depth_by_priority': dict(
+                    (priority, len(queue)) for priority, queue in self._queues.items()
+                ),
+                'queue_size': self.queue_size,
+                'in_progress': self._in_progress,
+                'submitted': self.submitted,
+                'delivered': self.delivered,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'spilled': self.spilled,
+                'shed_by_type': dict(self.shed),
+            }
+
+    def _get_shedding_queue(self, priority):
+        # The least important non-empty queue of a class below the given one.
+        for candidate in reversed(PRIORITY_CLASSES):
+            if candidate == priority:
+                return None
+            if self._queues[candidate]:
+                return self._queues[candidate]
+        return None
+
+    def _shed(self, label):
+        self.dropped += 1
+        self.shed[label] += 1
+
+    def _spill(self, args, label):
+        try:
+            spilled = self.spill(*args)
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.exception('Could not spill event: {}'.format(ex))
+            spilled = False
+
+        with self._condition:
+            if spilled:
+                self.spilled += 1
+            else:
+                self._shed(label)
+        return bool(spilled)
+
+    def _run_worker(self):
+        while True:
+            with self._condition:
+                while not self._queued and not self._closed:
+                    self._condition.wait()
+                if not self._queued:
+                    return
+                queue = next(queue for queue in self._queues.values() if queue)
+                args = queue.popleft()[1]
+                self._queued -= 1
+                self._in_progress += 1
+
+            succeeded = True
+            try:
+                self.deliver(*args)
+            except Exception as ex:  # pylint: disable=broad-except
+                succeeded = False
+                LOGGER.exception('Background delivery of caliper event failed: {}'.format(ex))
+
+            with self._condition:
+                self._in_progress -= 1
+                if succeeded:
+                    self.delivered += 1
+                else:
+                    self.failed += 1
+                if not self._queued and not self._in_progress:
+                    self._idle.notify_all()
@@ -0,0 +1,56 @@
+"""
+Caliper Envelope packing of caliperized events.
+
+An Envelope carries many events in its ``data`` list. As the Envelope
+states the Caliper context once in its ``dataVersion``, the ``@context``
+of the events matching it is left out of the events.
+"""
+import json
+from datetime import datetime, timezone
+
+from openedx_caliper_tracking.base_transformer import CALIPER_EVENT_CONTEXT
+from openedx_caliper_tracking.utils import convert_datetime
+
+ENVELOPE_FORMAT = 'envelope'
+ENVELOPE_CONTENT_TYPE = 'application/json'
+ENVELOPE_ITEM_SEPARATOR = ', '
+
+
+def serialize_envelope_event(caliper_event):
+    """
+    Serialize a caliperized event for the ``data`` list of an Envelope.
+    """
+    if caliper_event.get('@context') == CALIPER_EVENT_CONTEXT:
+        caliper_event = dict(
+            (key, value) for key, value in caliper_event.items() if key != '@context'
+        )
+    return json.dumps(caliper_event)
+
+
+def get_envelope_header(sensor, send_time=None):
+    """
+    Return the serialized Envelope up to the opening of its ``data`` list.
+    """
+    header = json.dumps({
+        'sensor': sensor,
+        'sendTime': send_time or convert_datetime(datetime.now(timezone.utc)),
+        'dataVersion': CALIPER_EVENT_CONTEXT,
+    })
+    return '{}, "data": ['.format(header[:-1])
+
+
+def get_envelope_overhead(sensor):
+    """
+    Return the number of bytes an Envelope adds around its serialized events.
+    """
+    return len(get_envelope_header(sensor).encode('utf-8')) + len(']}')
+
+
+def get_envelope_payload(serialized_events, sensor):
+    """
+    Return an Envelope holding the given serialized events as bytes.
+    """
+    return '{}{}]}}'.format(
+        get_envelope_header(sensor),
+        ENVELOPE_ITEM_SEPARATOR.join(serialized_events)
+    ).encode('utf-8')
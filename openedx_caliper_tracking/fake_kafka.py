@@ -0,0 +1,221 @@
+"""
+In-process stand-in of the Kafka brokers.
+
+``InMemoryKafkaProducer`` implements the parts of the ``KafkaProducer``
+interface used by this app. It is selected with ``PRODUCER_CLASS`` in
+``CALIPER_KAFKA_SETTINGS``:
+
+    "PRODUCER_CLASS": "openedx_caliper_tracking.fake_kafka.InMemoryKafkaProducer"
+
+Records are batched by a sender thread like the real producer does, every
+``linger_ms`` or once ``batch_size`` bytes are pending, and every batch is
+encoded with the record batch format of the Kafka protocol so that the bytes
+counted by the broker are the bytes the real producer would put on the wire.
+``ack_latency_ms`` simulates the round-trip to the brokers.
+"""
+import collections
+import threading
+import time
+
+from kafka.future import Future
+from kafka.producer.future import RecordMetadata
+from kafka.record.default_records import DefaultRecordBatchBuilder
+from kafka.structs import TopicPartition
+
+COMPRESSION_TYPES = {None: 0, 'gzip': 1}
+MAX_BATCH_BYTES = 1024 * 1024
+
+
+class InMemoryBroker(object):
+    """
+    Records received by the in-memory producers of the current process, by topic.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.reset()
+
+    def reset(self):
+        with self._condition:
+            self.records = collections.defaultdict(list)
+            self.record_count = 0
+            self.batch_count = 0
+            self.bytes_received = 0
+
+    def append_batch(self, topic, records, size):
+        """
+        Store a batch of ``(key, value, headers)`` records and return the offset of the first one.
+        """
+        with self._condition:
+            offset = len(self.records[topic])
+            self.records[topic].extend(records)
+            self.record_count += len(records)
+            self.batch_count += 1
+            self.bytes_received += size
+            self._condition.notify_all()
+            return offset
+
+    def wait_for(self, record_count, timeout=None):
+        """
+        Wait until ``record_count`` records are received. Returns False on timeout.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self.record_count >= record_count, timeout)
+
+    def get_stats(self):
+        with self._condition:
+            return {
+                'records': self.record_count,
+                'batches': self.batch_count,
+                'bytes': self.bytes_received,
+            }
+
+
+BROKER = InMemoryBroker()
+
+
+def get_in_memory_broker():
+    """
+    Return the broker shared by the in-memory producers of the current process.
+    """
+    return BROKER
+
+
+class InMemoryKafkaProducer(object):
+    """
+    ``KafkaProducer`` delivering to the in-memory broker of the current process.
+
+    Configurations not listed in the signature are accepted and ignored.
+    """
+
+    def __init__(self, value_serializer=None, key_serializer=None, linger_ms=0, batch_size=16384,
+                 compression_type=None, ack_latency_ms=0, **configs):
+        if compression_type not in COMPRESSION_TYPES:
+            raise ValueError('Unsupported compression type for the in-memory producer: {}'.format(compression_type))
+
+        self.value_serializer = value_serializer
+        self.key_serializer = key_serializer
+        self.linger = linger_ms / 1000.0
+        self.batch_size = batch_size
+        self.compression_type = COMPRESSION_TYPES[compression_type]
+        self.ack_latency = ack_latency_ms / 1000.0
+        self.broker = get_in_memory_broker()
+
+        self._condition = threading.Condition()
+        self._pending = []
+        self._pending_bytes = 0
+        self._in_flight = 0
+        self._flushing = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='caliper-in-memory-producer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def send(self, topic, value=None, key=None, headers=None, partition=None, timestamp_ms=None):
+        """
+        Queue a record for the sender thread and return the future of its delivery.
+        """
+        if self.value_serializer is not None:
+            value = self.value_serializer(value)
+        if key is not None and self.key_serializer is not None:
+            key = self.key_serializer(key)
+
+        future = Future()
+        record = (topic, key, value, headers or [], timestamp_ms or int(time.time() * 1000), future)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('Cannot send records with a closed producer.')
+            self._pending.append(record)
+            self._pending_bytes += len(value or b'') + len(key or b'')
+            self._condition.notify_all()
+        return future
+
+    def flush(self, timeout=None):
+        """
+        Wait until the queued records are delivered.
+        """
+        with self._condition:
+            self._flushing = True
+            self._condition.notify_all()
+            self._condition.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+            self._flushing = False
+
+    def close(self, timeout=None):
+        """
+        Deliver the queued records and stop the sender thread.
+        """
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def _is_batch_ready(self):
+        return self._flushing or self._closed or self._pending_bytes >= self.batch_size
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                if not self._is_batch_ready():
+                    self._condition.wait_for(self._is_batch_ready, self.linger)
+                records, self._pending, self._pending_bytes = self._pending, [], 0
+                self._in_flight = len(records)
+
+            self._deliver(records)
+            with self._condition:
+                self._in_flight = 0
+                self._condition.notify_all()
+
+    def _deliver(self, records):
+        if self.ack_latency:
+            time.sleep(self.ack_latency)
+
+        by_topic = collections.OrderedDict()
+        for record in records:
+            by_topic.setdefault(record[0], []).append(record)
+
+        for topic, topic_records in by_topic.items():
+            for batch, size in self._build_batches(topic_records):
+                self._append_batch(topic, batch, size)
+
+    def _build_batches(self, records):
+        """
+        Split records into batches of at most ``batch_size`` bytes and return them with their encoded size.
+        """
+        batches = []
+        builder, batch = None, []
+        for record in records:
+            _, key, value, headers, timestamp_ms, _ = record
+            if builder is not None and builder.append(len(batch), timestamp_ms, key, value, headers) is not None:
+                batch.append(record)
+                continue
+
+            # The batch is full, or none is open yet. A record larger than batch_size gets a batch of its own.
+            if builder is not None:
+                batches.append((batch, len(builder.build())))
+            builder = DefaultRecordBatchBuilder(
+                magic=2, compression_type=self.compression_type, is_transactional=False, producer_id=-1,
+                producer_epoch=-1, base_sequence=-1, batch_size=min(self.batch_size, MAX_BATCH_BYTES)
+            )
+            batch = [record]
+            if builder.append(0, timestamp_ms, key, value, headers) is None:
+                raise RuntimeError('Could not add a record to an empty batch.')
+        if builder is not None:
+            batches.append((batch, len(builder.build())))
+
+        if sum(len(batch) for batch, _ in batches) != len(records):
+            raise RuntimeError('Records were left out of the batches.')
+        return batches
+
+    def _append_batch(self, topic, batch, size):
+        base_offset = self.broker.append_batch(topic, [(key, value, headers) for _, key, value, headers, _, _ in batch],
+                                               size)
+        for offset_delta, (_, key, value, headers, timestamp_ms, future) in enumerate(batch):
+            future.success(RecordMetadata(
+                topic, 0, TopicPartition(topic, 0), base_offset + offset_delta, timestamp_ms, None,
+                len(key) if key else -1, len(value) if value else -1,
+                sum(len(name) + len(header) for name, header in headers) if headers else -1,
+            ))
@@ -0,0 +1,95 @@
+"""
+Health state of the Kafka brokers as seen by the current process.
+
+Deliveries only update the state held in memory. The shared cache is only
+touched when the state changes, and otherwise once every ``sync_interval``
+seconds, so that a healthy process does not pay for cache round-trips on
+every event. The failure and recovery notifications are driven by these
+state transitions.
+"""
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+
+LOGGER = logging.getLogger(__name__)
+
+HEALTHY = 'healthy'
+UNHEALTHY = 'unhealthy'
+
+BROKER_STATE_CACHE_KEY = 'CALIPER_KAFKA_BROKER_STATE'
+EMAIL_DELIVERY_CACHE_KEY = 'IS_KAFKA_DELIVERY_FAILURE_EMAIL_SENT'
+
+DEFAULT_SYNC_INTERVAL = 60  # in seconds
+
+
+class BrokerHealth(object):
+    """
+    Broker state of the current process, synced to the shared cache on transitions.
+
+    ``on_failure`` is called with the name of the error when the brokers become
+    unhealthy, and again every ``sync_interval`` seconds while they stay so.
+    ``on_recovery`` is called when the brokers are healthy again after a
+    failure has been notified, by this or any other process.
+    """
+
+    def __init__(self, sync_interval=DEFAULT_SYNC_INTERVAL, on_failure=None, on_recovery=None):
+        self.sync_interval = sync_interval
+        self.on_failure = on_failure
+        self.on_recovery = on_recovery
+
+        self._lock = threading.Lock()
+        self.state = None  # Unknown until the first delivery.
+        self.transitions = 0
+        self._synced_at = None
+
+    def record_success(self):
+        """
+        Record a delivery acknowledged by the brokers.
+        """
+        if self._should_sync(HEALTHY):
+            cache.set(BROKER_STATE_CACHE_KEY, HEALTHY)
+            if cache.get(EMAIL_DELIVERY_CACHE_KEY):
+                cache.set(EMAIL_DELIVERY_CACHE_KEY, False)
+                if self.on_recovery is not None:
+                    self.on_recovery()
+
+    def record_failure(self, error):
+        """
+        Record a delivery given up on.
+
+        @params
+        error: (str) name of the error the delivery failed with
+        """
+        if self._should_sync(UNHEALTHY):
+            LOGGER.error('Kafka brokers are unhealthy: {}.'.format(error))
+            cache.set(BROKER_STATE_CACHE_KEY, UNHEALTHY)
+            if self.on_failure is not None:
+                self.on_failure(error)
+
+    def _should_sync(self, state):
+        """
+        Switch to the given state, returning True if it is a transition or a sync is due.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.state == state and now - self._synced_at < self.sync_interval:
+                return False
+            if self.state != state:
+                if self.state is not None:
+                    self.transitions += 1
+                    LOGGER.info('Kafka brokers went from {} to {}.'.format(self.state, state))
+                self.state = state
+            self._synced_at = now
+            return True
+
+    def get_stats(self):
+        """
+        Return the state of the brokers and the number of transitions seen by the current process.
+        """
+        with self._lock:
+            return {
+                'state': self.state,
+                'transitions': self.transitions,
+            }
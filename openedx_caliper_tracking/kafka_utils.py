@@ -1,9 +1,63 @@
+import atexit
+import collections
+import fnmatch
+import json
 import logging
+import threading
 
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+from kafka import KafkaProducer
+from kafka.future import Future
+
+from openedx_caliper_tracking.process_local import ProcessLocal
 
 LOGGER = logging.getLogger(__name__)
 
+PRODUCER_CLOSE_TIMEOUT = 10  # in seconds
+
+CELERY_DELIVERY_MODE = 'celery'
+DIRECT_DELIVERY_MODE = 'direct'
+
+# Paths of the fields of a caliperized event that can be used as message
+# keys by their name, tried in order. Other names are read as dotted paths.
+MESSAGE_KEY_FIELDS = {
+    'user_id': (('extensions', 'extra_fields', 'user_id'),),
+    'course_id': (('extensions', 'extra_fields', 'course_id'), ('object', 'extensions', 'course_id')),
+    'session': (('extensions', 'extra_fields', 'session'),),
+}
+COMPOSITE_KEY_SEPARATOR = '|'
+
+DELIVERY_KEY_HEADER = 'caliper_delivery_key'
+DEFAULT_DEDUPE_WINDOW_SIZE = 10000
+
+_MESSAGE_KEY_EXTRACTORS = {}
+_TOPIC_ROUTERS = {}
+
+
+def create_kafka_producer(configurations, producer_class=None):
+    """
+    Create a producer serializing values to JSON, of ``producer_class`` if given or else ``KafkaProducer``.
+    """
+    LOGGER.info('Creating {} for {} in the current process.'.format(
+        producer_class or 'KafkaProducer', configurations.get('bootstrap_servers')))
+    producer_class = import_string(producer_class) if producer_class else KafkaProducer
+    return producer_class(
+        value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+        **configurations
+    )
+
+
+def _close_kafka_producer(producer):
+    try:
+        producer.close(timeout=PRODUCER_CLOSE_TIMEOUT)
+    except Exception as ex:  # pylint: disable=broad-except
+        LOGGER.error('Could not close KafkaProducer cleanly: {}'.format(ex))
+
+
+_KAFKA_PRODUCER = ProcessLocal(create_kafka_producer, on_discard=_close_kafka_producer)
+
 
 def get_kafka_producer_configurations():
     """
@@ -18,3 +72,276 @@ def get_kafka_producer_configurations():
     except AttributeError as ex:
         LOGGER.exception('Invalid or no configurations are provided for KafkaProducer: %s', str(ex))
         raise
+
+
+def is_async_send_enabled():
+    """
+    Return True if events are sent without waiting for the producer to flush them.
+    """
+    return bool(getattr(settings, 'CALIPER_KAFKA_SETTINGS', {}).get('ASYNC_SEND'))
+
+
+def is_direct_delivery_enabled():
+    """
+    Return True if events are sent to Kafka from the tracking process instead of a Celery task.
+    """
+    kafka_settings = getattr(settings, 'CALIPER_KAFKA_SETTINGS', {})
+    return kafka_settings.get('DELIVERY_MODE', CELERY_DELIVERY_MODE) == DIRECT_DELIVERY_MODE
+
+
+def get_kafka_producer():
+    """
+    Return the KafkaProducer shared by the tasks of the current process.
+
+    The producer is created on first use and rebuilt when the producer
+    configurations change or the process forks. With ``ASYNC_SEND`` or the
+    direct delivery mode the producer retries failed sends itself,
+    ``MAXIMUM_RETRIES`` times unless ``retries`` is set in ``PRODUCER_CONFIG``.
+
+    ``PRODUCER_CLASS`` can name another class implementing the interface of
+    ``KafkaProducer``, e.g. the in-memory stand-in of ``fake_kafka``.
+    """
+    configurations = get_kafka_producer_configurations()
+    if is_async_send_enabled() or is_direct_delivery_enabled():
+        configurations.setdefault('retries', settings.CALIPER_KAFKA_SETTINGS.get('MAXIMUM_RETRIES', 3))
+    if is_idempotent_delivery_enabled():
+        configurations.setdefault('acks', 'all')
+        if supports_idempotence():
+            configurations.setdefault('enable_idempotence', True)
+    return _KAFKA_PRODUCER.get((configurations, settings.CALIPER_KAFKA_SETTINGS.get('PRODUCER_CLASS')))
+
+
+def close_kafka_producer():
+    """
+    Flush and close the KafkaProducer of the current process, if any.
+    """
+    _KAFKA_PRODUCER.reset()
+
+
+def _compile_field_getter(name):
+    paths = MESSAGE_KEY_FIELDS.get(name) or (tuple(name.split('.')),)
+
+    def get_field(event):
+        for path in paths:
+            value = event
+            try:
+                for part in path:
+                    value = value[part]
+            except (KeyError, TypeError):
+                continue
+            if value is not None and value != '':
+                return value
+        return None
+
+    return get_field
+
+
+def compile_message_key_extractor(fields):
+    """
+    Return a function computing the message key of a caliperized event as bytes.
+
+    The function returns None if none of the fields is set in the event.
+
+    @params
+    fields: (tuple) names of the fields the key is made of, joined with "|" if more than one
+    """
+    getters = tuple(_compile_field_getter(name) for name in fields)
+
+    if len(getters) == 1:
+        getter = getters[0]
+
+        def extract_key(event):
+            value = getter(event)
+            return None if value is None else str(value).encode('utf-8')
+        return extract_key
+
+    def extract_composite_key(event):
+        values = [getter(event) for getter in getters]
+        if all(value is None for value in values):
+            return None
+        return COMPOSITE_KEY_SEPARATOR.join('' if value is None else str(value) for value in values).encode('utf-8')
+    return extract_composite_key
+
+
+def get_message_key(caliper_event):
+    """
+    Return the Kafka message key of the event according to ``MESSAGE_KEY`` in ``CALIPER_KAFKA_SETTINGS``.
+
+    Events are sent without a key if ``MESSAGE_KEY`` is not set.
+    """
+    fields = settings.CALIPER_KAFKA_SETTINGS.get('MESSAGE_KEY')
+    if not fields:
+        return None
+
+    fields = (fields,) if isinstance(fields, str) else tuple(fields)
+    extractor = _MESSAGE_KEY_EXTRACTORS.get(fields)
+    if extractor is None:
+        extractor = _MESSAGE_KEY_EXTRACTORS[fields] = compile_message_key_extractor(fields)
+    return extractor(caliper_event)
+
+
+class TopicRouter(object):
+    """
+    Resolve the Kafka topic of an event type from a routing table.
+
+    ``routes`` maps event types or glob patterns (e.g. "edx.video.*") to
+    topics. An exact event type wins over the patterns, which are tried in
+    order. Event types matching none of them go to ``default_topic``. The
+    topic of an event type is resolved once and then cached.
+    """
+
+    def __init__(self, routes, default_topic):
+        self.default_topic = default_topic
+        self._exact = {}
+        self._patterns = []
+        for pattern, topic in routes:
+            if any(char in pattern for char in '*?['):
+                self._patterns.append((pattern, topic))
+            else:
+                self._exact[pattern] = topic
+        self._resolved = {}
+
+    def get_topic(self, event_type):
+        topic = self._resolved.get(event_type)
+        if topic is None:
+            topic = self._resolved[event_type] = self._resolve(event_type)
+        return topic
+
+    def _resolve(self, event_type):
+        if event_type in self._exact:
+            return self._exact[event_type]
+        for pattern, topic in self._patterns:
+            if fnmatch.fnmatchcase(event_type or '', pattern):
+                return topic
+        return self.default_topic
+
+
+def get_topic_name(event_type):
+    """
+    Return the Kafka topic of the given event type.
+
+    Events are routed with ``TOPIC_ROUTES`` in ``CALIPER_KAFKA_SETTINGS`` if
+    it is set, ``TOPIC_NAME`` is the topic of the events not routed by it.
+    The router is built once and dropped whenever the settings change.
+    """
+    kafka_settings = settings.CALIPER_KAFKA_SETTINGS
+    routes = kafka_settings.get('TOPIC_ROUTES')
+    if not routes:
+        return kafka_settings['TOPIC_NAME']
+
+    router = _TOPIC_ROUTERS.get(kafka_settings['TOPIC_NAME'])
+    if router is None:
+        router = _TOPIC_ROUTERS[kafka_settings['TOPIC_NAME']] = TopicRouter(
+            tuple(routes.items()), kafka_settings['TOPIC_NAME']
+        )
+    return router.get_topic(event_type)
+
+
+def clear_topic_routers(**kwargs):
+    """
+    Forget the topic routers, they are rebuilt from the settings whenever ``CALIPER_KAFKA_SETTINGS`` changes.
+    """
+    if kwargs.get('setting') in (None, 'CALIPER_KAFKA_SETTINGS'):
+        _TOPIC_ROUTERS.clear()
+
+
+setting_changed.connect(clear_topic_routers)
+
+
+def is_idempotent_delivery_enabled():
+    """
+    Return True if events are stamped with a delivery key and re-sends of delivered events are suppressed.
+    """
+    return bool(getattr(settings, 'CALIPER_KAFKA_SETTINGS', {}).get('IDEMPOTENT'))
+
+
+def supports_idempotence():
+    """
+    Return True if the installed Kafka client can enable idempotent production.
+    """
+    return 'enable_idempotence' in KafkaProducer.DEFAULT_CONFIG
+
+
+class DeliveredIds(object):
+    """
+    Bounded set of the ids of the events delivered by the current process.
+
+    The oldest ids are forgotten once ``max_size`` ids are held.
+    """
+
+    def __init__(self, max_size=DEFAULT_DEDUPE_WINDOW_SIZE):
+        self.max_size = max_size
+        self._ids = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def add(self, event_id):
+        with self._lock:
+            self._ids[event_id] = None
+            self._ids.move_to_end(event_id)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+    def __contains__(self, event_id):
+        with self._lock:
+            return event_id in self._ids
+
+    def suppress(self, event_id):
+        """
+        Return True if the event was delivered already, counting it as a suppressed re-send.
+        """
+        with self._lock:
+            if event_id not in self._ids:
+                return False
+            self.suppressed += 1
+            return True
+
+    def __len__(self):
+        return len(self._ids)
+
+
+_DELIVERED_IDS = ProcessLocal(DeliveredIds)
+
+
+def get_delivered_ids():
+    """
+    Return the ids of the events delivered by the current process.
+    """
+    return _DELIVERED_IDS.get((
+        settings.CALIPER_KAFKA_SETTINGS.get('DEDUPE_WINDOW_SIZE', DEFAULT_DEDUPE_WINDOW_SIZE),
+    ))
+
+
+def reset_delivered_ids():
+    """
+    Forget the ids of the events delivered by the current process.
+    """
+    _DELIVERED_IDS.reset()
+
+
+def send_caliper_event(producer, topic, caliper_event):
+    """
+    Send a caliperized event with its message key and return the future of its delivery.
+
+    With ``IDEMPOTENT`` set in ``CALIPER_KAFKA_SETTINGS`` the event is stamped
+    with its id in the ``caliper_delivery_key`` header so that consumers can
+    dedupe it. An event already delivered by the current process is not sent
+    again, an already succeeded future is returned instead.
+    """
+    key = get_message_key(caliper_event)
+    event_id = caliper_event.get('id') if is_idempotent_delivery_enabled() else None
+    if not event_id:
+        return producer.send(topic, caliper_event, key=key)
+
+    delivered_ids = get_delivered_ids()
+    if delivered_ids.suppress(event_id):
+        LOGGER.info('Suppressed re-send of event {} already delivered to kafka.'.format(event_id))
+        return Future().success(None)
+
+    headers = [(DELIVERY_KEY_HEADER, str(event_id).encode('utf-8'))]
+    future = producer.send(topic, caliper_event, key=key, headers=headers)
+    future.add_callback(lambda record_metadata: delivered_ids.add(event_id))
+    return future
+
+
+atexit.register(close_kafka_producer)
@@ -0,0 +1,226 @@
+"""
+Two-tier cache of the database lookups made by the transformers.
+
+Values are kept in an in-process LRU with a short TTL, in front of a Django
+cache shared by the processes. Missing rows are cached as well, for a
+shorter time, and raise the ``DoesNotExist`` error of their model again
+without querying the database. Entries are invalidated on ``post_save`` and
+``post_delete`` of the models they are read from; the in-process tier of
+the other processes expires after ``LOCAL_TTL``.
+
+It is configured with ``CALIPER_LOOKUP_CACHE_SETTINGS``:
+
+    CALIPER_LOOKUP_CACHE_SETTINGS = {
+        'ENABLED': True,
+        'MAX_SIZE': 10000,       # entries of the in-process tier of every lookup
+        'LOCAL_TTL': 60,         # in seconds
+        'SHARED_TTL': 3600,      # in seconds
+        'NEGATIVE_TTL': 60,      # in seconds, for missing rows
+        'CACHE_ALIAS': 'default' # Django cache of the shared tier, None to only use the in-process tier
+    }
+"""
+import collections
+import logging
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 10000
+DEFAULT_LOCAL_TTL = 60  # in seconds
+DEFAULT_SHARED_TTL = 3600  # in seconds
+DEFAULT_NEGATIVE_TTL = 60  # in seconds
+DEFAULT_CACHE_ALIAS = 'default'
+
+CACHE_KEY_PREFIX = 'caliper_lookup'
+MISSING = '__caliper_lookup_missing__'
+
+
+def get_lookup_cache_settings():
+    return getattr(settings, 'CALIPER_LOOKUP_CACHE_SETTINGS', {})
+
+
+class TwoTierCache(object):
+    """
+    Cache of a single lookup, ``loader(key)``.
+
+    ``does_not_exist`` returns the error class raised by the loader for
+    missing rows, which is raised again on cached misses.
+    """
+
+    def __init__(self, name, loader, does_not_exist):
+        self.name = name
+        self.loader = loader
+        self.does_not_exist = does_not_exist
+
+        self._lock = threading.Lock()
+        self._local = collections.OrderedDict()
+        self.stats = collections.Counter()
+
+    def _shared_cache(self):
+        alias = get_lookup_cache_settings().get('CACHE_ALIAS', DEFAULT_CACHE_ALIAS)
+        return caches[alias] if alias else None
+
+    def _shared_key(self, key):
+        return '{}:{}:{}'.format(CACHE_KEY_PREFIX, self.name, key)
+
+    def get(self, key):
+        """
+        Return the value of the lookup for ``key``, loading it on misses of both tiers.
+        """
+        cache_settings = get_lookup_cache_settings()
+        if not cache_settings.get('ENABLED', True):
+            return self.loader(key)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] > now:
+                self._local.move_to_end(key)
+                self.stats['local_hits'] += 1
+                return self._unwrap(key, entry[1])
+
+        shared_cache = self._shared_cache()
+        value = shared_cache.get(self._shared_key(key)) if shared_cache is not None else None
+        if value is not None:
+            self.stats['shared_hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            try:
+                value = self.loader(key)
+            except self.does_not_exist():
+                value = MISSING
+
+            if shared_cache is not None:
+                shared_cache.set(self._shared_key(key), value, self._ttl(value, cache_settings, 'SHARED_TTL'))
+
+        self._store_local(key, value, now + self._ttl(value, cache_settings, 'LOCAL_TTL'), cache_settings)
+        return self._unwrap(key, value)
+
+    def _ttl(self, value, cache_settings, name):
+        default = DEFAULT_SHARED_TTL if name == 'SHARED_TTL' else DEFAULT_LOCAL_TTL
+        ttl = cache_settings.get(name, default)
+        if value == MISSING:
+            ttl = min(ttl, cache_settings.get('NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL))
+        return ttl
+
+    def _store_local(self, key, value, expires_at, cache_settings):
+        with self._lock:
+            self._local[key] = (expires_at, value)
+            self._local.move_to_end(key)
+            while len(self._local) > cache_settings.get('MAX_SIZE', DEFAULT_MAX_SIZE):
+                self._local.popitem(last=False)
+
+    def _unwrap(self, key, value):
+        if value == MISSING:
+            self.stats['negative_hits'] += 1
+            raise self.does_not_exist()('No {} found for {}.'.format(self.name, key))
+        return value
+
+    def invalidate(self, key):
+        """
+        Drop ``key`` from both tiers.
+        """
+        with self._lock:
+            self._local.pop(key, None)
+        shared_cache = self._shared_cache()
+        if shared_cache is not None:
+            shared_cache.delete(self._shared_key(key))
+        self.stats['invalidations'] += 1
+
+    def clear(self):
+        """
+        Drop every entry of the in-process tier and reset the counters.
+        """
+        with self._lock:
+            self._local.clear()
+            self.stats.clear()
+
+    def get_stats(self):
+        """
+        Return the hit, miss and invalidation counters and the size of the in-process tier.
+        """
+        with self._lock:
+            stats = dict((name, self.stats[name]) for name in (
+                'local_hits', 'shared_hits', 'misses', 'negative_hits', 'invalidations'))
+            stats['local_size'] = len(self._local)
+            return stats
+
+
+def _load_username(user_id):
+    return str(get_user_model().objects.get(id=user_id).username)
+
+
+def _load_topic_id(team_id):
+    from lms.djangoapps.teams.models import CourseTeam
+    return CourseTeam.objects.get(team_id=team_id).topic_id
+
+
+def _course_team_does_not_exist():
+    from lms.djangoapps.teams.models import CourseTeam
+    return CourseTeam.DoesNotExist
+
+
+USERNAME_CACHE = TwoTierCache(
+    'username', _load_username, lambda: get_user_model().DoesNotExist
+)
+TOPIC_ID_CACHE = TwoTierCache('topic_id', _load_topic_id, _course_team_does_not_exist)
+
+
+def get_lookup_cache_stats():
+    """
+    Return the counters of every lookup cache of the current process.
+    """
+    return dict((lookup_cache.name, lookup_cache.get_stats()) for lookup_cache in (USERNAME_CACHE, TOPIC_ID_CACHE))
+
+
+def clear_lookup_caches(**kwargs):
+    """
+    Drop the in-process tier of every lookup cache, they are cleared whenever their settings change.
+    """
+    if kwargs.get('setting') in (None, 'CALIPER_LOOKUP_CACHE_SETTINGS'):
+        USERNAME_CACHE.clear()
+        TOPIC_ID_CACHE.clear()
+
+
+setting_changed.connect(clear_lookup_caches)
+
+
+def invalidate_username(sender, instance, **kwargs):
+    """
+    Signal handler dropping the cached username of a saved or deleted user.
+    """
+    USERNAME_CACHE.invalidate(instance.pk)
+
+
+def invalidate_topic_id(sender, instance, **kwargs):
+    """
+    Signal handler dropping the cached topic id of a saved or deleted team.
+    """
+    TOPIC_ID_CACHE.invalidate(instance.team_id)
+
+
+def connect_invalidation_signals():
+    """
+    Connect the invalidation of the lookup caches to the signals of the User and CourseTeam models.
+
+    CourseTeam is only connected if the teams app of the LMS is installed.
+    """
+    user_model = get_user_model()
+    for signal in (post_save, post_delete):
+        signal.connect(invalidate_username, sender=user_model, dispatch_uid='caliper_invalidate_username')
+
+    try:
+        course_team_model = apps.get_model('teams', 'CourseTeam')
+    except LookupError:
+        LOGGER.debug('Teams app is not installed, the topic ids of teams are not invalidated.')
+        return
+    for signal in (post_save, post_delete):
+        signal.connect(invalidate_topic_id, sender=course_team_model, dispatch_uid='caliper_invalidate_topic_id')
@@ -0,0 +1,73 @@
+"""
+Report the compression ratio and CPU cost of REST request bodies per event type.
+
+Usage:
+    ./manage.py lms caliper_compression_benchmark --iterations 200
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from openedx_caliper_tracking.benchmarks import load_fixture_events
+from openedx_caliper_tracking.compression import GZIP, ZSTD, compress, is_compression_available
+
+
+class Command(BaseCommand):
+    help = 'Report the compression ratio and CPU cost of REST request bodies for every fixture event type.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200,
+                            help='Number of times every payload is compressed.')
+        parser.add_argument('--gzip-levels', type=int, nargs='+', default=[1, 6, 9])
+        parser.add_argument('--zstd-levels', type=int, nargs='+', default=[1, 3, 9])
+
+    def handle(self, *args, **options):
+        codecs = [(GZIP, level) for level in options['gzip_levels']]
+        if is_compression_available(ZSTD):
+            codecs += [(ZSTD, level) for level in options['zstd_levels']]
+        else:
+            self.stdout.write('zstandard is not installed, skipping zstd.\n')
+
+        fixtures = load_fixture_events()
+        records = [
+            json.dumps({'key': caliper_event.get('extensions', {}).get('extra_fields', {}).get('event_type'),
+                        'value': caliper_event})
+            for _, _, caliper_event in fixtures
+        ]
+        payloads = [
+            (name, '{{"records": [{}]}}'.format(record).encode('utf-8'))
+            for (name, _, _), record in zip(fixtures, records)
+        ]
+        payloads.append((
+            'all events in one batch ({})'.format(len(records)),
+            '{{"records": [{}]}}'.format(', '.join(records)).encode('utf-8')
+        ))
+
+        header = '{:<60} {:>8}'.format('event type', 'bytes') + ''.join(
+            ' {:>18}'.format('{}-{} ratio/us'.format(encoding, level)) for encoding, level in codecs
+        )
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        totals = dict((codec, [0, 0.0]) for codec in codecs)
+        for name, payload in payloads:
+            columns = []
+            for encoding, level in codecs:
+                started = time.perf_counter()
+                for _ in range(options['iterations']):
+                    compressed = compress(payload, encoding, level)
+                elapsed_us = (time.perf_counter() - started) / options['iterations'] * 10 ** 6
+
+                columns.append(' {:>18}'.format('{:.2f}x/{:.0f}'.format(len(payload) / len(compressed), elapsed_us)))
+                if not name.startswith('all events'):
+                    totals[(encoding, level)][0] += len(compressed)
+                    totals[(encoding, level)][1] += elapsed_us
+            self.stdout.write('{:<60} {:>8}'.format(name[:60], len(payload)) + ''.join(columns))
+
+        raw_total = sum(len(payload) for name, payload in payloads[:-1])
+        self.stdout.write('-' * len(header))
+        self.stdout.write('{:<60} {:>8}'.format('one event per request (total)', raw_total) + ''.join(
+            ' {:>18}'.format('{:.2f}x/{:.0f}'.format(raw_total / totals[codec][0], totals[codec][1]))
+            for codec in codecs
+        ))
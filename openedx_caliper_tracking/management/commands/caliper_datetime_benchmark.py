@@ -0,0 +1,41 @@
+"""
+Report the cost of converting the timestamps of the fixture events to UTC.
+
+Usage:
+    ./manage.py lms caliper_datetime_benchmark --iterations 10000
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from openedx_caliper_tracking import utils
+from openedx_caliper_tracking.benchmarks import load_fixture_timestamps
+
+
+class Command(BaseCommand):
+    help = 'Report the cost of convert_datetime and of the dateutil based conversion it falls back to.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10000,
+                            help='Number of timestamps converted per implementation.')
+
+    def handle(self, *args, **options):
+        timestamps = load_fixture_timestamps()
+        if not timestamps:
+            raise CommandError('No timestamps found in the fixture events.')
+
+        iterations = options['iterations']
+        inputs = [timestamps[index % len(timestamps)] for index in range(iterations)]
+        self.stdout.write('{} conversions of {} fixture timestamps.\n'.format(iterations, len(timestamps)))
+
+        results = {}
+        for name, convert in (('dateutil', utils._convert_datetime_with_dateutil),  # pylint: disable=protected-access
+                              ('convert_datetime', utils.convert_datetime)):
+            started = time.perf_counter()
+            for timestamp in inputs:
+                convert(timestamp)
+            results[name] = (time.perf_counter() - started) / iterations * 10 ** 6
+
+        for name, elapsed_us in results.items():
+            self.stdout.write('{:<20} {:>10.2f} us/timestamp'.format(name, elapsed_us))
+        self.stdout.write('{:<20} {:>10.1f}x'.format('speedup', results['dateutil'] / results['convert_datetime']))
@@ -0,0 +1,121 @@
+"""
+Report the throughput, the enqueue latency and the bytes sent of the Kafka delivery modes.
+
+The fixture events are driven through ``CaliperProcessor`` with the brokers
+replaced by the in-memory stand-in of ``fake_kafka`` and the Celery tasks
+run by a thread of the current process.
+
+Usage:
+    ./manage.py lms caliper_kafka_benchmark --events 5000 --ack-latency-ms 2
+"""
+import copy
+import itertools
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from openedx_caliper_tracking.benchmarks import InlineCeleryWorker, load_transformable_events
+from openedx_caliper_tracking.fake_kafka import get_in_memory_broker
+from openedx_caliper_tracking.kafka_utils import CELERY_DELIVERY_MODE, DIRECT_DELIVERY_MODE, close_kafka_producer
+from openedx_caliper_tracking.processor import CaliperProcessor, flush_kafka_batcher, stop_kafka_dispatcher
+from openedx_caliper_tracking.tasks import deliver_caliper_event_to_kafka, deliver_caliper_events_to_kafka
+
+IN_MEMORY_PRODUCER_CLASS = 'openedx_caliper_tracking.fake_kafka.InMemoryKafkaProducer'
+BENCHMARK_TOPIC = 'caliper-benchmark'
+DELIVERY_TIMEOUT = 600  # in seconds
+
+# Settings of CALIPER_KAFKA_SETTINGS for every benchmarked mode.
+MODES = {
+    'celery': {'DELIVERY_MODE': CELERY_DELIVERY_MODE},
+    'celery_async': {'DELIVERY_MODE': CELERY_DELIVERY_MODE, 'ASYNC_SEND': True},
+    'celery_batched': {'DELIVERY_MODE': CELERY_DELIVERY_MODE, 'ENABLE_BATCHING': True},
+    'celery_batched_async': {'DELIVERY_MODE': CELERY_DELIVERY_MODE, 'ENABLE_BATCHING': True, 'ASYNC_SEND': True},
+    'direct': {'DELIVERY_MODE': DIRECT_DELIVERY_MODE},
+}
+
+
+def percentile(sorted_values, percent):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100.0))]
+
+
+class Command(BaseCommand):
+    help = 'Report events/sec, enqueue latency and bytes sent to Kafka for every delivery mode.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=5000,
+                            help='Number of events driven through the processor per mode.')
+        parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=sorted(MODES))
+        parser.add_argument('--ack-latency-ms', type=float, default=1,
+                            help='Simulated round-trip to the brokers of every produce request.')
+        parser.add_argument('--linger-ms', type=int, default=5,
+                            help='linger_ms of the producer.')
+        parser.add_argument('--compression-type', choices=['gzip'],
+                            help='compression_type of the producer.')
+
+    def handle(self, *args, **options):
+        fixture_events = load_transformable_events()
+        if not fixture_events:
+            raise CommandError('None of the fixture events can be caliperized in the current environment.')
+
+        events = [copy.deepcopy(event) for event in itertools.islice(itertools.cycle(fixture_events),
+                                                                     options['events'])]
+        self.stdout.write('{} events made of {} fixture event types.\n'.format(len(events), len(fixture_events)))
+
+        header = '{:<22} {:>10} {:>12} {:>12} {:>12} {:>10} {:>14}'.format(
+            'mode', 'events/s', 'p50 enq us', 'p99 enq us', 'kafka bytes', 'bytes/evt', 'celery bytes')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for mode in options['modes']:
+            self.stdout.write(self.run_mode(mode, copy.deepcopy(events), options))
+
+    def run_mode(self, mode, events, options):
+        kafka_settings = dict(MODES[mode], **{
+            'PRODUCER_CLASS': IN_MEMORY_PRODUCER_CLASS,
+            'PRODUCER_CONFIG': {
+                'bootstrap_servers': ['in-memory'],
+                'linger_ms': options['linger_ms'],
+                'ack_latency_ms': options['ack_latency_ms'],
+                'compression_type': options['compression_type'],
+            },
+            'TOPIC_NAME': BENCHMARK_TOPIC,
+            'DIRECT_QUEUE_SIZE': len(events),
+        })
+        features = dict(getattr(settings, 'FEATURES', {}), ENABLE_KAFKA_FOR_CALIPER=True,
+                        ENABLE_CALIPER_EVENTS_DELIVERY=False)
+
+        broker = get_in_memory_broker()
+        broker.reset()
+        processor = CaliperProcessor()
+        latencies = []
+        with override_settings(CALIPER_KAFKA_SETTINGS=kafka_settings, CALIPER_KAFKA_AUTH_SETTINGS={},
+                               FEATURES=features), \
+                InlineCeleryWorker(deliver_caliper_event_to_kafka, deliver_caliper_events_to_kafka) as worker:
+            started = time.perf_counter()
+            for event in events:
+                enqueued = time.perf_counter()
+                processor(event)
+                latencies.append(time.perf_counter() - enqueued)
+
+            flush_kafka_batcher()
+            stop_kafka_dispatcher()
+            worker.join()
+            delivered = broker.wait_for(len(events), DELIVERY_TIMEOUT)
+            elapsed = time.perf_counter() - started
+            close_kafka_producer()
+
+        if not delivered:
+            return '{:<22} only {} of {} events were delivered.'.format(mode, broker.record_count, len(events))
+
+        latencies.sort()
+        stats = broker.get_stats()
+        return '{:<22} {:>10.0f} {:>12.1f} {:>12.1f} {:>12} {:>10.1f} {:>14}'.format(
+            mode,
+            len(events) / elapsed,
+            percentile(latencies, 50) * 10 ** 6,
+            percentile(latencies, 99) * 10 ** 6,
+            stats['bytes'],
+            stats['bytes'] / float(len(events)),
+            worker.bytes_enqueued,
+        )
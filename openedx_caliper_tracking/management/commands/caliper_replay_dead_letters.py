@@ -0,0 +1,59 @@
+"""
+Send the dead letters of the caliper events back to Kafka at a controlled rate.
+
+Usage:
+    ./manage.py lms caliper_replay_dead_letters --source file --rate 200
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from openedx_caliper_tracking.dead_letter import (DEFAULT_REPLAY_BATCH_SIZE, DEFAULT_REPLAY_CONSUMER_GROUP,
+                                                  DEFAULT_REPLAY_RATE, DeadLetterReplayer, DeadLetterSegments,
+                                                  get_dead_letter_consumer, get_dead_letter_directory,
+                                                  get_dead_letter_topic)
+from openedx_caliper_tracking.exceptions import InvalidConfigurationsError
+from openedx_caliper_tracking.tasks import get_task_producer
+
+FILE_SOURCE = 'file'
+TOPIC_SOURCE = 'topic'
+
+
+class Command(BaseCommand):
+    help = 'Replay the caliper events stored in the dead-letter segments or topic to their Kafka topics.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=[FILE_SOURCE, TOPIC_SOURCE],
+                            help='Where to read the dead letters from, the configured one by default.')
+        parser.add_argument('--rate', type=float, default=DEFAULT_REPLAY_RATE,
+                            help='Maximum number of events replayed per second, 0 for no limit.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_REPLAY_BATCH_SIZE,
+                            help='Number of events sent between two flushes of the producer.')
+        parser.add_argument('--max-events', type=int,
+                            help='Stop once this number of events has been replayed.')
+        parser.add_argument('--group-id', default=DEFAULT_REPLAY_CONSUMER_GROUP,
+                            help='Consumer group used to read the dead-letter topic.')
+
+    def handle(self, *args, **options):
+        source = options['source'] or (FILE_SOURCE if get_dead_letter_directory() else TOPIC_SOURCE)
+        if source == FILE_SOURCE and not get_dead_letter_directory():
+            raise CommandError('DEAD_LETTER_DIRECTORY is not set in CALIPER_KAFKA_SETTINGS.')
+        if source == TOPIC_SOURCE and not get_dead_letter_topic():
+            raise CommandError('DEAD_LETTER_TOPIC is not set in CALIPER_KAFKA_SETTINGS.')
+
+        try:
+            producer = get_task_producer()
+        except InvalidConfigurationsError as ex:
+            raise CommandError(str(ex))
+
+        replayer = DeadLetterReplayer(producer, options['rate'], options['batch_size'])
+        if source == FILE_SOURCE:
+            completed = replayer.replay_segments(DeadLetterSegments(get_dead_letter_directory()), options['max_events'])
+        else:
+            consumer = get_dead_letter_consumer(get_dead_letter_topic(), options['group_id'])
+            try:
+                completed = replayer.replay_topic(consumer, options['max_events'])
+            finally:
+                consumer.close()
+
+        self.stdout.write('Replayed {} dead letters, {} failed again.'.format(replayer.replayed, replayer.failed))
+        if not completed:
+            raise CommandError('Replay stopped as Kafka could not be reached, the remaining dead letters are kept.')
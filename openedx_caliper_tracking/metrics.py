@@ -0,0 +1,204 @@
+"""
+Latency histograms and counters of the event sinks.
+
+Timings are only recorded when ``ENABLE_CALIPER_METRICS`` is set in
+``FEATURES``. When it is not, ``start_timer`` returns None and
+``record_timing`` returns right away, so instrumented code pays for a
+single settings lookup.
+
+Usage:
+    started = start_timer()
+    ...
+    record_timing(SINK_REST, event_type, started, succeeded)
+"""
+import bisect
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from openedx_caliper_tracking.process_local import ProcessLocal
+
+LOGGER = logging.getLogger(__name__)
+
+SINK_CALIPER_LOG = 'caliper_log'
+SINK_REST = 'rest'
+SINK_REST_REQUEST = 'rest_request'
+SINK_KAFKA = 'kafka'
+
+ALL_EVENT_TYPES = '*'
+
+# Upper bounds of the histogram buckets in seconds, from 1us to about 10
+# minutes growing by 10% so percentiles are off by at most 10%.
+BUCKET_BOUNDS = [1e-6 * 1.1 ** index for index in range(int(math.log(6e8, 1.1)) + 1)] + [float('inf')]
+
+PERCENTILES = (50, 95, 99)
+
+
+def is_metrics_enabled():
+    """
+    Return True if the sinks should be instrumented.
+    """
+    return bool(getattr(settings, 'FEATURES', {}).get('ENABLE_CALIPER_METRICS'))
+
+
+class LatencyHistogram(object):
+    """
+    Log-bucketed histogram of durations with success and error counters.
+
+    Not thread-safe, ``MetricsRegistry`` serializes the updates.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKET_BOUNDS)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.first_recorded_at = None
+        self.last_recorded_at = None
+
+    def record(self, duration, succeeded=True, now=None):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, duration)] += 1
+        self.count += 1
+        if not succeeded:
+            self.errors += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+        now = now or time.time()
+        if self.first_recorded_at is None:
+            self.first_recorded_at = now
+        self.last_recorded_at = now
+
+    def percentile(self, percent):
+        """
+        Return the upper bound of the bucket holding the given percentile, in seconds.
+        """
+        if not self.count:
+            return 0.0
+
+        rank = self.count * percent / 100.0
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[index], self.max)
+        return self.max
+
+    def get_stats(self):
+        """
+        Return the counters, the throughput and the percentiles in milliseconds.
+        """
+        stats = {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'max_ms': self.max * 1000,
+            'per_second': 0.0,
+        }
+        if self.count > 1 and self.last_recorded_at > self.first_recorded_at:
+            stats['per_second'] = (self.count - 1) / (self.last_recorded_at - self.first_recorded_at)
+        for percent in PERCENTILES:
+            stats['p{}_ms'.format(percent)] = self.percentile(percent) * 1000
+        return stats
+
+
+class MetricsRegistry(object):
+    """
+    Histograms per sink, both for every event type and for all of them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def record(self, sink, event_type, duration, succeeded=True):
+        """
+        Record a single call of a sink.
+
+        @params
+        sink: (str) one of the ``SINK_*`` names
+        event_type: (str) type of the event, None to only record the sink total
+        duration: (float) duration of the call in seconds
+        succeeded: (bool) False if the call failed
+        """
+        now = time.time()
+        with self._lock:
+            keys = [(sink, ALL_EVENT_TYPES)]
+            if event_type is not None:
+                keys.append((sink, event_type))
+            for key in keys:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = LatencyHistogram()
+                histogram.record(duration, succeeded, now)
+
+    def get_stats(self):
+        """
+        Return the stats of every histogram as ``{sink: {event type: stats}}``.
+
+        The totals of a sink are found under the ``"*"`` event type.
+        """
+        with self._lock:
+            stats = {}
+            for (sink, event_type), histogram in self._histograms.items():
+                stats.setdefault(sink, {})[event_type] = histogram.get_stats()
+            return stats
+
+    def reset(self):
+        """
+        Drop every recorded timing.
+        """
+        with self._lock:
+            self._histograms = {}
+
+
+_METRICS_REGISTRY = ProcessLocal(MetricsRegistry)
+
+
+def get_metrics_registry():
+    """
+    Return the metrics registry of the current process.
+    """
+    return _METRICS_REGISTRY.get()
+
+
+def start_timer():
+    """
+    Return the start time of a sink call, or None if metrics are disabled.
+    """
+    if not is_metrics_enabled():
+        return None
+    return time.perf_counter()
+
+
+def record_timing(sink, event_type, started, succeeded=True):
+    """
+    Record the duration of a sink call started with ``start_timer``.
+    """
+    if started is None:
+        return
+    get_metrics_registry().record(sink, event_type, time.perf_counter() - started, succeeded)
+
+
+def get_metrics_stats():
+    """
+    Return the stats of every sink recorded by the current process.
+    """
+    return get_metrics_registry().get_stats()
+
+
+def log_metrics_stats():
+    """
+    Log a line per sink and event type with the stats recorded by the current process.
+    """
+    for sink, event_types in sorted(get_metrics_stats().items()):
+        for event_type, stats in sorted(event_types.items()):
+            LOGGER.info(
+                'Caliper metrics [{}][event_type:{}] count: {count}, errors: {errors}, per second: {per_second:.1f}, '
+                'p50: {p50_ms:.3f}ms, p95: {p95_ms:.3f}ms, p99: {p99_ms:.3f}ms, max: {max_ms:.3f}ms'.format(
+                    sink, event_type, **stats)
+            )
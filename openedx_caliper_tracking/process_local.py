@@ -0,0 +1,68 @@
+"""
+Helper to keep a single instance of an object per process.
+"""
+import os
+import threading
+
+
+class ProcessLocal(object):
+    """
+    Lazily build and hold one instance per process.
+
+    The instance is rebuilt in a forked child process and whenever the
+    configuration passed to ``get`` changes. ``factory`` is called with the
+    configuration tuple and ``on_discard`` with an instance being replaced
+    within the process that created it.
+    """
+
+    def __init__(self, factory, on_discard=None):
+        self.factory = factory
+        self.on_discard = on_discard
+        self._lock = threading.Lock()
+        self._pid = None
+        self._config = None
+        self._instance = None
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def get(self, config=()):
+        """
+        Return the instance of the current process for the given configuration.
+        """
+        if self._instance is not None and self._pid == os.getpid() and self._config == config:
+            return self._instance
+
+        with self._lock:
+            if self._instance is None or self._pid != os.getpid() or self._config != config:
+                self._discard()
+                self._instance = self.factory(*config)
+                self._pid = os.getpid()
+                self._config = config
+            return self._instance
+
+    def peek(self):
+        """
+        Return the instance of the current process without creating one.
+        """
+        if self._pid == os.getpid():
+            return self._instance
+        return None
+
+    def reset(self):
+        """
+        Drop the instance of the current process.
+        """
+        with self._lock:
+            self._discard()
+
+    def _discard(self):
+        instance, self._instance = self._instance, None
+        if instance is not None and self._pid == os.getpid() and self.on_discard is not None:
+            self.on_discard(instance)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._instance = None
+        self._pid = None
+        self._config = None
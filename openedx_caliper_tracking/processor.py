@@ -1,14 +1,37 @@
+import atexit
 import logging
 import json
-import requests
 
 from django.conf import settings
-from requests.exceptions import ConnectionError
+from requests.exceptions import ConnectionError, Timeout
 
+from openedx_caliper_tracking.async_delivery import (DEFAULT_MAX_IN_FLIGHT, DEFAULT_MAX_PENDING,
+                                                     DEFAULT_REQUEST_DEADLINE, AsyncDeliveryEngine,
+                                                     is_async_delivery_available)
 from openedx_caliper_tracking.base_transformer import base_transformer, page_view_transformer
-from openedx_caliper_tracking.caliper_config import EVENT_MAPPING
+from openedx_caliper_tracking.batching import EventBatcher
+from openedx_caliper_tracking.caliper_config import EVENT_MAPPING, EVENT_PRIORITIES
+from openedx_caliper_tracking.circuit_breaker import (DEFAULT_FAILURE_THRESHOLD, DEFAULT_HALF_OPEN_CALLS,
+                                                      DEFAULT_RESET_TIMEOUT, CircuitBreaker)
+from openedx_caliper_tracking.compression import (DEFAULT_COMPRESSION_MIN_BYTES, compress_request_body,
+                                                  is_compression_available)
+from openedx_caliper_tracking.delivery_client import (KAFKA_REST_CONTENT_TYPE, get_delivery_client,
+                                                      get_delivery_headers, get_delivery_settings)
+from openedx_caliper_tracking.dispatcher import (OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST, PRIORITY_NORMAL,
+                                                 DeliveryDispatcher)
+from openedx_caliper_tracking.envelope import (ENVELOPE_CONTENT_TYPE, ENVELOPE_FORMAT, ENVELOPE_ITEM_SEPARATOR,
+                                               get_envelope_overhead, get_envelope_payload, serialize_envelope_event)
+from openedx_caliper_tracking.kafka_utils import is_direct_delivery_enabled
 from openedx_caliper_tracking.loggers import get_caliper_logger
-from openedx_caliper_tracking.tasks import deliver_caliper_event_to_kafka
+from openedx_caliper_tracking.metrics import (SINK_CALIPER_LOG, SINK_REST, SINK_REST_REQUEST, record_timing,
+                                              start_timer)
+from openedx_caliper_tracking.process_local import ProcessLocal
+from openedx_caliper_tracking.spool import (DEFAULT_MAX_BYTES, DEFAULT_REPLAY_BATCH_SIZE, DEFAULT_REPLAY_INTERVAL,
+                                            DEFAULT_SEGMENT_BYTES, DiskSpool, RejectedRecords, SpoolDrainer,
+                                            claim_spool_directory)
+from openedx_caliper_tracking.tasks import (deliver_caliper_event_to_kafka, deliver_caliper_events_to_kafka,
+                                            enqueue_task, send_caliper_event_to_kafka)
+from openedx_caliper_tracking.tracking_event import TrackingEvent
 
 try:
     # if app is running in edx-platfrom get BaseBackend from edx codebase
@@ -22,6 +45,56 @@ LOGGER = logging.getLogger(__name__)
 TRACKING_LOGGER = logging.getLogger('tracking')
 CALIPER_LOGGER = get_caliper_logger('caliper', 'local2')
 
+DEFAULT_BATCH_MAX_RECORDS = 100
+DEFAULT_BATCH_MAX_BYTES = 512 * 1024
+DEFAULT_BATCH_MAX_WAIT_MS = 1000
+ASYNC_DELIVERY_ENGINE = 'asyncio'
+KAFKA_REST_FORMAT = 'kafka_rest'
+KAFKA_REST_PAYLOAD_TEMPLATE = '{{"records": [{}]}}'
+RECORD_SEPARATOR = ENVELOPE_ITEM_SEPARATOR
+CIRCUIT_OPEN_STATUS_CODE = 503
+# Client errors worth retrying, all server errors are.
+RETRYABLE_CLIENT_ERRORS = (408, 429)
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_WORKER_THREADS = 2
+
+_LOGGED_UNAVAILABLE = set()
+_REST_BATCHER = ProcessLocal(
+    lambda *config: EventBatcher(send_caliper_records, *config),
+    on_discard=lambda batcher: batcher.close()
+)
+_KAFKA_BATCHER = ProcessLocal(
+    lambda max_records, max_wait_ms: EventBatcher(
+        lambda batch: enqueue_task(deliver_caliper_events_to_kafka, batch),
+        max_records=max_records, max_wait_ms=max_wait_ms
+    ),
+    on_discard=lambda batcher: batcher.close()
+)
+_KAFKA_DISPATCHER = ProcessLocal(
+    lambda queue_size: DeliveryDispatcher(send_caliper_event_to_kafka, queue_size, worker_threads=1,
+                                          overflow_policy=OVERFLOW_DROP_NEWEST),
+    on_discard=lambda dispatcher: dispatcher.close()
+)
+_ASYNC_DELIVERY_ENGINE = ProcessLocal(AsyncDeliveryEngine, on_discard=lambda engine: engine.close())
+_CIRCUIT_BREAKER = ProcessLocal(CircuitBreaker)
+_DELIVERY_SPOOL = ProcessLocal(
+    lambda *config: _create_spool_drainer(*config),
+    on_discard=lambda drainer: drainer.stop()
+)
+_DELIVERY_DISPATCHER = ProcessLocal(
+    lambda *config: DeliveryDispatcher(deliver_caliper_event, *config, spill=spill_caliper_event),
+    on_discard=lambda dispatcher: dispatcher.close()
+)
+
+
+def _log_unavailable_once(message):
+    """
+    Logs an error about a missing optional dependency or setting only once per process.
+    """
+    if message not in _LOGGED_UNAVAILABLE:
+        _LOGGED_UNAVAILABLE.add(message)
+        LOGGER.error(message)
+
 
 def log_success(event_id, status_code):
     """
@@ -59,34 +132,508 @@ def deliver_caliper_event(caliperized_event, event_type):
     """
     Delivers the caliperized event to the external API endpoint.
 
+    The event is added to the current batch if batching or the Envelope
+    format is enabled in ``CALIPER_DELIVERY_SETTINGS``, otherwise it is sent
+    right away.
+
     @params
     caliperized_event: (dict) dict containing the entire event after caliperization
     event_type: (str) the type of the event being fired
     """
+    started = start_timer()
+    succeeded = False
     try:
-        response = requests.post(
+        record = serialize_caliper_record(caliperized_event, event_type)
+        batcher = get_rest_batcher()
+        if batcher is not None:
+            batcher.add((caliperized_event.get('id'), record), len(record) + len(RECORD_SEPARATOR))
+        else:
+            send_caliper_records([(caliperized_event.get('id'), record)])
+        succeeded = True
+    finally:
+        record_timing(SINK_REST, event_type, started, succeeded)
+
+
+def serialize_caliper_record(caliperized_event, event_type):
+    """
+    Returns the record the caliperized event is sent as in the configured payload format.
+    """
+    if get_payload_format() == ENVELOPE_FORMAT:
+        return serialize_envelope_event(caliperized_event)
+    return json.dumps({
+        "key": event_type,
+        "value": caliperized_event
+    })
+
+
+def spill_caliper_event(caliperized_event, event_type):
+    """
+    Adds an event the delivery dispatcher has no room for to the spool, it is replayed like undelivered events.
+
+    Returns False if the spool is not enabled or is full.
+    """
+    spool = get_delivery_spool()
+    if spool is None:
+        _log_unavailable_once('SPOOL_DIR is not set, events overflowing the delivery queue are dropped.')
+        return False
+    return spool.append(serialize_caliper_record(caliperized_event, event_type).encode('utf-8'))
+
+
+def send_caliper_records(records):
+    """
+    Sends the given records to the external API endpoint in a single request.
+
+    The request is scheduled on the asyncio engine if it is enabled in
+    ``CALIPER_DELIVERY_SETTINGS``, otherwise it is sent with the pooled client.
+
+    @params
+    records: (list) list of (event_id, serialized record) tuples
+    """
+    circuit_breaker = get_circuit_breaker()
+    if circuit_breaker is not None and not circuit_breaker.allow_request():
+        handle_delivery_result(records, CIRCUIT_OPEN_STATUS_CODE, attempted=False)
+        return
+
+    payload = get_records_payload(record for _, record in records)
+
+    engine = get_async_delivery_engine()
+    if engine is not None:
+        body, headers = get_request_body(payload)
+        started = start_timer()
+        engine.submit(
             settings.CALIPER_DELIVERY_ENDPOINT,
-            headers={
-                'Authorization': 'Bearer {}'.format(
-                    settings.CALIPER_DELIVERY_AUTH_TOKEN),
-                'Content-Type': 'application/vnd.kafka.json.v2+json',
-            },
-            json={
-                "records": [
-                    {
-                        "key": event_type,
-                        "value": caliperized_event
-                    }
-                ]
-            }
+            body,
+            headers,
+            lambda status_code: handle_async_delivery_result(records, status_code, started)
         )
+        return
 
-        if response.status_code == 200:
-            log_success(caliperized_event.get('id'), response.status_code)
-        else:
-            log_failure(caliperized_event.get('id'), response.status_code)
+    handle_delivery_result(records, post_caliper_payload(payload))
+
+
+def get_payload_format():
+    """
+    Returns the format of the request bodies, either Kafka-REST records or a Caliper Envelope.
+    """
+    return get_delivery_settings().get('PAYLOAD_FORMAT', KAFKA_REST_FORMAT)
+
+
+def get_envelope_sensor():
+    """
+    Returns the sensor identifier stated in the Caliper Envelopes.
+    """
+    return get_delivery_settings().get('ENVELOPE_SENSOR') or settings.LMS_ROOT_URL
+
+
+def get_records_payload(records):
+    """
+    Returns the request body for the given serialized records.
+    """
+    if get_payload_format() == ENVELOPE_FORMAT:
+        return get_envelope_payload(records, get_envelope_sensor())
+    return KAFKA_REST_PAYLOAD_TEMPLATE.format(RECORD_SEPARATOR.join(records)).encode('utf-8')
+
+
+def get_request_body(payload):
+    """
+    Returns the request body and headers for the given payload.
+
+    The body is compressed if ``COMPRESSION`` is set in ``CALIPER_DELIVERY_SETTINGS``
+    and the payload is at least ``COMPRESSION_MIN_BYTES`` long.
+    """
+    delivery_settings = get_delivery_settings()
+    encoding = delivery_settings.get('COMPRESSION')
+    if encoding and not is_compression_available(encoding):
+        _log_unavailable_once('Content encoding {} is not available, sending uncompressed events.'.format(encoding))
+        encoding = None
+
+    content_type = ENVELOPE_CONTENT_TYPE if get_payload_format() == ENVELOPE_FORMAT else KAFKA_REST_CONTENT_TYPE
+    return compress_request_body(
+        payload,
+        get_delivery_headers(content_type),
+        encoding,
+        delivery_settings.get('COMPRESSION_LEVEL'),
+        delivery_settings.get('COMPRESSION_MIN_BYTES', DEFAULT_COMPRESSION_MIN_BYTES)
+    )
+
+
+def post_caliper_payload(payload):
+    """
+    Posts the given request body to the external API endpoint with the pooled client.
+
+    @params
+    payload: (bytes) request body
+    @return: (int) HTTP status code of the response from the API
+    """
+    body, headers = get_request_body(payload)
+    started = start_timer()
+    status_code = 500
+    try:
+        status_code = get_delivery_client().post(
+            settings.CALIPER_DELIVERY_ENDPOINT,
+            headers=headers,
+            data=body
+        ).status_code
+    except Timeout:
+        status_code = 504
     except ConnectionError:
-        log_failure(caliperized_event.get('id'), 500)
+        status_code = 500
+    finally:
+        record_timing(SINK_REST_REQUEST, None, started, status_code == 200)
+    return status_code
+
+
+def handle_async_delivery_result(records, status_code, started):
+    """
+    Records the timing of a request sent by the asyncio engine and handles its result.
+
+    Called from the event loop thread of the engine once the request is done.
+    """
+    record_timing(SINK_REST_REQUEST, None, started, status_code == 200)
+    handle_delivery_result(records, status_code)
+
+
+def handle_delivery_result(records, status_code, attempted=True):
+    """
+    Logs the outcome of sending the given records to the external API endpoint.
+
+    Records that could not be delivered are added to the spool if it is
+    enabled, unless they were rejected by the endpoint.
+
+    @params
+    records: (list) list of (event_id, serialized record) tuples
+    status_code: (int) HTTP status code of the response from the API
+    attempted: (bool) False if the request was short-circuited by the circuit breaker
+    """
+    if attempted:
+        record_delivery_attempt(status_code)
+
+    log_delivery = log_success if status_code == 200 else log_failure
+    for event_id, _ in records:
+        log_delivery(event_id, status_code)
+
+    if status_code != 200 and is_retryable_status(status_code):
+        spool = get_delivery_spool()
+        if spool is not None:
+            for _, record in records:
+                spool.append(record.encode('utf-8'))
+
+
+def is_retryable_status(status_code):
+    """
+    Return True if a request that failed with the given HTTP status code may succeed later.
+
+    Server errors, timeouts, throttling and requests short-circuited by the
+    circuit breaker are retried. Other client errors are permanent rejections.
+    """
+    return status_code >= 500 or status_code in RETRYABLE_CLIENT_ERRORS
+
+
+def replay_spooled_records(payloads):
+    """
+    Sends records read back from the spool to the external API endpoint.
+
+    A batch rejected by the endpoint is sent again record by record, so that
+    only the rejected records are dropped.
+
+    @params
+    payloads: (list) list of serialized records as bytes
+    @return: (bool) True if the records were delivered
+    @raises RejectedRecords: if records were rejected, the others being delivered
+    """
+    circuit_breaker = get_circuit_breaker()
+    if circuit_breaker is not None and not circuit_breaker.allow_request():
+        return False
+
+    status_code = _post_spooled_records(payloads)
+    if status_code == 200:
+        LOGGER.info('Replayed {} spooled caliper events to endpoint: {}'.format(
+            len(payloads), settings.CALIPER_DELIVERY_ENDPOINT))
+        return True
+    if is_retryable_status(status_code):
+        return False
+
+    rejected = 1
+    if len(payloads) > 1:
+        rejected = 0
+        for payload in payloads:
+            record_status_code = _post_spooled_records([payload])
+            if record_status_code != 200 and is_retryable_status(record_status_code):
+                return False
+            if record_status_code != 200:
+                rejected += 1
+        if not rejected:
+            return True
+    LOGGER.error('Failure {}: {} spooled caliper events were rejected by endpoint: {}'.format(
+        status_code, rejected, settings.CALIPER_DELIVERY_ENDPOINT))
+    raise RejectedRecords(rejected)
+
+
+def _post_spooled_records(payloads):
+    status_code = post_caliper_payload(get_records_payload(payload.decode('utf-8') for payload in payloads))
+    record_delivery_attempt(status_code)
+    return status_code
+
+
+def record_delivery_attempt(status_code):
+    """
+    Reports the outcome of a request sent to the external API endpoint to the circuit breaker.
+
+    Connection errors, timeouts and server errors count as failures of the endpoint.
+    """
+    circuit_breaker = get_circuit_breaker()
+    if circuit_breaker is None:
+        return
+
+    if status_code >= 500:
+        circuit_breaker.record_failure()
+    else:
+        circuit_breaker.record_success()
+
+
+def get_circuit_breaker():
+    """
+    Return the circuit breaker of the current process for the REST endpoint.
+
+    Returns None if the circuit breaker is not enabled in ``CALIPER_DELIVERY_SETTINGS``.
+    """
+    delivery_settings = get_delivery_settings()
+    if not delivery_settings.get('ENABLE_CIRCUIT_BREAKER'):
+        return None
+
+    return _CIRCUIT_BREAKER.get((
+        'CALIPER_DELIVERY_ENDPOINT',
+        delivery_settings.get('CIRCUIT_BREAKER_FAILURE_THRESHOLD', DEFAULT_FAILURE_THRESHOLD),
+        delivery_settings.get('CIRCUIT_BREAKER_RESET_TIMEOUT', DEFAULT_RESET_TIMEOUT),
+        delivery_settings.get('CIRCUIT_BREAKER_HALF_OPEN_CALLS', DEFAULT_HALF_OPEN_CALLS),
+    ))
+
+
+def get_delivery_spool():
+    """
+    Return the spool of the current process for undeliverable REST events.
+
+    Returns None if ``SPOOL_DIR`` is not set in ``CALIPER_DELIVERY_SETTINGS``.
+    """
+    delivery_settings = get_delivery_settings()
+    if not delivery_settings.get('SPOOL_DIR'):
+        return None
+
+    return _DELIVERY_SPOOL.get((
+        delivery_settings['SPOOL_DIR'],
+        delivery_settings.get('SPOOL_SEGMENT_BYTES', DEFAULT_SEGMENT_BYTES),
+        delivery_settings.get('SPOOL_MAX_BYTES', DEFAULT_MAX_BYTES),
+        delivery_settings.get('SPOOL_REPLAY_BATCH_SIZE', DEFAULT_REPLAY_BATCH_SIZE),
+        delivery_settings.get('SPOOL_REPLAY_INTERVAL', DEFAULT_REPLAY_INTERVAL),
+    )).spool
+
+
+def stop_delivery_spool():
+    """
+    Stop replaying spooled events in the current process and release its spool.
+    """
+    _DELIVERY_SPOOL.reset()
+
+
+def _create_spool_drainer(base_directory, segment_bytes, max_bytes, batch_size, interval):
+    directory, lock_file = claim_spool_directory(base_directory)
+    return SpoolDrainer(
+        DiskSpool(directory, segment_bytes, max_bytes),
+        replay_spooled_records,
+        batch_size,
+        interval,
+        lock_file=lock_file
+    )
+
+
+def get_async_delivery_engine():
+    """
+    Return the asyncio delivery engine of the current process.
+
+    Returns None if the engine is not enabled in ``CALIPER_DELIVERY_SETTINGS``
+    or if its optional dependencies are not installed.
+    """
+    delivery_settings = get_delivery_settings()
+    if delivery_settings.get('DELIVERY_ENGINE') != ASYNC_DELIVERY_ENGINE:
+        return None
+
+    if not is_async_delivery_available():
+        _log_unavailable_once('The asyncio delivery engine requires aiohttp, falling back to blocking delivery.')
+        return None
+
+    return _ASYNC_DELIVERY_ENGINE.get((
+        delivery_settings.get('MAX_IN_FLIGHT', DEFAULT_MAX_IN_FLIGHT),
+        delivery_settings.get('REQUEST_DEADLINE', DEFAULT_REQUEST_DEADLINE),
+        delivery_settings.get('MAX_PENDING', DEFAULT_MAX_PENDING),
+    ))
+
+
+def stop_async_delivery_engine():
+    """
+    Wait for the requests in flight and stop the asyncio engine of the current process.
+    """
+    _ASYNC_DELIVERY_ENGINE.reset()
+
+
+def get_rest_batcher():
+    """
+    Return the batcher of the current process for REST delivery.
+
+    Returns None if neither batching nor the Envelope format is enabled in
+    ``CALIPER_DELIVERY_SETTINGS``. ``BATCH_MAX_BYTES`` is the ceiling for
+    the size of the whole request body.
+    """
+    delivery_settings = get_delivery_settings()
+    if get_payload_format() == ENVELOPE_FORMAT:
+        overhead = get_envelope_overhead(get_envelope_sensor())
+    elif delivery_settings.get('ENABLE_BATCHING'):
+        overhead = len(KAFKA_REST_PAYLOAD_TEMPLATE.format(''))
+    else:
+        return None
+
+    return _REST_BATCHER.get((
+        delivery_settings.get('BATCH_MAX_RECORDS', DEFAULT_BATCH_MAX_RECORDS),
+        delivery_settings.get('BATCH_MAX_BYTES', DEFAULT_BATCH_MAX_BYTES) - overhead + len(RECORD_SEPARATOR),
+        delivery_settings.get('BATCH_MAX_WAIT_MS', DEFAULT_BATCH_MAX_WAIT_MS),
+    ))
+
+
+def flush_rest_batcher():
+    """
+    Deliver the events waiting in the REST batcher of the current process.
+    """
+    _REST_BATCHER.reset()
+
+
+def get_kafka_batcher():
+    """
+    Return the batcher of the current process for the Kafka delivery tasks.
+
+    Returns None if batching is not enabled in ``CALIPER_KAFKA_SETTINGS``.
+    """
+    kafka_settings = settings.CALIPER_KAFKA_SETTINGS
+    if not kafka_settings.get('ENABLE_BATCHING'):
+        return None
+
+    return _KAFKA_BATCHER.get((
+        kafka_settings.get('BATCH_MAX_RECORDS', DEFAULT_BATCH_MAX_RECORDS),
+        kafka_settings.get('BATCH_MAX_WAIT_MS', DEFAULT_BATCH_MAX_WAIT_MS),
+    ))
+
+
+def flush_kafka_batcher():
+    """
+    Enqueue the events waiting in the Kafka batcher of the current process.
+    """
+    _KAFKA_BATCHER.reset()
+
+
+def get_kafka_dispatcher():
+    """
+    Return the dispatcher of the current process sending events directly to Kafka.
+
+    Returns None unless ``DELIVERY_MODE`` is "direct" in ``CALIPER_KAFKA_SETTINGS``.
+    """
+    if not is_direct_delivery_enabled():
+        return None
+
+    return _KAFKA_DISPATCHER.get((
+        settings.CALIPER_KAFKA_SETTINGS.get('DIRECT_QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+    ))
+
+
+def stop_kafka_dispatcher():
+    """
+    Hand the events queued for direct Kafka delivery over to the producer and stop the dispatcher.
+    """
+    _KAFKA_DISPATCHER.reset()
+
+
+def dispatch_caliper_event_to_kafka(transformed_event, event_type):
+    """
+    Deliver the caliperized event to Kafka according to ``CALIPER_KAFKA_SETTINGS``.
+
+    In the direct delivery mode the event is queued for the process-local
+    producer. When the queue is full, or in the default mode, the event is
+    delivered by a Celery task, batched with other events if enabled.
+    """
+    kafka_dispatcher = get_kafka_dispatcher()
+    if kafka_dispatcher is not None and kafka_dispatcher.submit(transformed_event, event_type, label=event_type):
+        return
+
+    kafka_batcher = get_kafka_batcher()
+    if kafka_batcher is not None:
+        kafka_batcher.add((transformed_event, event_type))
+    else:
+        enqueue_task(deliver_caliper_event_to_kafka, transformed_event, event_type)
+
+
+def get_delivery_dispatcher():
+    """
+    Return the background dispatcher of the current process for REST delivery.
+
+    Returns None if background delivery is not enabled in ``CALIPER_DELIVERY_SETTINGS``.
+    """
+    delivery_settings = get_delivery_settings()
+    if not delivery_settings.get('ENABLE_BACKGROUND_DELIVERY'):
+        return None
+
+    return _DELIVERY_DISPATCHER.get((
+        delivery_settings.get('QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+        delivery_settings.get('WORKER_THREADS', DEFAULT_WORKER_THREADS),
+        delivery_settings.get('OVERFLOW_POLICY', OVERFLOW_DROP_OLDEST),
+    ))
+
+
+def dispatch_caliper_event(transformed_event, event_type):
+    """
+    Deliver the caliperized event to the external API endpoint, from the background dispatcher if it is enabled.
+
+    Events dropped by the overflow policy of the dispatcher are logged. Events
+    the dispatcher does not accept because it is closed, while the process
+    exits, are delivered right away.
+    """
+    dispatcher = get_delivery_dispatcher()
+    if dispatcher is None:
+        deliver_caliper_event(transformed_event, event_type)
+        return
+
+    if dispatcher.submit(transformed_event, event_type, priority=get_event_priority(event_type), label=event_type):
+        return
+
+    if dispatcher.closed:
+        deliver_caliper_event(transformed_event, event_type)
+    else:
+        LOGGER.warning('Delivery queue is full, dropped caliper event {} ({}).'.format(
+            transformed_event.get('id'), event_type))
+
+
+def get_event_priority(event_type):
+    """
+    Return the delivery priority class of the given event type.
+
+    ``EVENT_PRIORITIES`` in ``CALIPER_DELIVERY_SETTINGS`` overrides the
+    priorities of ``caliper_config.EVENT_PRIORITIES``.
+    """
+    overrides = get_delivery_settings().get('EVENT_PRIORITIES')
+    if overrides and event_type in overrides:
+        return overrides[event_type]
+    return EVENT_PRIORITIES.get(event_type, PRIORITY_NORMAL)
+
+
+def stop_delivery_dispatcher():
+    """
+    Deliver the events queued in the dispatcher of the current process and stop its workers.
+    """
+    _DELIVERY_DISPATCHER.reset()
+
+
+atexit.register(stop_delivery_spool)
+atexit.register(stop_async_delivery_engine)
+atexit.register(flush_rest_batcher)
+atexit.register(stop_delivery_dispatcher)
+atexit.register(flush_kafka_batcher)
+atexit.register(stop_kafka_dispatcher)
 
 
 class CaliperProcessor(BaseBackend):
@@ -112,19 +659,22 @@ class CaliperProcessor(BaseBackend):
         event: raw event from edX event tracking pipeline
         """
         try:
-            caliper_event = base_transformer(event)
+            tracking_event = TrackingEvent(event)
+            caliper_event = base_transformer(tracking_event)
             related_function = EVENT_MAPPING[event.get('event_type')]
-            transformed_event = related_function(event, caliper_event)
+            transformed_event = related_function(tracking_event, caliper_event)
 
+            started = start_timer()
             CALIPER_LOGGER.info(json.dumps(transformed_event))
+            record_timing(SINK_CALIPER_LOG, event.get('event_type'), started)
 
             if (settings.FEATURES.get('ENABLE_CALIPER_EVENTS_DELIVERY')
                 and hasattr(settings, 'CALIPER_DELIVERY_ENDPOINT')
                     and hasattr(settings, 'CALIPER_DELIVERY_AUTH_TOKEN')):
-                deliver_caliper_event(transformed_event, event.get('event_type'))
+                dispatch_caliper_event(transformed_event, event.get('event_type'))
 
             if settings.FEATURES.get('ENABLE_KAFKA_FOR_CALIPER') and hasattr(settings, 'CALIPER_KAFKA_SETTINGS'):
-                deliver_caliper_event_to_kafka.delay(transformed_event, event.get('event_type'))
+                dispatch_caliper_event_to_kafka(transformed_event, event.get('event_type'))
 
             return event
         except KeyError:
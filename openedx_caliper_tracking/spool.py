@@ -0,0 +1,340 @@
+"""
+Durable on-disk spool for caliper events that could not be delivered.
+
+Records are appended to segment files, each record being framed with its
+length and CRC32 checksum. The position up to which records have been
+acknowledged is persisted so that a restarted process resumes the replay
+where it stopped. Segments are deleted once all of their records are
+acknowledged.
+"""
+import collections
+import fcntl
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+LOGGER = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct('>II')  # payload length, payload crc32
+SEGMENT_SUFFIX = '.seg'
+POSITION_FILE = 'position'
+LOCK_FILE = 'lock'
+
+DEFAULT_SEGMENT_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_REPLAY_BATCH_SIZE = 100
+DEFAULT_REPLAY_INTERVAL = 5  # in seconds
+REPLAY_RATE_WINDOW = 60  # in seconds
+
+
+class RejectedRecords(Exception):
+    """
+    Raised by the ``send_batch`` of a ``SpoolDrainer`` when records of a batch were permanently rejected.
+
+    The batch is acknowledged, the rejected records are not retried.
+    """
+
+    def __init__(self, count):
+        super(RejectedRecords, self).__init__('{} records were rejected'.format(count))
+        self.count = count
+
+
+def claim_spool_directory(base_directory):
+    """
+    Return a sub directory of ``base_directory`` owned by the current process.
+
+    Every process needs its own segment files. The first sub directory whose
+    lock is not held by another process is claimed, so spools left behind by
+    processes that have exited are picked up again by new processes.
+    """
+    index = 0
+    while True:
+        directory = os.path.join(base_directory, str(index))
+        os.makedirs(directory, exist_ok=True)
+        lock_file = open(os.path.join(directory, LOCK_FILE), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            lock_file.close()
+            index += 1
+            continue
+        return directory, lock_file
+
+
+class DiskSpool(object):
+    """
+    Append-only, segment based spool with CRC checked records.
+
+    The total size of the segments is kept under ``max_bytes`` by discarding
+    the oldest segments first.
+    """
+
+    def __init__(self, directory, segment_bytes=DEFAULT_SEGMENT_BYTES, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._sizes = collections.OrderedDict()
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(SEGMENT_SUFFIX):
+                segment_id = int(name[:-len(SEGMENT_SUFFIX)])
+                self._sizes[segment_id] = os.path.getsize(self._segment_path(segment_id))
+
+        self._position = self._load_position()
+        for segment_id in list(self._sizes):
+            if segment_id < self._position[0]:
+                self._delete_segment(segment_id)
+
+        # Never append to a segment written by a previous process as it may end with a torn record.
+        self._writer = None
+        self._active_segment = None
+        last_segment = next(reversed(self._sizes)) if self._sizes else None
+        if last_segment is None:
+            self._open_segment(self._position[0])
+        else:
+            self._open_segment(last_segment + 1 if self._sizes[last_segment] else last_segment)
+
+        self.appended = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.corrupted = 0
+        self.rejected = 0
+        self._replays = collections.deque()
+
+    def _segment_path(self, segment_id):
+        return os.path.join(self.directory, '{:020d}{}'.format(segment_id, SEGMENT_SUFFIX))
+
+    def _load_position(self):
+        try:
+            with open(os.path.join(self.directory, POSITION_FILE)) as position_file:
+                segment_id, offset = position_file.read().split()
+                return int(segment_id), int(offset)
+        except (IOError, OSError, ValueError):
+            return (next(iter(self._sizes)) if self._sizes else 0), 0
+
+    def _save_position(self):
+        path = os.path.join(self.directory, POSITION_FILE)
+        with open(path + '.tmp', 'w') as position_file:
+            position_file.write('{} {}'.format(*self._position))
+        os.replace(path + '.tmp', path)
+
+    def _open_segment(self, segment_id):
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = open(self._segment_path(segment_id), 'ab')
+        self._active_segment = segment_id
+        self._sizes.setdefault(segment_id, 0)
+
+    def _delete_segment(self, segment_id):
+        self._sizes.pop(segment_id, None)
+        try:
+            os.remove(self._segment_path(segment_id))
+        except OSError:
+            pass
+
+    def _total_bytes(self):
+        return sum(self._sizes.values())
+
+    def append(self, payload):
+        """
+        Append a record to the spool. Returns False if it had to be dropped.
+        """
+        data = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            if self._sizes[self._active_segment] and \
+                    self._sizes[self._active_segment] + len(data) > self.segment_bytes:
+                self._open_segment(self._active_segment + 1)
+
+            while self._total_bytes() + len(data) > self.max_bytes and len(self._sizes) > 1:
+                oldest = next(iter(self._sizes))
+                LOGGER.error('Caliper spool {} is full, discarding segment {}.'.format(self.directory, oldest))
+                self.dropped += 1
+                self._delete_segment(oldest)
+                if self._position[0] <= oldest:
+                    self._position = (next(iter(self._sizes)), 0)
+                    self._save_position()
+
+            if self._total_bytes() + len(data) > self.max_bytes:
+                self.dropped += 1
+                return False
+
+            self._writer.write(data)
+            self._writer.flush()
+            self._sizes[self._active_segment] += len(data)
+            self.appended += 1
+            return True
+
+    def read_batch(self, max_records):
+        """
+        Read up to ``max_records`` records following the acknowledged position.
+
+        Returns a ``(position, payloads)`` tuple. Pass the position to ``ack``
+        once the payloads have been delivered.
+        """
+        payloads = []
+        with self._lock:
+            segment_id, offset = self._position
+            if segment_id not in self._sizes:
+                # The segment was discarded while full, resume at the oldest one left.
+                remaining = [sid for sid in self._sizes if sid > segment_id]
+                if remaining:
+                    segment_id, offset = remaining[0], 0
+            while len(payloads) < max_records and segment_id in self._sizes:
+                segment_end = False
+                with open(self._segment_path(segment_id), 'rb') as segment:
+                    segment.seek(offset)
+                    while len(payloads) < max_records:
+                        header = segment.read(RECORD_HEADER.size)
+                        if len(header) < RECORD_HEADER.size:
+                            segment_end = True
+                            break
+                        length, checksum = RECORD_HEADER.unpack(header)
+                        payload = segment.read(length)
+                        if len(payload) < length:
+                            # A torn record can only be followed by garbage, skip the rest of the segment.
+                            LOGGER.error('Truncated record found in caliper spool segment {} at offset {}.'.format(
+                                self._segment_path(segment_id), offset))
+                            self.corrupted += 1
+                            segment_end = True
+                            if segment_id == self._active_segment:
+                                self._open_segment(segment_id + 1)
+                            break
+
+                        offset = segment.tell()
+                        if zlib.crc32(payload) != checksum:
+                            LOGGER.error('Corrupted record found in caliper spool segment {}.'.format(
+                                self._segment_path(segment_id)))
+                            self.corrupted += 1
+                            continue
+                        payloads.append(payload)
+
+                if not segment_end or segment_id == self._active_segment:
+                    break
+                segment_id, offset = segment_id + 1, 0
+
+            if not payloads and (segment_id, offset) != self._position:
+                # Only exhausted or corrupted segments were skipped.
+                self._position = (segment_id, offset)
+                self._save_position()
+
+        return (segment_id, offset), payloads
+
+    def ack(self, position, count, rejected=0):
+        """
+        Acknowledge the delivery of ``count`` records up to ``position``, ``rejected`` of which were not accepted.
+
+        Positions behind the current one, left by segments discarded while the
+        batch was being delivered, do not move the position back.
+        """
+        with self._lock:
+            if position > self._position:
+                self._position = position
+                for segment_id in list(self._sizes):
+                    if segment_id < position[0]:
+                        self._delete_segment(segment_id)
+                self._save_position()
+
+            self.replayed += count - rejected
+            self.rejected += rejected
+            now = time.time()
+            self._replays.append((now, count))
+            while self._replays and self._replays[0][0] < now - REPLAY_RATE_WINDOW:
+                self._replays.popleft()
+
+    def get_stats(self):
+        """
+        Return the size of the backlog and the replay counters.
+        """
+        with self._lock:
+            segment_id, offset = self._position
+            backlog_bytes = sum(
+                size for sid, size in self._sizes.items() if sid >= segment_id
+            ) - offset
+            now = time.time()
+            recent = sum(count for timestamp, count in self._replays if timestamp >= now - REPLAY_RATE_WINDOW)
+            return {
+                'directory': self.directory,
+                'backlog_bytes': max(backlog_bytes, 0),
+                'segments': len(self._sizes),
+                'appended': self.appended,
+                'replayed': self.replayed,
+                'dropped': self.dropped,
+                'corrupted': self.corrupted,
+                'rejected': self.rejected,
+                'replay_rate': float(recent) / REPLAY_RATE_WINDOW,
+            }
+
+    def close(self):
+        """
+        Close the active segment.
+        """
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+class SpoolDrainer(object):
+    """
+    Background thread replaying spooled records in batches.
+
+    ``send_batch`` is called with a list of payloads and must return True
+    once they are delivered. Records are acknowledged only after a successful
+    delivery, otherwise the batch is retried after ``interval`` seconds.
+    ``send_batch`` raises ``RejectedRecords`` when some of the records can
+    never be delivered, the batch is then acknowledged as well.
+    """
+
+    def __init__(self, spool, send_batch, batch_size=DEFAULT_REPLAY_BATCH_SIZE, interval=DEFAULT_REPLAY_INTERVAL,
+                 lock_file=None):
+        self.spool = spool
+        self.send_batch = send_batch
+        self.batch_size = batch_size
+        self.interval = interval
+        self.lock_file = lock_file
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='caliper-spool-drainer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def drain_once(self):
+        """
+        Replay a single batch. Returns True if there may be more records to replay.
+        """
+        position, payloads = self.spool.read_batch(self.batch_size)
+        if not payloads:
+            return False
+
+        rejected = 0
+        try:
+            delivered = self.send_batch(payloads)
+        except RejectedRecords as ex:
+            LOGGER.error('Dropping {} spooled caliper events rejected by the endpoint.'.format(ex.count))
+            delivered, rejected = True, ex.count
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.exception('Could not replay spooled caliper events: {}'.format(ex))
+            delivered = False
+
+        if delivered:
+            self.spool.ack(position, len(payloads), rejected)
+        return delivered
+
+    def _run(self):
+        wait = self.interval
+        while not self._stopped.wait(wait):
+            wait = 0 if self.drain_once() else self.interval
+
+    def stop(self, timeout=5):
+        """
+        Stop the drainer thread and release the spool.
+        """
+        self._stopped.set()
+        self._thread.join(timeout)
+        self.spool.close()
+        if self.lock_file is not None:
+            self.lock_file.close()
@@ -1,97 +1,130 @@
 """
 Contains tasks related to Openedx Caliper Tracking.
 """
+import functools
 import json
 import logging
 import random
 
+from celery.signals import worker_process_shutdown, worker_shutdown
 from celery.task import task
 from django.conf import settings
 from django.core.cache import cache
-from kafka import KafkaProducer
-from kafka.errors import KafkaError
+from kafka.errors import KafkaError, KafkaTimeoutError
 
+from openedx_caliper_tracking.dead_letter import write_dead_letter
 from openedx_caliper_tracking.utils import send_notification
 from openedx_caliper_tracking.exceptions import InvalidConfigurationsError
-from openedx_caliper_tracking.kafka_utils import get_kafka_producer_configurations
+from openedx_caliper_tracking.health import DEFAULT_SYNC_INTERVAL, EMAIL_DELIVERY_CACHE_KEY, BrokerHealth
+from openedx_caliper_tracking.kafka_utils import (close_kafka_producer, get_kafka_producer, get_topic_name,
+                                                  is_async_send_enabled, send_caliper_event)
 from openedx_caliper_tracking.loggers import get_caliper_logger
+from openedx_caliper_tracking.metrics import SINK_KAFKA, record_timing, start_timer
+from openedx_caliper_tracking.process_local import ProcessLocal
 
 LOGGER = logging.getLogger(__name__)
 CALIPER_DELIVERY_FAILURE_LOGGER = get_caliper_logger(
     'caliper_delivery_failure', 'local3'
 )
 
-EMAIL_DELIVERY_CACHE_KEY = 'IS_KAFKA_DELIVERY_FAILURE_EMAIL_SENT'
-HOST_ERROR_CACHE_KEY = 'HOST_NOT_FOUND_ERROR'
-
 DEFAULT_FROM_EMAIL = settings.DEFAULT_FROM_EMAIL
 REPORT_EMAIL_VALIDITY_PERIOD = 86400  # in ms. Equals to one day.
 
 MAXIMUM_RETRIES = getattr(settings, 'CALIPER_KAFKA_SETTINGS', {}).get('MAXIMUM_RETRIES', 3)
 
+_BROKER_HEALTH = ProcessLocal(lambda sync_interval: BrokerHealth(
+    sync_interval,
+    on_failure=lambda error: sent_kafka_failure_email.delay(error),
+    on_recovery=lambda: send_system_recovery_email.delay(),
+))
+
+_TASK_ENQUEUER = {'enqueue': None}
+
+
+def enqueue_task(task, *args):
+    """
+    Enqueue a delivery task with Celery, or with the function set by ``set_task_enqueuer``.
+    """
+    enqueue = _TASK_ENQUEUER['enqueue']
+    if enqueue is not None:
+        return enqueue(task, *args)
+    return task.delay(*args)
+
+
+def set_task_enqueuer(enqueue):
+    """
+    Replace the Celery enqueuing of the delivery tasks with ``enqueue(task, *args)``, None to restore it.
+
+    Returns the enqueue function it replaces.
+    """
+    previous = _TASK_ENQUEUER['enqueue']
+    _TASK_ENQUEUER['enqueue'] = enqueue
+    return previous
+
+
+def record_kafka_timing(deliver):
+    """
+    Decorator recording the duration of a delivery of an event to kafka.
+
+    The delivery is recorded as successful if the decorated task returns True.
+    """
+    @functools.wraps(deliver)
+    def wrapper(self, transformed_event, event_type):
+        started = start_timer()
+        succeeded = False
+        try:
+            result = deliver(self, transformed_event, event_type)
+            succeeded = result is True
+            return result
+        finally:
+            record_timing(SINK_KAFKA, event_type, started, succeeded)
+    return wrapper
+
 
 @task(bind=True, max_retries=MAXIMUM_RETRIES)
+@record_kafka_timing
 def deliver_caliper_event_to_kafka(self, transformed_event, event_type):
     """
     Deliver caliper event to kafka.
 
     Retries for the given number of max_tries in case of any error else
     sends an error report to the specified email address.
+
+    If ``ASYNC_SEND`` is set in ``CALIPER_KAFKA_SETTINGS`` the event is only
+    handed over to the shared producer, which batches it with other events.
+    Its delivery is then reported by ``kafka_send_succeeded`` or
+    ``kafka_send_failed`` instead of waiting for a flush.
+
+    Returns True if the event was delivered or handed over to the producer.
     """
     KAFKA_SETTINGS = settings.CALIPER_KAFKA_SETTINGS
 
     bootstrap_servers = KAFKA_SETTINGS['PRODUCER_CONFIG']['bootstrap_servers']
-    topic_name = KAFKA_SETTINGS['TOPIC_NAME']
+    topic_name = get_topic_name(event_type)
 
     try:
         LOGGER.info('Attempt # {} of sending event: {} to kafka ({}) is in progress.'.format(
                     self.request_stack().get('retries'), event_type, bootstrap_servers))
 
-        try:
-            producer_configrations = get_kafka_producer_configurations()
-            producer = KafkaProducer(
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-                **producer_configrations
-            )
-
-        # Invalid/unsupported arguments are provided
-        except (TypeError, AttributeError) as ex:
-            LOGGER.exception(
-                'Invalid configurations are provided for KafkaProducer: %s', str(ex)
-            )
-            raise InvalidConfigurationsError('Invalid Configurations are provided')
-
-        # Most probably a certificate file was not found.
-        except IOError as ex:
-            LOGGER.exception(
-                'Configured Certificate is not found: %s', str(ex)
-            )
-            raise InvalidConfigurationsError('Invalid Configurations are provided')
-
-        producer.send(topic_name, transformed_event).add_errback(host_not_found,
-                                                                 event=transformed_event,
-                                                                 event_type=event_type)
+        producer = get_task_producer()
+        future = send_caliper_event(producer, topic_name, transformed_event)
 
-        producer.flush()
-
-        if cache.get(HOST_ERROR_CACHE_KEY):
-            cache.set(HOST_ERROR_CACHE_KEY, False)
-            return
+        if is_async_send_enabled():
+            future.add_callback(kafka_send_succeeded, event_type=event_type)
+            future.add_errback(kafka_send_failed, event=transformed_event, event_type=event_type)
+            return True
 
-        if cache.get(EMAIL_DELIVERY_CACHE_KEY):
-            send_system_recovery_email.delay()
-            cache.set(EMAIL_DELIVERY_CACHE_KEY, False)
-
-        LOGGER.info('Logs Delivered Successfully: Event ({}) has been successfully sent to kafka ({}).'.format(
-            event_type, bootstrap_servers))
+        future.add_errback(host_not_found, event=transformed_event, event_type=event_type)
+        producer.flush()
+        return report_delivery_success(event_type, future)
 
     except KafkaError as error:
         LOGGER.error(('Logs Delivery Failed: Could not deliver event ({}) to kafka ({}) because'
                       ' of {}.').format(event_type, bootstrap_servers, error.__class__.__name__))
 
         if self.request_stack().get('retries') == KAFKA_SETTINGS['MAXIMUM_RETRIES']:
-            CALIPER_DELIVERY_FAILURE_LOGGER.info(json.dumps(transformed_event))
-            sent_kafka_failure_email.delay(error.__class__.__name__)
+            get_broker_health().record_failure(error.__class__.__name__)
+            report_undelivered_event(transformed_event, event_type, error, self.request.retries + 1)
             return
 
         self.retry(exc=error, countdown=int(
@@ -106,7 +139,237 @@ def deliver_caliper_event_to_kafka(self, transformed_event, event_type):
                           str(ex)
         ))
 
-        sent_kafka_failure_email.delay(ex.__class__.__name__)
+        get_broker_health().record_failure(ex.__class__.__name__)
+
+
+@task(bind=True, max_retries=MAXIMUM_RETRIES)
+def deliver_caliper_events_to_kafka(self, events):
+    """
+    Deliver a batch of caliper events to kafka.
+
+    ``events`` is a list of ``[transformed_event, event_type]`` pairs. The
+    events are sent with a single flush of the producer, or without any
+    flush if ``ASYNC_SEND`` is set. Only the events that could not be
+    delivered are retried, as a smaller batch, and only those are logged
+    to the delivery failure log once the retries are exhausted.
+    """
+    KAFKA_SETTINGS = settings.CALIPER_KAFKA_SETTINGS
+
+    bootstrap_servers = KAFKA_SETTINGS['PRODUCER_CONFIG']['bootstrap_servers']
+
+    started = start_timer()
+    LOGGER.info('Attempt # {} of sending {} events to kafka ({}) is in progress.'.format(
+                self.request.retries, len(events), bootstrap_servers))
+
+    try:
+        producer = get_task_producer()
+    except InvalidConfigurationsError as ex:
+        # No need to retry the task if there is some configurations issue.
+        LOGGER.error(('Logs Delivery Failed: Could not deliver {} events to kafka ({}) due'
+                      ' to the error: {}').format(len(events), bootstrap_servers, str(ex)))
+        for _, event_type in events:
+            record_timing(SINK_KAFKA, event_type, started, False)
+        get_broker_health().record_failure(ex.__class__.__name__)
+        return
+
+    async_send = is_async_send_enabled()
+    sent = []
+    failed = []
+    for transformed_event, event_type in events:
+        try:
+            future = send_caliper_event(producer, get_topic_name(event_type), transformed_event)
+        except KafkaError as error:
+            failed.append((transformed_event, event_type, error))
+            continue
+
+        if async_send:
+            future.add_callback(kafka_send_succeeded, event_type=event_type)
+            future.add_errback(kafka_send_failed, event=transformed_event, event_type=event_type)
+        sent.append((transformed_event, event_type, future))
+
+    delivered = []
+    if async_send:
+        delivered = [event_type for _, event_type, _ in sent]
+    elif sent:
+        producer.flush()
+        for transformed_event, event_type, future in sent:
+            if future.is_done and future.succeeded():
+                delivered.append(event_type)
+            else:
+                failed.append((transformed_event, event_type, future.exception or KafkaTimeoutError()))
+
+    if delivered and not async_send:
+        get_broker_health().record_success()
+        LOGGER.info('Logs Delivered Successfully: {} events ({}) have been successfully sent to kafka ({}).'.format(
+            len(delivered), ', '.join(sorted(set(delivered))), bootstrap_servers))
+    for event_type in delivered:
+        record_timing(SINK_KAFKA, event_type, started, True)
+    for _, event_type, _ in failed:
+        record_timing(SINK_KAFKA, event_type, started, False)
+
+    if not failed:
+        return
+
+    error = failed[0][2]
+    LOGGER.error(('Logs Delivery Failed: Could not deliver {} of {} events to kafka ({}) because'
+                  ' of {}.').format(len(failed), len(events), bootstrap_servers, error.__class__.__name__))
+
+    if self.request.retries >= KAFKA_SETTINGS['MAXIMUM_RETRIES']:
+        get_broker_health().record_failure(error.__class__.__name__)
+        for transformed_event, event_type, event_error in failed:
+            report_undelivered_event(transformed_event, event_type, event_error, self.request.retries + 1)
+        return
+
+    self.retry(
+        args=([[transformed_event, event_type] for transformed_event, event_type, _ in failed],),
+        exc=error,
+        countdown=int(random.uniform(2, 4) ** self.request.retries)
+    )
+
+
+def get_task_producer():
+    """
+    Return the shared KafkaProducer, raising InvalidConfigurationsError if it cannot be created.
+    """
+    try:
+        return get_kafka_producer()
+
+    # Invalid/unsupported arguments are provided
+    except (TypeError, AttributeError) as ex:
+        LOGGER.exception(
+            'Invalid configurations are provided for KafkaProducer: %s', str(ex)
+        )
+        raise InvalidConfigurationsError('Invalid Configurations are provided')
+
+    # Most probably a certificate file was not found.
+    except IOError as ex:
+        LOGGER.exception(
+            'Configured Certificate is not found: %s', str(ex)
+        )
+        raise InvalidConfigurationsError('Invalid Configurations are provided')
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def close_kafka_producer_on_shutdown(**kwargs):
+    """
+    Flush and close the KafkaProducer when a Celery worker (process) shuts down.
+    """
+    close_kafka_producer()
+
+
+def get_broker_health():
+    """
+    Return the health state of the Kafka brokers of the current process.
+    """
+    return _BROKER_HEALTH.get((
+        getattr(settings, 'CALIPER_KAFKA_SETTINGS', {}).get('HEALTH_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL),
+    ))
+
+
+def reset_broker_health():
+    """
+    Forget the health state of the Kafka brokers of the current process.
+    """
+    _BROKER_HEALTH.reset()
+
+
+def report_delivery_success(event_type, future):
+    """
+    Log the delivery of an event flushed by the producer and record the brokers as healthy.
+
+    Returns False if the event could not be delivered, which is reported by ``host_not_found``.
+    """
+    if not (future.is_done and future.succeeded()):
+        return False
+
+    get_broker_health().record_success()
+    LOGGER.info('Logs Delivered Successfully: Event ({}) has been successfully sent to kafka ({}).'.format(
+        event_type, settings.CALIPER_KAFKA_SETTINGS['PRODUCER_CONFIG']['bootstrap_servers']))
+    return True
+
+
+def report_undelivered_event(event, event_type, error, attempts):
+    """
+    Log an event that could not be delivered and store its dead letter, if configured.
+
+    Never raises, so that the failure of an event does not stop the report of the others.
+
+    @params
+    event: (dict) caliperized event
+    event_type: (str) type of the event
+    error: (Exception) error the last delivery attempt failed with
+    attempts: (int) number of delivery attempts made
+    """
+    CALIPER_DELIVERY_FAILURE_LOGGER.info(json.dumps(event))
+    try:
+        write_dead_letter(event, event_type, error.__class__.__name__, attempts)
+    except Exception as ex:  # pylint: disable=broad-except
+        LOGGER.exception('Could not store dead letter of event ({}): {}'.format(event_type, ex))
+
+
+def kafka_send_succeeded(record_metadata, event_type):
+    """
+    Callback method.
+
+    It would be called by the producer once an event sent with ``ASYNC_SEND`` is acknowledged.
+    """
+    get_broker_health().record_success()
+    LOGGER.info('Logs Delivered Successfully: Event ({}) has been successfully sent to kafka ({}).'.format(
+        event_type, settings.CALIPER_KAFKA_SETTINGS['PRODUCER_CONFIG']['bootstrap_servers']))
+
+
+def kafka_send_failed(error, event, event_type):
+    """
+    Callback method.
+
+    It would be called by the producer once it gave up on an event sent with
+    ``ASYNC_SEND``, after the retries configured for the producer.
+    """
+    LOGGER.error(('Logs Delivery Failed: Could not deliver event ({}) to kafka ({}) because'
+                  ' of {}.').format(event_type,
+                                    settings.CALIPER_KAFKA_SETTINGS['PRODUCER_CONFIG']['bootstrap_servers'],
+                                    error.__class__.__name__))
+    get_broker_health().record_failure(error.__class__.__name__)
+    report_undelivered_event(event, event_type, error, 1)
+
+
+def send_caliper_event_to_kafka(transformed_event, event_type):
+    """
+    Send caliper event to kafka from the current process, without a Celery task.
+
+    Used by the direct delivery mode. The event is handed over to the shared
+    producer without waiting for it to be flushed. If the producer cannot be
+    created or does not accept the event, the event is delivered with the
+    ``deliver_caliper_event_to_kafka`` task instead.
+    """
+    try:
+        future = send_caliper_event(get_task_producer(), get_topic_name(event_type), transformed_event)
+    except (InvalidConfigurationsError, KafkaError) as ex:
+        LOGGER.warning('Could not send event ({}) to kafka directly because of {}, delivering it with celery.'.format(
+            event_type, ex.__class__.__name__))
+        enqueue_task(deliver_caliper_event_to_kafka, transformed_event, event_type)
+        return
+
+    future.add_callback(kafka_send_succeeded, event_type=event_type)
+    future.add_errback(direct_send_failed, event=transformed_event, event_type=event_type)
+
+
+def direct_send_failed(error, event, event_type):
+    """
+    Callback method.
+
+    It would be called by the producer once it gave up on an event sent in the
+    direct delivery mode. The failure is reported like a "Host Not Found" error
+    and the event is delivered with the ``deliver_caliper_event_to_kafka`` task,
+    which logs it to the delivery failure log if it cannot be delivered either.
+    """
+    host_not_found(error, event, event_type)
+    try:
+        enqueue_task(deliver_caliper_event_to_kafka, event, event_type)
+    except Exception as ex:  # pylint: disable=broad-except
+        LOGGER.error('Could not hand event ({}) over to celery: {}'.format(event_type, ex))
+        report_undelivered_event(event, event_type, error, 1)
 
 
 def host_not_found(error, event, event_type):
@@ -121,8 +384,7 @@ def host_not_found(error, event, event_type):
         settings.CALIPER_KAFKA_SETTINGS['PRODUCER_CONFIG']['bootstrap_servers'],
         HOST_NOT_FOUND_ERROR
     ))
-    cache.set(HOST_ERROR_CACHE_KEY, True)
-    sent_kafka_failure_email.delay(HOST_NOT_FOUND_ERROR)
+    get_broker_health().record_failure(HOST_NOT_FOUND_ERROR)
 
 
 @task(bind=True)
@@ -0,0 +1,210 @@
+"""
+Contains the test cases for the dead letters of the
+openedx_caliper_tracking events undeliverable to Kafka.
+"""
+import shutil
+import tempfile
+
+import mock
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from kafka.errors import KafkaError, KafkaTimeoutError, NoBrokersAvailable
+from kafka.structs import TopicPartition
+
+from openedx_caliper_tracking.dead_letter import (DeadLetterReplayer, DeadLetterSegments, DeadLetterSender,
+                                                  get_dead_letter_sender, stop_dead_letter_sender, write_dead_letter)
+from openedx_caliper_tracking.kafka_utils import close_kafka_producer
+from openedx_caliper_tracking.tasks import (deliver_caliper_event_to_kafka, deliver_caliper_events_to_kafka,
+                                            reset_broker_health)
+from openedx_caliper_tracking.tests.test_caliper_kafka import (CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE,
+                                                               CALIPER_KAFKA_SETTINGS_FIXTURE)
+
+
+def make_future(succeeded=True):
+    future = mock.MagicMock(is_done=True, exception=None if succeeded else KafkaError())
+    future.succeeded.return_value = succeeded
+    return future
+
+
+class FakeDeadLetterConsumer(object):
+    """
+    Consumer of a single partition dead-letter topic that dead letters can be added to while it is read.
+    """
+
+    def __init__(self, dead_letters):
+        self.partition = TopicPartition('dead letters', 0)
+        self.records = []
+        self.offset = 0
+        self.paused = False
+        self.committed = None
+        for dead_letter in dead_letters:
+            self.add(dead_letter)
+
+    def add(self, dead_letter):
+        self.records.append(mock.Mock(offset=len(self.records), value=dead_letter))
+
+    def poll(self, timeout_ms, max_records):
+        records = [] if self.paused else self.records[self.offset:self.offset + max_records]
+        self.offset += len(records)
+        return {self.partition: records} if records else {}
+
+    def assignment(self):
+        return {self.partition}
+
+    def end_offsets(self, partitions):
+        return {self.partition: len(self.records)}
+
+    def position(self, partition):
+        return self.offset
+
+    def pause(self, partition):
+        self.paused = True
+
+    def commit(self, offsets):
+        self.committed = offsets[self.partition].offset
+
+
+class CaliperDeadLetterTestCase(TestCase):
+    """
+    Test the storage and the replay of dead letters.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.kafka_settings = dict(CALIPER_KAFKA_SETTINGS_FIXTURE, DEAD_LETTER_DIRECTORY=self.directory)
+        close_kafka_producer()
+        self.addCleanup(close_kafka_producer)
+        reset_broker_health()
+        self.addCleanup(reset_broker_health)
+        self.addCleanup(stop_dead_letter_sender)
+
+    def _dead_letters(self, segments):
+        segments.seal()
+        return [
+            dead_letter for path in segments.sealed_segments() for _, dead_letter in segments.read(path)
+        ]
+
+    def test_dead_letters_are_written_with_failure_metadata(self):
+        with override_settings(CALIPER_KAFKA_SETTINGS=self.kafka_settings):
+            write_dead_letter({'id': 1}, 'book', 'KafkaTimeoutError', 4)
+
+        dead_letters = self._dead_letters(DeadLetterSegments(self.directory))
+        self.assertEqual(len(dead_letters), 1)
+        self.assertEqual(dead_letters[0]['event'], {'id': 1})
+        self.assertEqual(dead_letters[0]['topic'], 'dummy topic')
+        self.assertEqual(dead_letters[0]['error'], 'KafkaTimeoutError')
+        self.assertEqual(dead_letters[0]['attempts'], 4)
+
+    @mock.patch('openedx_caliper_tracking.tasks.sent_kafka_failure_email.delay', autospec=True)
+    @mock.patch('openedx_caliper_tracking.kafka_utils.KafkaProducer', autospec=True)
+    def test_exhausted_events_are_sent_to_dead_letter_topic(self, producer_mock, sent_email_mock):
+        producer_mock.return_value.send.side_effect = [make_future(True), make_future(False), make_future(True)]
+        kafka_settings = dict(CALIPER_KAFKA_SETTINGS_FIXTURE, MAXIMUM_RETRIES=0, DEAD_LETTER_TOPIC='dead letters')
+
+        with override_settings(CALIPER_KAFKA_SETTINGS=kafka_settings,
+                               CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE):
+            deliver_caliper_events_to_kafka([[{'id': 1}, 'book'], [{'id': 2}, 'book']])
+            stop_dead_letter_sender()
+
+        self.assertEqual(producer_mock.call_args[1]['max_block_ms'], 0)
+        topic, dead_letter = producer_mock.return_value.send.call_args[0]
+        self.assertEqual(topic, 'dead letters')
+        self.assertEqual(dead_letter['event'], {'id': 2})
+        self.assertEqual(dead_letter['attempts'], 1)
+
+    @mock.patch('openedx_caliper_tracking.tasks.get_broker_health', autospec=True)
+    @mock.patch('openedx_caliper_tracking.kafka_utils.KafkaProducer', autospec=True)
+    def test_unreachable_dead_letter_topic_does_not_hide_the_failure(self, producer_mock, broker_health_mock):
+        task_producer = mock.MagicMock()
+        task_producer.send.side_effect = KafkaTimeoutError()
+        producer_mock.side_effect = [task_producer, NoBrokersAvailable()]
+        kafka_settings = dict(CALIPER_KAFKA_SETTINGS_FIXTURE, MAXIMUM_RETRIES=0, DEAD_LETTER_TOPIC='dead letters')
+
+        with override_settings(CALIPER_KAFKA_SETTINGS=kafka_settings,
+                               CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE):
+            result = deliver_caliper_event_to_kafka.apply(args=({'id': 1}, 'book'))
+            sender = get_dead_letter_sender()
+            sender.flush()
+
+        self.assertTrue(result.successful())
+        broker_health_mock.return_value.record_failure.assert_called_once_with('KafkaTimeoutError')
+        self.assertEqual(sender.dropped, 1)
+
+    @mock.patch('openedx_caliper_tracking.kafka_utils.KafkaProducer', autospec=True)
+    def test_dead_letter_sender_drops_dead_letters_it_cannot_buffer(self, producer_mock):
+        producer_mock.return_value.send.side_effect = KafkaTimeoutError()
+        sender = DeadLetterSender({'bootstrap_servers': ['localhost:9092']}, queue_size=1)
+        self.addCleanup(sender.close)
+
+        dead_letter = {'event': {'id': 1}, 'event_type': 'book'}
+        sender.submit('dead letters', dead_letter)
+        sender.flush()
+        self.assertEqual(sender.dropped, 1)
+        producer_mock.return_value.send.assert_called_once_with('dead letters', dead_letter, key=None)
+
+    def test_segments_are_replayed_at_controlled_rate(self):
+        segments = DeadLetterSegments(self.directory)
+        with override_settings(CALIPER_KAFKA_SETTINGS=self.kafka_settings):
+            for index in range(5):
+                write_dead_letter({'id': index}, 'book', 'KafkaError', 4)
+
+            producer = mock.MagicMock()
+            producer.send.return_value = make_future(True)
+            with mock.patch('openedx_caliper_tracking.dead_letter.time.sleep') as sleep_mock:
+                replayer = DeadLetterReplayer(producer, rate=10, batch_size=2)
+                self.assertTrue(replayer.replay_segments(segments))
+
+        self.assertEqual([call[0][1] for call in producer.send.call_args_list], [{'id': index} for index in range(5)])
+        self.assertEqual(producer.flush.call_count, 3)
+        self.assertEqual(sleep_mock.call_count, 3)
+        self.assertEqual(replayer.replayed, 5)
+        self.assertEqual(segments.sealed_segments(), [])
+
+    def test_topic_replay_stops_at_the_end_offsets_it_started_with(self):
+        consumer = FakeDeadLetterConsumer(
+            [{'event': {'id': index}, 'event_type': 'book', 'attempts': 1} for index in range(3)]
+        )
+        producer = mock.MagicMock()
+        producer.send.side_effect = [make_future(False), make_future(True), make_future(True)]
+
+        with override_settings(CALIPER_KAFKA_SETTINGS=self.kafka_settings), \
+                mock.patch('openedx_caliper_tracking.dead_letter.write_dead_letter') as write_mock:
+            write_mock.side_effect = lambda event, event_type, error, attempts: consumer.add(
+                {'event': event, 'event_type': event_type, 'attempts': attempts})
+            replayer = DeadLetterReplayer(producer, rate=0, batch_size=2)
+            self.assertTrue(replayer.replay_topic(consumer))
+
+        self.assertEqual(replayer.replayed, 2)
+        self.assertEqual(replayer.failed, 1)
+        self.assertEqual(consumer.committed, 3)
+        self.assertEqual(consumer.records[3].value, {'event': {'id': 0}, 'event_type': 'book', 'attempts': 2})
+
+    def test_replay_stops_and_keeps_dead_letters_when_kafka_is_down(self):
+        segments = DeadLetterSegments(self.directory)
+        with override_settings(CALIPER_KAFKA_SETTINGS=self.kafka_settings):
+            for index in range(4):
+                write_dead_letter({'id': index}, 'book', 'KafkaError', 4)
+
+            producer = mock.MagicMock()
+            producer.send.side_effect = [make_future(True), make_future(True), make_future(False), make_future(False)]
+            replayer = DeadLetterReplayer(producer, rate=0, batch_size=2)
+            self.assertFalse(replayer.replay_segments(segments))
+
+        self.assertEqual((replayer.replayed, replayer.failed), (2, 2))
+        dead_letters = self._dead_letters(segments)
+        self.assertEqual([dead_letter['event'] for dead_letter in dead_letters], [{'id': 2}, {'id': 3}])
+        self.assertEqual([dead_letter['attempts'] for dead_letter in dead_letters], [5, 5])
+
+    @mock.patch('openedx_caliper_tracking.kafka_utils.KafkaProducer', autospec=True)
+    def test_replay_command(self, producer_mock):
+        producer_mock.return_value.send.return_value = make_future(True)
+        with override_settings(CALIPER_KAFKA_SETTINGS=self.kafka_settings,
+                               CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE):
+            write_dead_letter({'id': 1}, 'book', 'KafkaError', 4)
+            call_command('caliper_replay_dead_letters', rate=0)
+
+            producer_mock.return_value.send.assert_called_once_with('dummy topic', {'id': 1}, key=None)
+            with self.assertRaises(CommandError):
+                call_command('caliper_replay_dead_letters', source='topic')
@@ -2,12 +2,29 @@
 Contains the test cases for openedx_caliper_tracking
 application logs delivery to Rest API.
 """
+import asyncio
+import gzip
 import json
+import threading
+from io import StringIO
 
 import mock
+from django.core.management import call_command
 from django.test import TestCase, override_settings
+from requests.exceptions import ReadTimeout
 
-from openedx_caliper_tracking.processor import CaliperProcessor
+from openedx_caliper_tracking import processor
+from openedx_caliper_tracking.async_delivery import AsyncDeliveryEngine
+from openedx_caliper_tracking.base_transformer import CALIPER_EVENT_CONTEXT
+from openedx_caliper_tracking.batching import EventBatcher
+from openedx_caliper_tracking.caliper_config import EVENT_MAPPING, EVENT_PRIORITIES
+from openedx_caliper_tracking.circuit_breaker import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, CircuitBreaker
+from openedx_caliper_tracking.delivery_client import get_delivery_client, reset_delivery_client
+from openedx_caliper_tracking.dispatcher import (OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL_TO_DISK,
+                                                 PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, DeliveryDispatcher)
+from openedx_caliper_tracking.metrics import ALL_EVENT_TYPES, SINK_REST_REQUEST, get_metrics_registry, get_metrics_stats
+from openedx_caliper_tracking.processor import (CaliperProcessor, deliver_caliper_event, flush_rest_batcher,
+                                                get_event_priority, get_request_body, stop_delivery_dispatcher)
 from openedx_caliper_tracking.tests import TEST_DIR_PATH
 
 
@@ -68,3 +85,502 @@ class CaliperDeliveryTestCase(TestCase):
         """
         CaliperProcessor().__call__(self.event)
         self.assertTrue(self.delivery_mock.called)
+
+
+@override_settings(
+    CALIPER_DELIVERY_ENDPOINT='http://localhost:3000',
+    CALIPER_DELIVERY_AUTH_TOKEN='test_auth_token',
+    CALIPER_DELIVERY_SETTINGS={'POOL_SIZE': 4, 'CONNECT_TIMEOUT': 1, 'READ_TIMEOUT': 2}
+)
+class CaliperDeliveryClientTestCase(TestCase):
+    """
+    Test the pooled keep-alive client used for delivering events to the REST endpoint.
+    """
+
+    def setUp(self):
+        reset_delivery_client()
+        self.addCleanup(reset_delivery_client)
+
+    @mock.patch('openedx_caliper_tracking.delivery_client.requests.Session.post', autospec=True)
+    def test_deliver_caliper_event_uses_pooled_session_with_timeouts(self, post_mock):
+        post_mock.return_value = mock.MagicMock(status_code=200)
+
+        deliver_caliper_event({'id': 'dummy-id'}, 'book')
+        deliver_caliper_event({'id': 'dummy-id'}, 'book')
+
+        self.assertEqual(post_mock.call_count, 2)
+        sessions = {call[0][0] for call in post_mock.call_args_list}
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(post_mock.call_args[1]['timeout'], (1, 2))
+        self.assertEqual(get_delivery_client().get_pool_stats()['requests_sent'], 2)
+
+    @mock.patch('openedx_caliper_tracking.processor.log_failure', autospec=True)
+    @mock.patch(
+        'openedx_caliper_tracking.delivery_client.requests.Session.post',
+        autospec=True,
+        side_effect=ReadTimeout
+    )
+    def test_deliver_caliper_event_with_timeout(self, post_mock, log_failure_mock):
+        deliver_caliper_event({'id': 'dummy-id'}, 'book')
+        log_failure_mock.assert_called_with('dummy-id', 504)
+        self.assertEqual(get_delivery_client().get_pool_stats()['requests_failed'], 1)
+
+    def test_client_is_rebuilt_after_fork_or_configuration_change(self):
+        client = get_delivery_client()
+        self.assertIs(client, get_delivery_client())
+        self.assertEqual(client.get_pool_stats()['pool_size'], 4)
+
+        with mock.patch('openedx_caliper_tracking.process_local.os.getpid', return_value=client.pid + 1):
+            self.assertIsNot(client, get_delivery_client())
+
+        with self.settings(CALIPER_DELIVERY_SETTINGS={'POOL_SIZE': 8}):
+            self.assertEqual(get_delivery_client().pool_size, 8)
+
+
+class CaliperBatchingTestCase(TestCase):
+    """
+    Test the batching of events delivered to the REST endpoint.
+    """
+
+    def test_batch_is_flushed_on_record_and_byte_limits(self):
+        flushed = []
+        batcher = EventBatcher(flushed.append, max_records=3, max_bytes=100, max_wait_ms=60000)
+
+        batcher.add('a', 10)
+        batcher.add('b', 10)
+        self.assertEqual(flushed, [])
+        batcher.add('c', 10)
+        self.assertEqual(flushed, [['a', 'b', 'c']])
+
+        batcher.add('d', 150)
+        self.assertEqual(flushed, [['a', 'b', 'c'], ['d']])
+
+        batcher.add('e', 10)
+        batcher.close()
+        self.assertEqual(flushed[-1], ['e'])
+
+    def test_max_bytes_is_a_ceiling(self):
+        flushed = []
+        batcher = EventBatcher(flushed.append, max_records=100, max_bytes=100, max_wait_ms=60000)
+
+        batcher.add('a', 60)
+        batcher.add('b', 60)
+        self.assertEqual(flushed, [['a']])
+        batcher.add('c', 40)
+        self.assertEqual(flushed, [['a'], ['b', 'c']])
+
+    def test_batch_is_flushed_after_max_wait(self):
+        flushed = threading.Event()
+        batcher = EventBatcher(lambda batch: flushed.set(), max_records=100, max_wait_ms=10)
+        self.addCleanup(batcher.close)
+
+        batcher.add('a', 10)
+        self.assertTrue(flushed.wait(5))
+        self.assertEqual(len(batcher), 0)
+
+    @mock.patch('openedx_caliper_tracking.processor.log_success', autospec=True)
+    @mock.patch('openedx_caliper_tracking.delivery_client.requests.Session.post', autospec=True)
+    @override_settings(
+        CALIPER_DELIVERY_ENDPOINT='http://localhost:3000',
+        CALIPER_DELIVERY_AUTH_TOKEN='test_auth_token',
+        CALIPER_DELIVERY_SETTINGS={'ENABLE_BATCHING': True, 'BATCH_MAX_RECORDS': 2, 'BATCH_MAX_WAIT_MS': 60000}
+    )
+    def test_events_are_delivered_as_multi_record_payload(self, post_mock, log_success_mock):
+        post_mock.return_value = mock.MagicMock(status_code=200)
+        self.addCleanup(flush_rest_batcher)
+
+        deliver_caliper_event({'id': 'first'}, 'book')
+        self.assertFalse(post_mock.called)
+        deliver_caliper_event({'id': 'second'}, 'book')
+
+        self.assertEqual(post_mock.call_count, 1)
+        payload = json.loads(post_mock.call_args[1]['data'].decode('utf-8'))
+        self.assertEqual(
+            [record['value']['id'] for record in payload['records']],
+            ['first', 'second']
+        )
+        self.assertEqual(log_success_mock.call_count, 2)
+
+
+class CaliperEnvelopeTestCase(TestCase):
+    """
+    Test the delivery of events packed in Caliper Envelopes.
+    """
+
+    @mock.patch('openedx_caliper_tracking.processor.log_success', autospec=True)
+    @mock.patch('openedx_caliper_tracking.delivery_client.requests.Session.post', autospec=True)
+    @override_settings(
+        CALIPER_DELIVERY_ENDPOINT='http://localhost:3000',
+        CALIPER_DELIVERY_AUTH_TOKEN='test_auth_token',
+        LMS_ROOT_URL='https://lms.example.com',
+        CALIPER_DELIVERY_SETTINGS={'PAYLOAD_FORMAT': 'envelope', 'BATCH_MAX_BYTES': 1024,
+                                   'BATCH_MAX_WAIT_MS': 60000}
+    )
+    def test_envelopes_are_packed_under_the_byte_ceiling(self, post_mock, log_success_mock):
+        post_mock.return_value = mock.MagicMock(status_code=200)
+        self.addCleanup(flush_rest_batcher)
+
+        for index in range(10):
+            deliver_caliper_event({
+                '@context': CALIPER_EVENT_CONTEXT,
+                'id': 'event-{}'.format(index),
+                'padding': 'x' * 150,
+            }, 'book')
+        flush_rest_batcher()
+
+        self.assertGreater(post_mock.call_count, 1)
+        delivered = []
+        for call in post_mock.call_args_list:
+            self.assertLessEqual(len(call[1]['data']), 1024)
+            self.assertEqual(call[1]['headers']['Content-Type'], 'application/json')
+
+            envelope = json.loads(call[1]['data'].decode('utf-8'))
+            self.assertEqual(envelope['sensor'], 'https://lms.example.com')
+            self.assertEqual(envelope['dataVersion'], CALIPER_EVENT_CONTEXT)
+            self.assertTrue(all('@context' not in event for event in envelope['data']))
+            delivered.extend(event['id'] for event in envelope['data'])
+
+        self.assertEqual(delivered, ['event-{}'.format(index) for index in range(10)])
+        self.assertEqual(log_success_mock.call_count, 10)
+
+
+class CaliperDispatcherTestCase(TestCase):
+    """
+    Test the background dispatcher used for delivering events to the REST endpoint.
+    """
+
+    def _get_blocked_dispatcher(self, overflow_policy, **kwargs):
+        """
+        Return a dispatcher whose single worker is blocked on the first event.
+        """
+        self.release = threading.Event()
+        self.delivered = []
+        started = threading.Event()
+
+        def deliver(event, event_type):
+            started.set()
+            self.release.wait(5)
+            self.delivered.append(event)
+
+        dispatcher = DeliveryDispatcher(deliver, queue_size=2, worker_threads=1,
+                                        overflow_policy=overflow_policy, **kwargs)
+        self.addCleanup(dispatcher.close)
+        self.addCleanup(self.release.set)
+        dispatcher.submit('blocking', 'book')
+        started.wait(5)
+        return dispatcher
+
+    def test_drop_oldest_policy(self):
+        dispatcher = self._get_blocked_dispatcher(OVERFLOW_DROP_OLDEST)
+        for event in ('first', 'second', 'third'):
+            dispatcher.submit(event, 'book')
+
+        self.assertEqual(dispatcher.get_stats()['queue_depth'], 2)
+        self.assertEqual(dispatcher.get_stats()['dropped'], 1)
+        self.release.set()
+        self.assertTrue(dispatcher.join(5))
+        self.assertEqual(self.delivered, ['blocking', 'second', 'third'])
+
+    def test_drop_newest_policy(self):
+        dispatcher = self._get_blocked_dispatcher(OVERFLOW_DROP_NEWEST)
+        results = [dispatcher.submit(event, 'book') for event in ('first', 'second', 'third')]
+
+        self.assertEqual(results, [True, True, False])
+        self.release.set()
+        self.assertTrue(dispatcher.join(5))
+        self.assertEqual(self.delivered, ['blocking', 'first', 'second'])
+
+    def test_spill_to_disk_policy(self):
+        spill = mock.Mock(side_effect=[True, False])
+        dispatcher = self._get_blocked_dispatcher(OVERFLOW_SPILL_TO_DISK, spill=spill)
+        results = [dispatcher.submit(event, 'book', label='book') for event in ('first', 'second', 'third', 'fourth')]
+
+        self.assertEqual(results, [True, True, True, False])
+        self.assertEqual(spill.call_args_list, [mock.call('third', 'book'), mock.call('fourth', 'book')])
+        self.assertEqual(dispatcher.get_stats()['spilled'], 1)
+        self.assertEqual(dispatcher.get_stats()['shed_by_type'], {'book': 1})
+
+    @mock.patch('openedx_caliper_tracking.processor.DeliveryDispatcher', autospec=True)
+    @override_settings(
+        LMS_ROOT_URL='http://localhost:3000',
+        CALIPER_DELIVERY_ENDPOINT='http://localhost:3000',
+        CALIPER_DELIVERY_AUTH_TOKEN='test_auth_token',
+        CALIPER_DELIVERY_SETTINGS={'ENABLE_BACKGROUND_DELIVERY': True},
+        FEATURES={'ENABLE_CALIPER_EVENTS_DELIVERY': True}
+    )
+    @mock.patch('openedx_caliper_tracking.processor.deliver_caliper_event')
+    def test_processor_only_enqueues_events(self, delivery_mock, dispatcher_mock):
+        self.addCleanup(stop_delivery_dispatcher)
+        with open('{}/current/book.json'.format(TEST_DIR_PATH)) as current:
+            event = json.loads(current.read())
+
+        CaliperProcessor().__call__(event)
+        self.assertFalse(delivery_mock.called)
+        dispatcher_mock.return_value.submit.assert_called_once_with(
+            mock.ANY, 'edx.bookmark.listed', priority=PRIORITY_NORMAL, label='edx.bookmark.listed'
+        )
+
+    @mock.patch('openedx_caliper_tracking.processor.DeliveryDispatcher', autospec=True)
+    @override_settings(CALIPER_DELIVERY_SETTINGS={'ENABLE_BACKGROUND_DELIVERY': True})
+    @mock.patch('openedx_caliper_tracking.processor.deliver_caliper_event')
+    def test_events_rejected_by_dispatcher_are_not_lost_silently(self, delivery_mock, dispatcher_mock):
+        self.addCleanup(stop_delivery_dispatcher)
+        dispatcher = dispatcher_mock.return_value
+        dispatcher.submit.return_value = False
+
+        dispatcher.closed = False
+        with mock.patch('openedx_caliper_tracking.processor.LOGGER') as logger_mock:
+            processor.dispatch_caliper_event({'id': 'dropped'}, 'book')
+        self.assertTrue(logger_mock.warning.called)
+        self.assertFalse(delivery_mock.called)
+
+        dispatcher.closed = True
+        processor.dispatch_caliper_event({'id': 'closed'}, 'book')
+        delivery_mock.assert_called_once_with({'id': 'closed'}, 'book')
+
+    def test_low_priority_events_are_shed_first(self):
+        dispatcher = self._get_blocked_dispatcher(OVERFLOW_DROP_NEWEST)
+        dispatcher.submit('scrolled', 'textbook.pdf.page.scrolled', priority=PRIORITY_LOW,
+                          label='textbook.pdf.page.scrolled')
+        dispatcher.submit('viewed', 'edx.forum.thread.viewed', label='edx.forum.thread.viewed')
+        self.assertTrue(dispatcher.submit('graded', 'problem_graded', priority=PRIORITY_HIGH,
+                                          label='problem_graded'))
+        self.assertFalse(dispatcher.submit('closed', 'page_close', priority=PRIORITY_LOW, label='page_close'))
+
+        stats = dispatcher.get_stats()
+        self.assertEqual(stats['shed_by_type'], {'textbook.pdf.page.scrolled': 1, 'page_close': 1})
+        self.assertEqual(stats['queue_depth_by_priority'], {PRIORITY_HIGH: 1, PRIORITY_NORMAL: 1, PRIORITY_LOW: 0})
+        self.release.set()
+        self.assertTrue(dispatcher.join(5))
+        self.assertEqual(self.delivered, ['blocking', 'graded', 'viewed'])
+
+    @override_settings(CALIPER_DELIVERY_SETTINGS={'EVENT_PRIORITIES': {'page_close': PRIORITY_HIGH}})
+    def test_event_priorities(self):
+        self.assertTrue(set(EVENT_PRIORITIES).issubset(EVENT_MAPPING))
+        self.assertEqual(get_event_priority('edx.grades.problem.submitted'), PRIORITY_HIGH)
+        self.assertEqual(get_event_priority('textbook.pdf.page.scrolled'), PRIORITY_LOW)
+        self.assertEqual(get_event_priority('edx.bookmark.listed'), PRIORITY_NORMAL)
+        self.assertEqual(get_event_priority('page_close'), PRIORITY_HIGH)
+
+
+class FakeAsyncResponse(object):
+    """
+    Async context manager standing in for an aiohttp response.
+    """
+
+    def __init__(self, session, status):
+        self.session = session
+        self.status = status
+
+    async def __aenter__(self):
+        self.session.concurrent += 1
+        self.session.max_concurrent = max(self.session.max_concurrent, self.session.concurrent)
+        await asyncio.sleep(self.session.delay)
+        return self
+
+    async def __aexit__(self, *args):
+        self.session.concurrent -= 1
+
+    async def read(self):
+        return b''
+
+
+class FakeAsyncSession(object):
+    """
+    Stand-in for aiohttp.ClientSession that records the requests it receives.
+    """
+
+    def __init__(self, delay=0.01, status=200):
+        self.delay = delay
+        self.status = status
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self.requests = []
+
+    def post(self, url, data, headers):
+        self.requests.append(data)
+        return FakeAsyncResponse(self, self.status)
+
+    async def close(self):
+        pass
+
+
+class CaliperAsyncDeliveryTestCase(TestCase):
+    """
+    Test the asyncio engine used for delivering events to the REST endpoint.
+    """
+
+    def test_in_flight_requests_are_bounded(self):
+        session = FakeAsyncSession(delay=0.02)
+        engine = AsyncDeliveryEngine(max_in_flight=3, deadline=5, session_factory=lambda: session)
+        statuses = []
+
+        futures = [engine.submit('http://localhost:3000', b'{}', {}, statuses.append) for _ in range(10)]
+        for future in futures:
+            future.result(5)
+        engine.close()
+
+        self.assertEqual(statuses, [200] * 10)
+        self.assertEqual(session.max_concurrent, 3)
+        self.assertEqual(engine.get_stats()['completed'], 10)
+
+    def test_request_deadline(self):
+        engine = AsyncDeliveryEngine(max_in_flight=1, deadline=0.01,
+                                     session_factory=lambda: FakeAsyncSession(delay=1))
+        statuses = []
+
+        engine.submit('http://localhost:3000', b'{}', {}, statuses.append).result(5)
+        engine.close()
+
+        self.assertEqual(statuses, [504])
+        self.assertEqual(engine.get_stats()['timed_out'], 1)
+
+    def test_deadline_does_not_cover_wait_for_slot(self):
+        session = FakeAsyncSession(delay=0.15)
+        engine = AsyncDeliveryEngine(max_in_flight=1, deadline=0.2, session_factory=lambda: session)
+        statuses = []
+
+        futures = [engine.submit('http://localhost:3000', b'{}', {}, statuses.append) for _ in range(4)]
+        for future in futures:
+            future.result(5)
+        engine.close()
+
+        self.assertEqual(statuses, [200] * 4)
+        self.assertEqual(len(session.requests), 4)
+
+    def test_pending_requests_are_bounded(self):
+        engine = AsyncDeliveryEngine(max_in_flight=1, deadline=5, max_pending=2,
+                                     session_factory=lambda: FakeAsyncSession(delay=0.3))
+        self.addCleanup(engine.close)
+        for _ in range(2):
+            engine.submit('http://localhost:3000', b'{}', {}, lambda status_code: None)
+        self.assertEqual(engine.get_stats()['pending'], 2)
+
+        submitter = threading.Thread(
+            target=engine.submit, args=('http://localhost:3000', b'{}', {}, lambda status_code: None)
+        )
+        submitter.start()
+        submitter.join(0.1)
+        self.assertTrue(submitter.is_alive())
+        submitter.join(5)
+        self.assertFalse(submitter.is_alive())
+
+    @mock.patch('openedx_caliper_tracking.processor.log_success', autospec=True)
+    @mock.patch('openedx_caliper_tracking.processor.is_async_delivery_available', return_value=True)
+    @override_settings(
+        CALIPER_DELIVERY_ENDPOINT='http://localhost:3000',
+        CALIPER_DELIVERY_AUTH_TOKEN='test_auth_token',
+        CALIPER_DELIVERY_SETTINGS={'DELIVERY_ENGINE': 'asyncio'},
+        FEATURES={'ENABLE_CALIPER_METRICS': True}
+    )
+    def test_events_are_delivered_through_async_engine(self, available_mock, log_success_mock):
+        get_metrics_registry().reset()
+        self.addCleanup(get_metrics_registry().reset)
+        session = FakeAsyncSession()
+        engine = AsyncDeliveryEngine(session_factory=lambda: session)
+        self.addCleanup(engine.close)
+
+        with mock.patch('openedx_caliper_tracking.processor._ASYNC_DELIVERY_ENGINE.get', return_value=engine):
+            deliver_caliper_event({'id': 'dummy-id'}, 'book')
+        engine.close()
+
+        self.assertEqual(len(session.requests), 1)
+        log_success_mock.assert_called_once_with('dummy-id', 200)
+        self.assertEqual(get_metrics_stats()[SINK_REST_REQUEST][ALL_EVENT_TYPES]['count'], 1)
+
+
+class CaliperCircuitBreakerTestCase(TestCase):
+    """
+    Test the circuit breaker in front of the REST endpoint.
+    """
+
+    @mock.patch('openedx_caliper_tracking.circuit_breaker.time.time')
+    def test_state_transitions(self, time_mock):
+        time_mock.return_value = 100
+        breaker = CircuitBreaker('endpoint', failure_threshold=2, reset_timeout=10, half_open_calls=1)
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, STATE_CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, STATE_OPEN)
+        self.assertFalse(breaker.allow_request())
+
+        time_mock.return_value = 111
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+        self.assertFalse(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, STATE_OPEN)
+
+        time_mock.return_value = 122
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, STATE_CLOSED)
+        self.assertEqual(breaker.get_stats()['short_circuited'], 2)
+
+    @mock.patch('openedx_caliper_tracking.circuit_breaker.LOGGER', autospec=True)
+    @mock.patch('openedx_caliper_tracking.processor.log_failure', autospec=True)
+    @mock.patch('openedx_caliper_tracking.processor.post_caliper_payload', return_value=500)
+    @override_settings(
+        CALIPER_DELIVERY_ENDPOINT='http://localhost:3000',
+        CALIPER_DELIVERY_AUTH_TOKEN='test_auth_token',
+        CALIPER_DELIVERY_SETTINGS={'ENABLE_CIRCUIT_BREAKER': True, 'CIRCUIT_BREAKER_FAILURE_THRESHOLD': 2}
+    )
+    def test_open_circuit_short_circuits_delivery(self, post_mock, log_failure_mock, breaker_logger_mock):
+        self.addCleanup(processor._CIRCUIT_BREAKER.reset)  # pylint: disable=protected-access
+        for index in range(5):
+            deliver_caliper_event({'id': 'event-{}'.format(index)}, 'book')
+
+        self.assertEqual(post_mock.call_count, 2)
+        log_failure_mock.assert_called_with('event-4', 503)
+        self.assertEqual(breaker_logger_mock.error.call_count, 1)
+
+
+@override_settings(
+    CALIPER_DELIVERY_ENDPOINT='http://localhost:3000',
+    CALIPER_DELIVERY_AUTH_TOKEN='test_auth_token',
+)
+class CaliperCompressionTestCase(TestCase):
+    """
+    Test the compression of the request bodies sent to the REST endpoint.
+    """
+
+    def setUp(self):
+        with open('{}/expected/book.json'.format(TEST_DIR_PATH)) as expected:
+            self.event = json.loads(expected.read())
+
+    @mock.patch('openedx_caliper_tracking.delivery_client.requests.Session.post', autospec=True)
+    def test_large_payloads_are_gzipped(self, post_mock):
+        post_mock.return_value = mock.MagicMock(status_code=200)
+
+        with self.settings(CALIPER_DELIVERY_SETTINGS={'COMPRESSION': 'gzip', 'COMPRESSION_MIN_BYTES': 100}):
+            deliver_caliper_event(self.event, 'book')
+
+        self.assertEqual(post_mock.call_args[1]['headers']['Content-Encoding'], 'gzip')
+        payload = json.loads(gzip.decompress(post_mock.call_args[1]['data']).decode('utf-8'))
+        self.assertEqual(payload['records'][0]['value'], self.event)
+
+    @mock.patch('openedx_caliper_tracking.delivery_client.requests.Session.post', autospec=True)
+    def test_small_payloads_are_not_compressed(self, post_mock):
+        post_mock.return_value = mock.MagicMock(status_code=200)
+
+        with self.settings(CALIPER_DELIVERY_SETTINGS={'COMPRESSION': 'gzip', 'COMPRESSION_MIN_BYTES': 10 ** 6}):
+            deliver_caliper_event(self.event, 'book')
+
+        self.assertNotIn('Content-Encoding', post_mock.call_args[1]['headers'])
+        self.assertEqual(json.loads(post_mock.call_args[1]['data'].decode('utf-8'))['records'][0]['key'], 'book')
+
+    @mock.patch('openedx_caliper_tracking.compression.zstandard', None)
+    def test_unavailable_encoding_is_not_used(self):
+        with self.settings(CALIPER_DELIVERY_SETTINGS={'COMPRESSION': 'zstd', 'COMPRESSION_MIN_BYTES': 0}):
+            body, headers = get_request_body(b'{"records": []}')
+
+        self.assertEqual(body, b'{"records": []}')
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_compression_benchmark_reports_every_fixture(self):
+        output = StringIO()
+        call_command('caliper_compression_benchmark', iterations=1, gzip_levels=[6], stdout=output)
+
+        self.assertIn('book ', output.getvalue())
+        self.assertIn('all events in one batch', output.getvalue())
@@ -3,15 +3,25 @@ Contains the test cases for openedx_caliper_tracking
 application logs delivery to Kafka.
 """
 import json
+from io import StringIO
 
 import mock
+from django.core.management import call_command
 from django.test import TestCase, override_settings
 from kafka.errors import KafkaError
 
-from openedx_caliper_tracking.processor import CaliperProcessor
+from openedx_caliper_tracking.benchmarks import InlineCeleryWorker
+from openedx_caliper_tracking.fake_kafka import InMemoryKafkaProducer, get_in_memory_broker
+from openedx_caliper_tracking.kafka_utils import (DeliveredIds, TopicRouter, close_kafka_producer,
+                                                  compile_message_key_extractor, get_delivered_ids, get_kafka_producer,
+                                                  get_topic_name, reset_delivered_ids)
+from openedx_caliper_tracking.processor import (CaliperProcessor, flush_kafka_batcher, get_kafka_dispatcher,
+                                                stop_kafka_dispatcher)
 from openedx_caliper_tracking.tasks import (host_not_found, deliver_caliper_event_to_kafka,
-                                            sent_kafka_failure_email, send_system_recovery_email,
-                                            HOST_ERROR_CACHE_KEY, EMAIL_DELIVERY_CACHE_KEY)
+                                            deliver_caliper_events_to_kafka, direct_send_failed,
+                                            close_kafka_producer_on_shutdown, kafka_send_failed, kafka_send_succeeded,
+                                            get_broker_health, reset_broker_health, sent_kafka_failure_email,
+                                            send_system_recovery_email, enqueue_task, EMAIL_DELIVERY_CACHE_KEY)
 from openedx_caliper_tracking.tests import TEST_DIR_PATH
 
 
@@ -38,6 +48,12 @@ class CaliperKafkaTestCase(TestCase):
         )
         with open(input_file) as current:
             self.event = json.loads(current.read())
+        close_kafka_producer()
+        self.addCleanup(close_kafka_producer)
+        reset_broker_health()
+        self.addCleanup(reset_broker_health)
+        reset_delivered_ids()
+        self.addCleanup(reset_delivered_ids)
 
     @mock.patch(
         'openedx_caliper_tracking.processor.deliver_caliper_event_to_kafka.delay',
@@ -66,7 +82,7 @@ class CaliperKafkaTestCase(TestCase):
         autospec=True
     )
     @mock.patch(
-        'openedx_caliper_tracking.tasks.KafkaProducer',
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
         autospec=True
     )
     @override_settings(
@@ -87,10 +103,9 @@ class CaliperKafkaTestCase(TestCase):
                                             ' sent to kafka ([\'testing.com\']).')
 
     @mock.patch(
-        'openedx_caliper_tracking.tasks.cache.get',
+        'openedx_caliper_tracking.health.cache.get',
         autospec=True,
-        side_effect=lambda CACHE_KEY: {
-            HOST_ERROR_CACHE_KEY: False, EMAIL_DELIVERY_CACHE_KEY: True}[CACHE_KEY]
+        side_effect=lambda CACHE_KEY: {EMAIL_DELIVERY_CACHE_KEY: True}[CACHE_KEY]
     )
     @mock.patch(
         'openedx_caliper_tracking.tasks.send_system_recovery_email.delay',
@@ -105,7 +120,7 @@ class CaliperKafkaTestCase(TestCase):
         autospec=True
     )
     @mock.patch(
-        'openedx_caliper_tracking.tasks.KafkaProducer',
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
         autospec=True
     )
     @override_settings(
@@ -131,24 +146,24 @@ class CaliperKafkaTestCase(TestCase):
                                             ' sent to kafka ([\'testing.com\']).')
 
     @mock.patch(
-        'openedx_caliper_tracking.tasks.cache.get',
+        'openedx_caliper_tracking.tasks.LOGGER',
         autospec=True,
-        return_value=True
     )
     @mock.patch(
-        'openedx_caliper_tracking.tasks.KafkaProducer',
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
         autospec=True
     )
     @override_settings(
         CALIPER_KAFKA_SETTINGS=CALIPER_KAFKA_SETTINGS_FIXTURE,
         CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
     )
-    def test_deliver_caliper_event_to_kafka_without_celery_with_host_not_found_error_already_occurred(self,
-                                                                                                      producer_mock,
-                                                                                                      cache_mock):
+    def test_deliver_caliper_event_to_kafka_without_celery_with_host_not_found_error(self, producer_mock,
+                                                                                     logger_mock):
+        producer_mock.return_value.send.return_value.succeeded.return_value = False
         deliver_caliper_event_to_kafka({}, 'book')
         self.assertTrue(producer_mock.called)
-        cache_mock.assert_called_with(HOST_ERROR_CACHE_KEY)
+        self.assertFalse(logger_mock.info.call_args[0][0].startswith('Logs Delivered Successfully'))
+        self.assertIsNone(get_broker_health().state)
 
     @mock.patch(
         'openedx_caliper_tracking.tasks.deliver_caliper_event_to_kafka.retry',
@@ -163,7 +178,7 @@ class CaliperKafkaTestCase(TestCase):
         autospec=True
     )
     @mock.patch(
-        'openedx_caliper_tracking.tasks.KafkaProducer',
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
         autospec=True,
         side_effect=KafkaError
     )
@@ -185,6 +200,492 @@ class CaliperKafkaTestCase(TestCase):
         logger_mock.error.assert_called_with(('Logs Delivery Failed: Could not deliver event (book) to kafka'
                                               ' ([\'testing.com\']) because of KafkaError.'))
 
+    @mock.patch(
+        'openedx_caliper_tracking.health.cache.get',
+        autospec=True,
+        return_value=False
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
+        autospec=True
+    )
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=CALIPER_KAFKA_SETTINGS_FIXTURE,
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
+    )
+    def test_producer_is_shared_across_tasks(self, producer_mock, cache_mock):
+        """
+        Test that a single KafkaProducer is used for all the tasks of a process
+        until its configurations change or the worker shuts down.
+        """
+        deliver_caliper_event_to_kafka({}, 'book')
+        deliver_caliper_event_to_kafka({}, 'book')
+        self.assertEqual(producer_mock.call_count, 1)
+        self.assertEqual(producer_mock.return_value.send.call_count, 2)
+
+        settings = dict(CALIPER_KAFKA_SETTINGS_FIXTURE, PRODUCER_CONFIG={'bootstrap_servers': ['other.com']})
+        with override_settings(CALIPER_KAFKA_SETTINGS=settings):
+            deliver_caliper_event_to_kafka({}, 'book')
+        self.assertEqual(producer_mock.call_count, 2)
+        self.assertEqual(producer_mock.return_value.close.call_count, 1)
+
+        close_kafka_producer_on_shutdown()
+        self.assertEqual(producer_mock.return_value.close.call_count, 2)
+
+    @mock.patch(
+        'openedx_caliper_tracking.tasks.CALIPER_DELIVERY_FAILURE_LOGGER',
+        autospec=True
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.tasks.sent_kafka_failure_email.delay',
+        autospec=True
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
+        autospec=True
+    )
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=dict(CALIPER_KAFKA_SETTINGS_FIXTURE, ASYNC_SEND=True),
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
+    )
+    def test_deliver_caliper_event_to_kafka_with_async_send(self, producer_mock, sent_email_mock,
+                                                            failure_logger_mock):
+        """
+        Test that with ASYNC_SEND the event is handed over to the producer
+        without a flush and its delivery is reported by the send callbacks.
+        """
+        deliver_caliper_event_to_kafka({'id': 'event'}, 'book')
+        producer = producer_mock.return_value
+        self.assertEqual(producer_mock.call_args[1]['retries'], 3)
+        self.assertTrue(producer.send.called)
+        self.assertFalse(producer.flush.called)
+
+        future = producer.send.return_value
+        future.add_callback.assert_called_once_with(kafka_send_succeeded, event_type='book')
+        future.add_errback.assert_called_once_with(kafka_send_failed, event={'id': 'event'}, event_type='book')
+
+        kafka_send_failed(KafkaError(), {'id': 'event'}, 'book')
+        failure_logger_mock.info.assert_called_once_with('{"id": "event"}')
+        sent_email_mock.assert_called_once_with('KafkaError')
+
+    @mock.patch(
+        'openedx_caliper_tracking.processor.deliver_caliper_event_to_kafka.delay',
+        autospec=True,
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.processor.deliver_caliper_events_to_kafka.delay',
+        autospec=True,
+    )
+    @override_settings(
+        LMS_ROOT_URL='https://localhost:18000',
+        CALIPER_KAFKA_SETTINGS=dict(CALIPER_KAFKA_SETTINGS_FIXTURE, ENABLE_BATCHING=True, BATCH_MAX_RECORDS=2,
+                                    BATCH_MAX_WAIT_MS=60000),
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE,
+        FEATURES={'ENABLE_KAFKA_FOR_CALIPER': True}
+    )
+    def test_caliper_events_are_enqueued_in_batches(self, batch_delivery_mock, delivery_mock):
+        """
+        Test that with ENABLE_BATCHING a single task is enqueued per batch of events.
+        """
+        self.addCleanup(flush_kafka_batcher)
+        CaliperProcessor().__call__(self.event)
+        self.assertFalse(batch_delivery_mock.called)
+        CaliperProcessor().__call__(self.event)
+
+        self.assertFalse(delivery_mock.called)
+        self.assertEqual(batch_delivery_mock.call_count, 1)
+        events = batch_delivery_mock.call_args[0][0]
+        self.assertEqual([event_type for _, event_type in events], ['edx.bookmark.listed'] * 2)
+
+    @mock.patch(
+        'openedx_caliper_tracking.tasks.deliver_caliper_events_to_kafka.retry',
+        autospec=True
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.tasks.CALIPER_DELIVERY_FAILURE_LOGGER',
+        autospec=True
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
+        autospec=True
+    )
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=CALIPER_KAFKA_SETTINGS_FIXTURE,
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
+    )
+    def test_only_failed_events_of_a_batch_are_retried(self, producer_mock, failure_logger_mock, retry_mock):
+        """
+        Test that a failure of one event in a batch does not affect the delivered ones.
+        """
+        delivered = mock.MagicMock(is_done=True)
+        delivered.succeeded.return_value = True
+        failed = mock.MagicMock(is_done=True, exception=KafkaError())
+        failed.succeeded.return_value = False
+        producer_mock.return_value.send.side_effect = [delivered, failed, KafkaError()]
+
+        deliver_caliper_events_to_kafka([[{'id': 1}, 'book'], [{'id': 2}, 'book'], [{'id': 3}, 'video']])
+        self.assertEqual(producer_mock.return_value.flush.call_count, 1)
+        self.assertEqual(retry_mock.call_args[1]['args'], ([[{'id': 3}, 'video'], [{'id': 2}, 'book']],))
+        self.assertFalse(failure_logger_mock.info.called)
+
+    @mock.patch(
+        'openedx_caliper_tracking.tasks.sent_kafka_failure_email.delay',
+        autospec=True
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.tasks.CALIPER_DELIVERY_FAILURE_LOGGER',
+        autospec=True
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
+        autospec=True
+    )
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=dict(CALIPER_KAFKA_SETTINGS_FIXTURE, MAXIMUM_RETRIES=0),
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
+    )
+    def test_failed_events_of_a_batch_are_logged_after_retries(self, producer_mock, failure_logger_mock,
+                                                               sent_email_mock):
+        producer_mock.return_value.send.side_effect = [mock.MagicMock(), KafkaError()]
+        producer_mock.return_value.send.return_value.succeeded.return_value = True
+
+        deliver_caliper_events_to_kafka([[{'id': 1}, 'book'], [{'id': 2}, 'book']])
+        failure_logger_mock.info.assert_called_once_with('{"id": 2}')
+        sent_email_mock.assert_called_once_with('KafkaError')
+
+    @mock.patch(
+        'openedx_caliper_tracking.tasks.deliver_caliper_event_to_kafka.delay',
+        autospec=True,
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
+        autospec=True
+    )
+    @override_settings(
+        LMS_ROOT_URL='https://localhost:18000',
+        CALIPER_KAFKA_SETTINGS=dict(CALIPER_KAFKA_SETTINGS_FIXTURE, DELIVERY_MODE='direct'),
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE,
+        FEATURES={'ENABLE_KAFKA_FOR_CALIPER': True}
+    )
+    def test_caliper_event_is_sent_directly_to_kafka(self, producer_mock, delivery_mock):
+        """
+        Test that in the direct delivery mode events are sent by the producer of
+        the process and only fall back to celery when the producer refuses them.
+        """
+        self.addCleanup(stop_kafka_dispatcher)
+        producer = producer_mock.return_value
+
+        CaliperProcessor().__call__(self.event)
+        self.assertTrue(get_kafka_dispatcher().join(5))
+        self.assertEqual(producer.send.call_args[0][0], 'dummy topic')
+        self.assertFalse(producer.flush.called)
+        self.assertFalse(delivery_mock.called)
+
+        future = producer.send.return_value
+        self.assertEqual(future.add_errback.call_args[0][0], direct_send_failed)
+
+        producer.send.side_effect = KafkaError
+        CaliperProcessor().__call__(self.event)
+        self.assertTrue(get_kafka_dispatcher().join(5))
+        self.assertEqual(delivery_mock.call_args[0][1], 'edx.bookmark.listed')
+
+    @mock.patch(
+        'openedx_caliper_tracking.tasks.deliver_caliper_event_to_kafka.delay',
+        autospec=True,
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.tasks.sent_kafka_failure_email.delay',
+        autospec=True,
+    )
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=CALIPER_KAFKA_SETTINGS_FIXTURE,
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
+    )
+    def test_direct_send_failure_falls_back_to_celery(self, sent_email_mock, delivery_mock):
+        direct_send_failed(KafkaError(), self.event, 'book')
+        self.assertTrue(sent_email_mock.called)
+        delivery_mock.assert_called_once_with(self.event, 'book')
+
+    def test_message_key_extractors(self):
+        with open('{}/expected/book.json'.format(TEST_DIR_PATH)) as expected:
+            caliper_event = json.loads(expected.read())
+
+        self.assertEqual(compile_message_key_extractor(('user_id',))(caliper_event), b'6')
+        self.assertEqual(compile_message_key_extractor(('course_id',))(caliper_event), b'course-v1:edx+cs-101+2018')
+        self.assertEqual(
+            compile_message_key_extractor(('course_id', 'user_id'))(caliper_event),
+            b'course-v1:edx+cs-101+2018|6'
+        )
+        self.assertEqual(compile_message_key_extractor(('actor.name',))(caliper_event), b'honor')
+        self.assertIsNone(compile_message_key_extractor(('session', 'actor.missing'))({'actor': {}}))
+
+    @mock.patch(
+        'openedx_caliper_tracking.health.cache.get',
+        autospec=True,
+        return_value=False
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
+        autospec=True
+    )
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=dict(CALIPER_KAFKA_SETTINGS_FIXTURE, MESSAGE_KEY=['course_id', 'user_id']),
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
+    )
+    def test_events_are_sent_with_message_key(self, producer_mock, cache_mock):
+        caliper_event = {'extensions': {'extra_fields': {'user_id': 6, 'course_id': 'course-v1:edx+cs-101+2018'}}}
+        deliver_caliper_event_to_kafka(caliper_event, 'book')
+        producer_mock.return_value.send.assert_called_once_with(
+            'dummy topic', caliper_event, key=b'course-v1:edx+cs-101+2018|6'
+        )
+
+    def test_topic_router(self):
+        router = TopicRouter(
+            (('edx.video.*', 'video'), ('problem_*', 'problems'), ('problem_check', 'checks'), ('edx.*', 'edx')),
+            'default'
+        )
+        self.assertEqual(router.get_topic('edx.video.played'), 'video')
+        self.assertEqual(router.get_topic('problem_check'), 'checks')
+        self.assertEqual(router.get_topic('problem_graded'), 'problems')
+        self.assertEqual(router.get_topic('edx.bookmark.listed'), 'edx')
+        self.assertEqual(router.get_topic('book'), 'default')
+
+        with mock.patch.object(router, '_resolve', autospec=True) as resolve_mock:
+            self.assertEqual(router.get_topic('edx.video.played'), 'video')
+            self.assertFalse(resolve_mock.called)
+
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=dict(CALIPER_KAFKA_SETTINGS_FIXTURE, TOPIC_ROUTES={'openassessmentblock.*': 'ora'})
+    )
+    def test_topic_name_of_event_types(self):
+        self.assertEqual(get_topic_name('openassessmentblock.create_submission'), 'ora')
+        self.assertEqual(get_topic_name('book'), 'dummy topic')
+
+    def test_topic_routes_follow_settings_changes(self):
+        for routes, topic in (({'book': 'books'}, 'books'), ({'book': 'library'}, 'library')):
+            with override_settings(CALIPER_KAFKA_SETTINGS=dict(CALIPER_KAFKA_SETTINGS_FIXTURE, TOPIC_ROUTES=routes)):
+                self.assertEqual(get_topic_name('book'), topic)
+
+    @mock.patch(
+        'openedx_caliper_tracking.health.cache.get',
+        autospec=True,
+        return_value=False
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
+        autospec=True
+    )
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=dict(CALIPER_KAFKA_SETTINGS_FIXTURE, TOPIC_ROUTES={'edx.video.*': 'video'}),
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
+    )
+    def test_events_are_sent_to_routed_topics(self, producer_mock, cache_mock):
+        deliver_caliper_events_to_kafka([({'id': 'play'}, 'edx.video.played'), ({'id': 'book'}, 'book')])
+        self.assertEqual(
+            [call[0][0] for call in producer_mock.return_value.send.call_args_list],
+            ['video', 'dummy topic']
+        )
+
+    def test_delivered_ids_are_bounded(self):
+        delivered_ids = DeliveredIds(max_size=2)
+        for event_id in ('a', 'b', 'a', 'c'):
+            delivered_ids.add(event_id)
+        self.assertEqual(len(delivered_ids), 2)
+        self.assertIn('a', delivered_ids)
+        self.assertNotIn('b', delivered_ids)
+
+    @mock.patch('openedx_caliper_tracking.kafka_utils.supports_idempotence', return_value=True)
+    @mock.patch(
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
+        autospec=True
+    )
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=dict(CALIPER_KAFKA_SETTINGS_FIXTURE, IDEMPOTENT=True),
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
+    )
+    def test_idempotent_producer_is_enabled_when_supported(self, producer_mock, supported_mock):
+        get_kafka_producer()
+        self.assertTrue(producer_mock.call_args[1]['enable_idempotence'])
+        self.assertEqual(producer_mock.call_args[1]['acks'], 'all')
+
+        close_kafka_producer()
+        supported_mock.return_value = False
+        get_kafka_producer()
+        self.assertNotIn('enable_idempotence', producer_mock.call_args[1])
+
+    @mock.patch(
+        'openedx_caliper_tracking.health.cache.get',
+        autospec=True,
+        return_value=False
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
+        autospec=True
+    )
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=dict(CALIPER_KAFKA_SETTINGS_FIXTURE, IDEMPOTENT=True),
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
+    )
+    def test_delivered_events_are_not_sent_again(self, producer_mock, cache_mock):
+        future = producer_mock.return_value.send.return_value
+        future.add_callback.side_effect = lambda callback: callback(mock.MagicMock())
+
+        deliver_caliper_event_to_kafka({'id': 'urn:uuid:1'}, 'book')
+        deliver_caliper_events_to_kafka([[{'id': 'urn:uuid:1'}, 'book'], [{'id': 'urn:uuid:2'}, 'book']])
+
+        self.assertEqual(
+            producer_mock.return_value.send.call_args_list,
+            [
+                mock.call('dummy topic', {'id': 'urn:uuid:1'}, key=None,
+                          headers=[('caliper_delivery_key', b'urn:uuid:1')]),
+                mock.call('dummy topic', {'id': 'urn:uuid:2'}, key=None,
+                          headers=[('caliper_delivery_key', b'urn:uuid:2')]),
+            ]
+        )
+        self.assertEqual(get_delivered_ids().suppressed, 1)
+
+    @mock.patch(
+        'openedx_caliper_tracking.health.cache.get',
+        autospec=True,
+        return_value=False
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.kafka_utils.KafkaProducer',
+        autospec=True
+    )
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=dict(CALIPER_KAFKA_SETTINGS_FIXTURE, IDEMPOTENT=True),
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
+    )
+    def test_non_string_event_ids_are_encoded_in_delivery_key(self, producer_mock, cache_mock):
+        deliver_caliper_event_to_kafka({'id': 1}, 'book')
+
+        producer_mock.return_value.send.assert_called_once_with(
+            'dummy topic', {'id': 1}, key=None, headers=[('caliper_delivery_key', b'1')]
+        )
+
+    @mock.patch(
+        'openedx_caliper_tracking.health.cache.get',
+        autospec=True,
+        return_value=False
+    )
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=dict(
+            CALIPER_KAFKA_SETTINGS_FIXTURE,
+            PRODUCER_CLASS='openedx_caliper_tracking.fake_kafka.InMemoryKafkaProducer',
+            MESSAGE_KEY='user_id'
+        ),
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
+    )
+    def test_events_are_delivered_to_in_memory_broker(self, cache_mock):
+        broker = get_in_memory_broker()
+        broker.reset()
+        caliper_event = {'id': 'urn:uuid:1', 'extensions': {'extra_fields': {'user_id': 6}}}
+
+        deliver_caliper_event_to_kafka(caliper_event, 'book')
+        deliver_caliper_events_to_kafka([[caliper_event, 'book'], [caliper_event, 'book']])
+
+        self.assertEqual(broker.records['dummy topic'][0], (b'6', json.dumps(caliper_event).encode('utf-8'), []))
+        stats = broker.get_stats()
+        self.assertEqual((stats['records'], stats['batches']), (3, 2))
+        self.assertGreater(stats['bytes'], 3 * len(json.dumps(caliper_event)))
+
+    def test_in_memory_producer_splits_batches_by_size(self):
+        broker = get_in_memory_broker()
+        broker.reset()
+        producer = InMemoryKafkaProducer(batch_size=16384)
+        self.addCleanup(producer.close)
+        value = b'x' * 1500
+
+        futures = [producer.send('dummy topic', value) for _ in range(2005)]
+        producer.flush()
+
+        self.assertTrue(all(future.succeeded() for future in futures))
+        stats = broker.get_stats()
+        self.assertEqual(stats['records'], 2005)
+        self.assertGreaterEqual(stats['batches'], 2005 * 1500 // 16384)
+        self.assertGreater(stats['bytes'], 2005 * 1500)
+
+    @mock.patch(
+        'openedx_caliper_tracking.health.cache'
+    )
+    @override_settings(LMS_ROOT_URL='https://localhost:18000')
+    def test_kafka_benchmark_reports_every_mode(self, cache_mock):
+        cache_mock.get.return_value = False
+        output = StringIO()
+        call_command('caliper_kafka_benchmark', events=20, modes=['celery', 'celery_batched', 'direct'],
+                     ack_latency_ms=0, linger_ms=0, stdout=output)
+
+        rows = dict((line.split()[0], line.split()[1:]) for line in output.getvalue().splitlines()[3:])
+        self.assertEqual(sorted(rows), ['celery', 'celery_batched', 'direct'])
+        self.assertGreater(int(rows['celery'][-1]), 0)
+        self.assertEqual(rows['direct'][-1], '0')
+
+    def test_inline_worker_survives_failing_tasks(self):
+        failing_task = mock.Mock(side_effect=KafkaError(), **{'name': 'failing'})
+        with InlineCeleryWorker(failing_task) as worker:
+            enqueue_task(failing_task, {'id': 1}, 'book')
+            enqueue_task(failing_task, {'id': 2}, 'book')
+            worker.join()
+
+        self.assertEqual(worker.failed, 2)
+        self.assertEqual(failing_task.call_count, 2)
+
+    @mock.patch(
+        'openedx_caliper_tracking.tasks.send_system_recovery_email.delay',
+        autospec=True,
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.tasks.sent_kafka_failure_email.delay',
+        autospec=True,
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.health.cache'
+    )
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=CALIPER_KAFKA_SETTINGS_FIXTURE,
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
+    )
+    def test_notifications_are_driven_by_broker_state_transitions(self, cache_mock, sent_email_mock,
+                                                                  recovery_mail_mock):
+        cache_mock.get.return_value = False
+        for _ in range(5):
+            kafka_send_succeeded(mock.MagicMock(), 'book')
+        self.assertEqual(cache_mock.get.call_count, 1)
+        self.assertEqual(cache_mock.set.call_count, 1)
+
+        for _ in range(5):
+            kafka_send_failed(KafkaError(), {'id': 'event'}, 'book')
+        sent_email_mock.assert_called_once_with('KafkaError')
+
+        cache_mock.get.return_value = True
+        for _ in range(5):
+            kafka_send_succeeded(mock.MagicMock(), 'book')
+        recovery_mail_mock.assert_called_once_with()
+        cache_mock.set.assert_called_with(EMAIL_DELIVERY_CACHE_KEY, False)
+        self.assertEqual(get_broker_health().get_stats(), {'state': 'healthy', 'transitions': 2})
+
+    @mock.patch(
+        'openedx_caliper_tracking.tasks.sent_kafka_failure_email.delay',
+        autospec=True,
+    )
+    @mock.patch(
+        'openedx_caliper_tracking.health.cache'
+    )
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=dict(CALIPER_KAFKA_SETTINGS_FIXTURE, HEALTH_SYNC_INTERVAL=30),
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE
+    )
+    def test_broker_state_is_synced_at_interval(self, cache_mock, sent_email_mock):
+        with mock.patch('openedx_caliper_tracking.health.time.monotonic', return_value=100):
+            host_not_found(mock.MagicMock(), self.event, 'book')
+            host_not_found(mock.MagicMock(), self.event, 'book')
+        self.assertEqual(sent_email_mock.call_count, 1)
+
+        with mock.patch('openedx_caliper_tracking.health.time.monotonic', return_value=131):
+            host_not_found(mock.MagicMock(), self.event, 'book')
+        self.assertEqual(sent_email_mock.call_count, 2)
+
     @mock.patch(
         'openedx_caliper_tracking.tasks.sent_kafka_failure_email.delay',
         autospec=True,
@@ -227,7 +728,7 @@ class CaliperKafkaTestCase(TestCase):
         autospec=True,
     )
     @mock.patch(
-        'openedx_caliper_tracking.tasks.cache.get',
+        'openedx_caliper_tracking.health.cache.get',
         autospec=True,
         return_value=True
     )
@@ -0,0 +1,87 @@
+"""
+Contains the test cases for the latency and throughput
+instrumentation of the openedx_caliper_tracking sinks.
+"""
+import json
+
+import mock
+from django.test import TestCase, override_settings
+
+from openedx_caliper_tracking.kafka_utils import close_kafka_producer
+from openedx_caliper_tracking.metrics import (ALL_EVENT_TYPES, SINK_CALIPER_LOG, SINK_KAFKA, SINK_REST,
+                                              SINK_REST_REQUEST, LatencyHistogram, get_metrics_registry,
+                                              get_metrics_stats)
+from openedx_caliper_tracking.processor import CaliperProcessor
+from openedx_caliper_tracking.tasks import deliver_caliper_event_to_kafka, reset_broker_health
+from openedx_caliper_tracking.tests import TEST_DIR_PATH
+from openedx_caliper_tracking.tests.test_caliper_kafka import (CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE,
+                                                               CALIPER_KAFKA_SETTINGS_FIXTURE)
+
+
+class CaliperMetricsTestCase(TestCase):
+    """
+    Test the histograms and counters recorded around the sinks.
+    """
+
+    def setUp(self):
+        with open('{}/current/book.json'.format(TEST_DIR_PATH)) as current:
+            self.event = json.loads(current.read())
+        get_metrics_registry().reset()
+        self.addCleanup(get_metrics_registry().reset)
+        close_kafka_producer()
+        self.addCleanup(close_kafka_producer)
+        reset_broker_health()
+        self.addCleanup(reset_broker_health)
+
+    def test_histogram_percentiles(self):
+        histogram = LatencyHistogram()
+        for index in range(1, 101):
+            histogram.record(index / 1000.0, succeeded=index % 10 != 0)
+
+        stats = histogram.get_stats()
+        self.assertEqual(stats['count'], 100)
+        self.assertEqual(stats['errors'], 10)
+        self.assertAlmostEqual(stats['p50_ms'], 50, delta=5)
+        self.assertAlmostEqual(stats['p95_ms'], 95, delta=9.5)
+        self.assertAlmostEqual(stats['p99_ms'], 99, delta=1)
+        self.assertAlmostEqual(stats['max_ms'], 100)
+
+    @mock.patch('openedx_caliper_tracking.processor.deliver_caliper_event')
+    @override_settings(FEATURES={})
+    def test_nothing_is_recorded_when_disabled(self, delivery_mock):
+        CaliperProcessor().__call__(self.event)
+        self.assertEqual(get_metrics_stats(), {})
+
+    @mock.patch('openedx_caliper_tracking.delivery_client.requests.Session.post', autospec=True)
+    @override_settings(
+        LMS_ROOT_URL='http://localhost:3000',
+        CALIPER_DELIVERY_ENDPOINT='http://localhost:3000',
+        CALIPER_DELIVERY_AUTH_TOKEN='test_auth_token',
+        FEATURES={'ENABLE_CALIPER_EVENTS_DELIVERY': True, 'ENABLE_CALIPER_METRICS': True}
+    )
+    def test_sinks_are_recorded_per_event_type(self, post_mock):
+        post_mock.return_value = mock.MagicMock(status_code=500)
+        CaliperProcessor().__call__(self.event)
+        CaliperProcessor().__call__(self.event)
+
+        stats = get_metrics_stats()
+        self.assertEqual(stats[SINK_CALIPER_LOG]['edx.bookmark.listed']['count'], 2)
+        self.assertEqual(stats[SINK_REST]['edx.bookmark.listed']['count'], 2)
+        self.assertEqual(stats[SINK_REST][ALL_EVENT_TYPES]['count'], 2)
+        self.assertEqual(list(stats[SINK_REST_REQUEST]), [ALL_EVENT_TYPES])
+        self.assertEqual(stats[SINK_REST_REQUEST][ALL_EVENT_TYPES]['errors'], 2)
+
+    @mock.patch('openedx_caliper_tracking.health.cache')
+    @mock.patch('openedx_caliper_tracking.kafka_utils.KafkaProducer', autospec=True)
+    @override_settings(
+        CALIPER_KAFKA_SETTINGS=CALIPER_KAFKA_SETTINGS_FIXTURE,
+        CALIPER_KAFKA_AUTH_SETTINGS=CALIPER_KAFKA_AUTH_SETTINGS_FIXTURE,
+        FEATURES={'ENABLE_CALIPER_METRICS': True}
+    )
+    def test_kafka_sink_is_recorded(self, producer_mock, cache_mock):
+        cache_mock.get.return_value = False
+        deliver_caliper_event_to_kafka({'id': 'event'}, 'edx.bookmark.listed')
+
+        stats = get_metrics_stats()[SINK_KAFKA]['edx.bookmark.listed']
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['errors'], 0)
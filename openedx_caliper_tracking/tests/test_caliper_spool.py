@@ -0,0 +1,180 @@
+"""
+Contains the test cases for the on-disk spool of
+undeliverable openedx_caliper_tracking events.
+"""
+import os
+import shutil
+import tempfile
+
+import mock
+from django.test import TestCase, override_settings
+
+from openedx_caliper_tracking.processor import (deliver_caliper_event, get_delivery_spool, replay_spooled_records,
+                                                spill_caliper_event, stop_delivery_spool)
+from openedx_caliper_tracking.spool import DiskSpool, SpoolDrainer, claim_spool_directory
+
+
+class CaliperSpoolTestCase(TestCase):
+    """
+    Test the storage, replay and compaction of spooled events.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _segments(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.seg'))
+
+    def test_records_are_read_back_across_segments_and_compacted(self):
+        spool = DiskSpool(self.directory, segment_bytes=40)
+        for index in range(5):
+            spool.append('record-{}'.format(index).encode('utf-8'))
+        self.assertEqual(len(self._segments()), 3)
+
+        position, payloads = spool.read_batch(3)
+        self.assertEqual(payloads, [b'record-0', b'record-1', b'record-2'])
+        spool.ack(position, len(payloads))
+        self.assertEqual(len(self._segments()), 2)
+
+        position, payloads = spool.read_batch(10)
+        self.assertEqual(payloads, [b'record-3', b'record-4'])
+        spool.ack(position, len(payloads))
+
+        stats = spool.get_stats()
+        self.assertEqual(stats['backlog_bytes'], 0)
+        self.assertEqual(stats['replayed'], 5)
+        self.assertGreater(stats['replay_rate'], 0)
+
+    def test_position_survives_restart(self):
+        spool = DiskSpool(self.directory)
+        for index in range(3):
+            spool.append('record-{}'.format(index).encode('utf-8'))
+        position, payloads = spool.read_batch(1)
+        spool.ack(position, len(payloads))
+        spool.close()
+
+        _, payloads = DiskSpool(self.directory).read_batch(10)
+        self.assertEqual(payloads, [b'record-1', b'record-2'])
+
+    def test_corrupted_records_are_skipped(self):
+        spool = DiskSpool(self.directory)
+        spool.append(b'record-0')
+        spool.close()
+        with open(os.path.join(self.directory, self._segments()[0]), 'r+b') as segment:
+            segment.seek(-1, os.SEEK_END)
+            segment.write(b'X')
+
+        spool = DiskSpool(self.directory)
+        spool.append(b'record-1')
+        _, payloads = spool.read_batch(10)
+        self.assertEqual(payloads, [b'record-1'])
+        self.assertEqual(spool.get_stats()['corrupted'], 1)
+
+    def test_disk_budget_discards_oldest_segments(self):
+        spool = DiskSpool(self.directory, segment_bytes=20, max_bytes=50)
+        for index in range(6):
+            spool.append('record-{}'.format(index).encode('utf-8'))
+
+        self.assertLessEqual(sum(
+            os.path.getsize(os.path.join(self.directory, name)) for name in self._segments()
+        ), 50)
+        self.assertGreater(spool.get_stats()['dropped'], 0)
+        _, payloads = spool.read_batch(10)
+        self.assertEqual(payloads[-1], b'record-5')
+
+    def test_stale_ack_after_eviction_does_not_stall_replay(self):
+        spool = DiskSpool(self.directory, segment_bytes=100, max_bytes=300)
+        for index in range(3):
+            spool.append('record-{}'.format(index).encode('utf-8') * 6)
+        position, payloads = spool.read_batch(1)
+        # The segment being delivered is discarded to make room for new records.
+        for index in range(3, 6):
+            spool.append('record-{}'.format(index).encode('utf-8') * 6)
+        spool.ack(position, len(payloads))
+
+        _, payloads = spool.read_batch(10)
+        self.assertTrue(payloads)
+        self.assertEqual(payloads[-1], b'record-5' * 6)
+        spool.close()
+
+        _, payloads = DiskSpool(self.directory, segment_bytes=100, max_bytes=300).read_batch(10)
+        self.assertEqual(payloads[-1], b'record-5' * 6)
+
+    def test_drainer_only_acknowledges_delivered_batches(self):
+        spool = DiskSpool(self.directory)
+        spool.append(b'record-0')
+        send_batch = mock.Mock(return_value=False)
+        drainer = SpoolDrainer(spool, send_batch, interval=60)
+        self.addCleanup(drainer.stop)
+
+        self.assertFalse(drainer.drain_once())
+        send_batch.return_value = True
+        self.assertTrue(drainer.drain_once())
+        self.assertFalse(drainer.drain_once())
+        self.assertEqual(send_batch.call_count, 2)
+
+    def test_spool_directory_is_claimed_by_a_single_owner(self):
+        first, first_lock = claim_spool_directory(self.directory)
+        second, second_lock = claim_spool_directory(self.directory)
+        self.addCleanup(first_lock.close)
+        self.addCleanup(second_lock.close)
+        self.assertNotEqual(first, second)
+
+    @mock.patch('openedx_caliper_tracking.processor.post_caliper_payload', return_value=500)
+    def test_failed_deliveries_are_spooled(self, post_mock):
+        with override_settings(
+            CALIPER_DELIVERY_ENDPOINT='http://localhost:3000',
+            CALIPER_DELIVERY_AUTH_TOKEN='test_auth_token',
+            CALIPER_DELIVERY_SETTINGS={'SPOOL_DIR': self.directory, 'SPOOL_REPLAY_INTERVAL': 60}
+        ):
+            self.addCleanup(stop_delivery_spool)
+            deliver_caliper_event({'id': 'dummy-id'}, 'book')
+
+            _, payloads = get_delivery_spool().read_batch(10)
+            self.assertEqual(len(payloads), 1)
+            self.assertIn(b'dummy-id', payloads[0])
+
+    def test_overflowing_events_are_spilled_to_the_spool(self):
+        self.assertFalse(spill_caliper_event({'id': 'dummy-id'}, 'book'))
+
+        with override_settings(
+            CALIPER_DELIVERY_SETTINGS={'SPOOL_DIR': self.directory, 'SPOOL_REPLAY_INTERVAL': 60}
+        ):
+            self.addCleanup(stop_delivery_spool)
+            self.assertTrue(spill_caliper_event({'id': 'dummy-id'}, 'book'))
+
+            _, payloads = get_delivery_spool().read_batch(10)
+            self.assertEqual(len(payloads), 1)
+            self.assertIn(b'dummy-id', payloads[0])
+
+    @mock.patch('openedx_caliper_tracking.processor.post_caliper_payload', return_value=400)
+    def test_rejected_deliveries_are_not_spooled(self, post_mock):
+        with override_settings(
+            CALIPER_DELIVERY_ENDPOINT='http://localhost:3000',
+            CALIPER_DELIVERY_AUTH_TOKEN='test_auth_token',
+            CALIPER_DELIVERY_SETTINGS={'SPOOL_DIR': self.directory, 'SPOOL_REPLAY_INTERVAL': 60}
+        ):
+            self.addCleanup(stop_delivery_spool)
+            deliver_caliper_event({'id': 'dummy-id'}, 'book')
+
+            _, payloads = get_delivery_spool().read_batch(10)
+            self.assertEqual(payloads, [])
+
+    @mock.patch('openedx_caliper_tracking.processor.post_caliper_payload', autospec=True)
+    def test_rejected_spooled_records_do_not_block_replay(self, post_mock):
+        # The batch is rejected because of its second record only.
+        post_mock.side_effect = lambda payload: 400 if b'bad' in payload else 200
+        spool = DiskSpool(self.directory)
+        for record in (b'{"id": "good-1"}', b'{"id": "bad"}', b'{"id": "good-2"}'):
+            spool.append(record)
+
+        with override_settings(CALIPER_DELIVERY_ENDPOINT='http://localhost:3000'):
+            drainer = SpoolDrainer(spool, replay_spooled_records, interval=60)
+            self.addCleanup(drainer.stop)
+            self.assertTrue(drainer.drain_once())
+            self.assertFalse(drainer.drain_once())
+
+        self.assertEqual(post_mock.call_count, 4)
+        stats = spool.get_stats()
+        self.assertEqual((stats['replayed'], stats['rejected'], stats['backlog_bytes']), (2, 1, 0))
@@ -11,6 +11,8 @@ from django.test import TestCase
 from openedx_caliper_tracking.base_transformer import base_transformer
 from openedx_caliper_tracking.caliper_config import EVENT_MAPPING
 from openedx_caliper_tracking.tests import TEST_DIR_PATH
+from openedx_caliper_tracking.tracking_event import TrackingEvent
+from openedx_caliper_tracking.url_templates import clear_url_templates
 
 
 class CaliperTransformationTestCase(TestCase):
@@ -22,6 +24,10 @@ class CaliperTransformationTestCase(TestCase):
 
     maxDiff = None
 
+    def setUp(self):
+        clear_url_templates()
+        self.addCleanup(clear_url_templates)
+
     @mock.patch(
         'openedx_caliper_tracking.utils.get_username_from_user_id',
         return_value='honor',
@@ -36,8 +42,11 @@ class CaliperTransformationTestCase(TestCase):
         autospec=True
     )
     @mock.patch(
-        'openedx_caliper_tracking.transformers.cohort_transformers.reverse',
-        return_value='/u/honor',
+        'openedx_caliper_tracking.url_templates.reverse',
+        side_effect=lambda name, kwargs: {
+            'learner_profile': '/u/{username}',
+            'about_course': '/courses/{course_id}/about',
+        }[name].format(**kwargs),
         autospec=True
     )
     @mock.patch(
@@ -45,11 +54,6 @@ class CaliperTransformationTestCase(TestCase):
         return_value='http://localhost:18000/certificates/user/8/course/course-v1:edx+cs-101+2018',
         autospec=True
     )
-    @mock.patch(
-        'openedx_caliper_tracking.transformers.enrollment_transformers.reverse',
-        return_value='/courses/course-v1:edx+cs-101+2018/about',
-        autospec=True
-    )
     def test_caliper_transformers(self, *args):
         """
         Tests whether all the caliper transformers are working as expected
@@ -68,7 +72,7 @@ class CaliperTransformationTestCase(TestCase):
             )
             with self.settings(LMS_ROOT_URL='http://localhost:18000'):
                 with open(input_file) as current, open(output_file) as expected:
-                    event = json.loads(current.read())
+                    event = TrackingEvent(json.loads(current.read()))
                     expected_event = json.loads(expected.read())
 
                     expected_event.pop('id')
@@ -80,3 +84,54 @@ class CaliperTransformationTestCase(TestCase):
                     caliper_event.pop('id')
 
                     self.assertDictEqual(caliper_event, expected_event)
+
+
+class TrackingEventTestCase(TestCase):
+    """
+    Test the wrapper of the raw events handed to the transformers.
+    """
+
+    def test_string_payload_is_parsed_once(self):
+        event = TrackingEvent({'event_type': 'seq_next', 'event': '{"old": 1, "new": 2}'})
+        with mock.patch('openedx_caliper_tracking.tracking_event.json.loads', wraps=json.loads) as loads_mock:
+            self.assertEqual(event.payload, {'old': 1, 'new': 2})
+            self.assertIs(event.payload, event.payload)
+        self.assertEqual(loads_mock.call_count, 1)
+        self.assertEqual(event['event'], '{"old": 1, "new": 2}')
+
+        event['event'] = '{"old": 2, "new": 3}'
+        self.assertEqual(event.payload, {'old': 2, 'new': 3})
+
+    def test_payload_follows_every_change_of_the_event(self):
+        event = TrackingEvent({'event_type': 'seq_next', 'event': '{"old": 1}'})
+        self.assertEqual(event.payload, {'old': 1})
+
+        event.update(event='{"old": 2}')
+        self.assertEqual(event.payload, {'old': 2})
+
+        event.pop('event')
+        self.assertIsNone(event.payload)
+
+        event.setdefault('event', '{"old": 3}')
+        self.assertEqual(event.payload, {'old': 3})
+
+        del event['event']
+        self.assertIsNone(event.payload)
+
+        event['event'] = '{"old": 4}'
+        self.assertEqual(event.payload, {'old': 4})
+        event.clear()
+        self.assertIsNone(event.payload)
+
+    def test_dict_payload_is_served_as_is(self):
+        payload = {'mode': 'audit'}
+        event = TrackingEvent({'event_type': 'edx.course.enrollment.activated', 'event': payload})
+        self.assertIs(event.payload, payload)
+        self.assertIs(event['event'], payload)
+
+    def test_raw_event_is_not_changed(self):
+        raw_event = {'event_type': 'problem_check', 'event': '{}'}
+        event = TrackingEvent(raw_event)
+        event['id'] = None
+        self.assertNotIn('id', raw_event)
+        self.assertEqual(json.loads(json.dumps(event)), {'event_type': 'problem_check', 'event': '{}', 'id': None})
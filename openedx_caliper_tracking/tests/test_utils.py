@@ -1,23 +1,111 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
 from smtplib import SMTPException
 
 import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase, override_settings
+from django.urls.exceptions import NoReverseMatch
 
 from openedx_caliper_tracking import utils
+from openedx_caliper_tracking.benchmarks import load_fixture_timestamps
+from openedx_caliper_tracking.lookup_cache import clear_lookup_caches, get_lookup_cache_stats, invalidate_topic_id
+from openedx_caliper_tracking.url_templates import MISSING, URL_TEMPLATES, clear_url_templates
 from openedx_caliper_tracking.tests.factories import UserFactory
 
 
 class CaliperUtilsTestCase(TestCase):
 
+    def setUp(self):
+        cache.clear()
+        clear_lookup_caches()
+        self.addCleanup(clear_lookup_caches)
+        clear_url_templates()
+        self.addCleanup(clear_url_templates)
+
     def test_convert_date_time(self):
         self.assertEquals('2018-10-16T14:23:24.785Z', utils.convert_datetime('2018-10-16T14:23:24.785148+00:00'))
 
+    def test_convert_date_time_matches_dateutil(self):
+        timestamps = load_fixture_timestamps() + [
+            '2018-10-16T14:23:24Z',
+            '2018-10-16 14:23:24.7+05:30',
+            '2018-10-16T00:23:24.785999-0800',
+            '2018-12-31T23:59:59.999999-01:00',
+            '2020-02-29T00:00:00.000001+14:00',
+            'Oct 16 2018 14:23:24 +0200',
+        ]
+        self.assertGreater(len(timestamps), 100)
+        for timestamp in timestamps:
+            self.assertEquals(
+                utils._convert_datetime_with_dateutil(timestamp),  # pylint: disable=protected-access
+                utils.convert_datetime(timestamp),
+                timestamp
+            )
+        self.assertEquals(
+            '2018-10-16T14:23:24.785Z',
+            utils.convert_datetime(datetime(2018, 10, 16, 16, 23, 24, 785148, timezone(timedelta(hours=2))))
+        )
+
+    def test_datetime_benchmark(self):
+        output = StringIO()
+        call_command('caliper_datetime_benchmark', iterations=10, stdout=output)
+        self.assertIn('speedup', output.getvalue())
+
+    def test_invalid_date_time_is_not_converted(self):
+        for timestamp in ('2018-13-16T14:23:24+00:00', 'not a date'):
+            with self.assertRaises(ValueError):
+                utils.convert_datetime(timestamp)
+
     def test_get_username_from_user_id(self):
         user = UserFactory(username='dummy')
         self.assertEquals('dummy', utils.get_username_from_user_id(user.id))
 
+    def test_usernames_are_cached_until_user_is_saved(self):
+        user = UserFactory(username='dummy')
+        with self.assertNumQueries(1):
+            self.assertEquals('dummy', utils.get_username_from_user_id(user.id))
+            self.assertEquals('dummy', utils.get_username_from_user_id(user.id))
+
+        user.username = 'renamed'
+        user.save()
+        with self.assertNumQueries(1):
+            self.assertEquals('renamed', utils.get_username_from_user_id(user.id))
+
+        self.assertEquals(get_lookup_cache_stats()['username']['local_hits'], 1)
+        self.assertEquals(get_lookup_cache_stats()['username']['misses'], 2)
+
+    def test_missing_users_are_cached(self):
+        with self.assertNumQueries(1):
+            for _ in range(2):
+                with self.assertRaises(get_user_model().DoesNotExist):
+                    utils.get_username_from_user_id(404)
+        self.assertEquals(get_lookup_cache_stats()['username']['negative_hits'], 2)
+
+        user = UserFactory(id=404, username='dummy')
+        self.assertEquals('dummy', utils.get_username_from_user_id(user.id))
+
+    def test_usernames_are_shared_between_processes(self):
+        user = UserFactory(username='dummy')
+        utils.get_username_from_user_id(user.id)
+        # Forget the in-process tier like a new process would.
+        clear_lookup_caches()
+
+        with self.assertNumQueries(0):
+            self.assertEquals('dummy', utils.get_username_from_user_id(user.id))
+        self.assertEquals(get_lookup_cache_stats()['username']['shared_hits'], 1)
+
+    @override_settings(CALIPER_LOOKUP_CACHE_SETTINGS={'ENABLED': False})
+    def test_disabled_lookup_cache(self):
+        user = UserFactory(username='dummy')
+        with self.assertNumQueries(2):
+            utils.get_username_from_user_id(user.id)
+            utils.get_username_from_user_id(user.id)
+
     @mock.patch(
-        'openedx_caliper_tracking.utils.reverse',
+        'openedx_caliper_tracking.url_templates.reverse',
         autospec=True,
         return_value='/u/dummy'
     )
@@ -36,6 +124,56 @@ class CaliperUtilsTestCase(TestCase):
         formatted_link = utils.get_user_link_from_username('dummy')
         self.assertEquals('https://localhost:18000/u/dummy', formatted_link)
 
+    @mock.patch(
+        'openedx_caliper_tracking.url_templates.reverse',
+        autospec=True,
+        side_effect=lambda name, kwargs: '/u/{}/'.format(kwargs['username'].replace(' ', '%20'))
+    )
+    @override_settings(
+        LMS_ROOT_URL='https://localhost:18000'
+    )
+    def test_user_links_are_made_from_template(self, reverse_mock):
+        self.assertEquals('https://localhost:18000/u/honor/', utils.get_user_link_from_username('honor'))
+        self.assertEquals('https://localhost:18000/u/staff/', utils.get_user_link_from_username('staff'))
+        self.assertEquals(reverse_mock.call_count, 1)
+
+        self.assertEquals('https://localhost:18000/u/jane%20doe/', utils.get_user_link_from_username('jane doe'))
+        self.assertEquals('https://localhost:18000/u/jane%20doe/', utils.get_user_link_from_username('jane doe'))
+        reverse_mock.assert_called_with('learner_profile', kwargs={'username': 'jane doe'})
+        self.assertEquals(reverse_mock.call_count, 2)
+
+    @mock.patch(
+        'openedx_caliper_tracking.url_templates.reverse',
+        autospec=True,
+        side_effect=NoReverseMatch
+    )
+    @override_settings(
+        LMS_ROOT_URL='https://localhost:18000'
+    )
+    def test_missing_profile_url_pattern_is_not_reversed_again(self, reverse_mock):
+        for username in ('honor', 'staff', 'jane doe'):
+            self.assertEquals(
+                'https://localhost:18000/u/{}'.format(username), utils.get_user_link_from_username(username)
+            )
+        self.assertEquals(reverse_mock.call_count, 1)
+        self.assertIs(URL_TEMPLATES.get_path('learner_profile', username='honor'), MISSING)
+
+    @mock.patch(
+        'openedx_caliper_tracking.url_templates.reverse',
+        autospec=True,
+        return_value='/u/caliperurlparam0'
+    )
+    @override_settings(
+        LMS_ROOT_URL='https://localhost:18000'
+    )
+    def test_user_links_follow_the_registered_profile_route(self, reverse_mock):
+        self.assertEquals('https://localhost:18000/u/honor', utils.get_user_link_from_username('honor'))
+
+        reverse_mock.return_value = '/learners/caliperurlparam0/'
+        URL_TEMPLATES.register('learner_profile', 'username')
+        self.assertEquals('https://localhost:18000/learners/honor/', utils.get_user_link_from_username('honor'))
+
+    @override_settings(CALIPER_LOOKUP_CACHE_SETTINGS={'ENABLED': False})
     def test_get_topic_id_from_team_id(self):
         team_mock = mock.MagicMock()
         with mock.patch.dict('sys.modules', **{
@@ -47,6 +185,23 @@ class CaliperUtilsTestCase(TestCase):
             utils.get_topic_id_from_team_id(1)
         self.assertEquals(str(team_mock.mock_calls), '[call.CourseTeam.objects.get(team_id=1)]')
 
+    def test_topic_ids_are_cached_until_team_is_saved(self):
+        team_mock = mock.MagicMock()
+        team_mock.CourseTeam.objects.get.return_value.topic_id = 'topic'
+        with mock.patch.dict('sys.modules', **{
+                             'lms': team_mock,
+                             'lms.djangoapps': team_mock,
+                             'lms.djangoapps.teams': team_mock,
+                             'lms.djangoapps.teams.models': team_mock,
+                             }):
+            self.assertEquals('topic', utils.get_topic_id_from_team_id('team'))
+            self.assertEquals('topic', utils.get_topic_id_from_team_id('team'))
+            self.assertEquals(team_mock.CourseTeam.objects.get.call_count, 1)
+
+            invalidate_topic_id(sender=None, instance=mock.Mock(team_id='team'))
+            self.assertEquals('topic', utils.get_topic_id_from_team_id('team'))
+            self.assertEquals(team_mock.CourseTeam.objects.get.call_count, 2)
+
     @mock.patch(
         'openedx_caliper_tracking.utils.get_topic_id_from_team_id',
         autospec=True,
@@ -58,7 +213,7 @@ class CaliperUtilsTestCase(TestCase):
         self.assertEquals('http://localhost:18000/courses/dummy-course-id/teams/#teams/1/1', team_url)
 
     @mock.patch(
-        'openedx_caliper_tracking.utils.reverse',
+        'openedx_caliper_tracking.url_templates.reverse',
         autospec=True,
         return_value='/certificates/user/8/course/dummy-course-id',
     )
@@ -70,6 +225,29 @@ class CaliperUtilsTestCase(TestCase):
         self.assertEquals('https://localhost:18000/certificates/user/8/course/dummy-course-id', certificate_uri)
         reverse_mock.assert_called_with('certificates:html_view', kwargs={'user_id': 8, 'course_id': 'dummy-course-id'})
 
+    @mock.patch(
+        'openedx_caliper_tracking.url_templates.reverse',
+        autospec=True,
+        side_effect=lambda name, kwargs: '/certificates/user/{user_id}/course/{course_id}'.format(**kwargs),
+    )
+    @override_settings(
+        LMS_ROOT_URL='https://localhost:18000'
+    )
+    def test_certificate_urls_are_made_from_template(self, reverse_mock):
+        self.assertEquals(
+            'https://localhost:18000/certificates/user/8/course/course-v1:edX+DemoX+Demo_Course',
+            utils.get_certificate_url(8, 'course-v1:edX+DemoX+Demo_Course')
+        )
+        self.assertEquals(
+            'https://localhost:18000/certificates/user/9/course/course-v1:edX+E2E-101+course',
+            utils.get_certificate_url(9, 'course-v1:edX+E2E-101+course')
+        )
+        self.assertEquals(reverse_mock.call_count, 1)
+
+        utils.get_certificate_url(9, 'course id')
+        reverse_mock.assert_called_with('certificates:html_view', kwargs={'user_id': 9, 'course_id': 'course id'})
+        self.assertEquals(reverse_mock.call_count, 2)
+
     @mock.patch(
         'openedx_caliper_tracking.utils.log',
         autospec=True,
@@ -0,0 +1,72 @@
+"""
+Wrapper of the raw tracking events handed to the transformers.
+"""
+import json
+
+UNPARSED = object()
+
+
+class TrackingEvent(dict):
+    """
+    Raw tracking event whose ``event`` payload is parsed on first use.
+
+    Browser events carry the payload as a JSON string and server events as a
+    dict. ``payload`` returns the parsed value for both, parsing a string
+    only once however many times it is read. ``event['event']`` still
+    returns the payload as it was emitted.
+
+    The event is copied, so that changes made by the transformers do not
+    leak into the event passed down the tracking pipeline. The parsed
+    payload is shared by every read of ``payload``, and is parsed again
+    whenever ``event`` is set or removed through any of the dict methods.
+    """
+
+    def __init__(self, event):
+        super(TrackingEvent, self).__init__(event)
+        self._payload = UNPARSED
+
+    @property
+    def payload(self):
+        if self._payload is UNPARSED:
+            payload = self.get('event')
+            self._payload = json.loads(payload) if isinstance(payload, (str, bytes)) else payload
+        return self._payload
+
+    def _reset_payload(self):
+        self._payload = UNPARSED
+
+    def __setitem__(self, key, value):
+        super(TrackingEvent, self).__setitem__(key, value)
+        if key == 'event':
+            self._reset_payload()
+
+    def __delitem__(self, key):
+        super(TrackingEvent, self).__delitem__(key)
+        if key == 'event':
+            self._reset_payload()
+
+    def update(self, *args, **kwargs):
+        super(TrackingEvent, self).update(*args, **kwargs)
+        self._reset_payload()
+
+    def setdefault(self, key, default=None):
+        value = super(TrackingEvent, self).setdefault(key, default)
+        if key == 'event':
+            self._reset_payload()
+        return value
+
+    def pop(self, key, *args):
+        value = super(TrackingEvent, self).pop(key, *args)
+        if key == 'event':
+            self._reset_payload()
+        return value
+
+    def popitem(self):
+        item = super(TrackingEvent, self).popitem()
+        self._reset_payload()
+        return item
+
+    def clear(self):
+        super(TrackingEvent, self).clear()
+        self._reset_payload()
+
@@ -1,7 +1,6 @@
 """
 Transformers for all the bookmark events
 """
-import json
 
 
 def edx_bookmark_listed(current_event, caliper_event):
@@ -106,7 +105,7 @@ def edx_bookmark_accessed(current_event, caliper_event):
         'name': current_event.get('username'),
         'type': 'Person'
     })
-    event_info = json.loads(current_event['event'])
+    event_info = current_event.payload
     caliper_event['object'] = {
         'id': current_event.get('referer'),
         'type': 'WebPage',
@@ -5,8 +5,6 @@ Transformers for all the certificate events
 from openedx_caliper_tracking.utils import get_certificate_url
 from django.conf import settings
 
-import json
-
 
 def edx_certificate_evidence_visited(current_event, caliper_event):
     """
@@ -67,7 +65,7 @@ def edx_certificate_shared(current_event, caliper_event):
     :return: updated caliper_event.
     """
 
-    object_extensions = json.loads(current_event['event'])
+    object_extensions = current_event.payload
 
     caliper_event.update({
         'type': 'Event',
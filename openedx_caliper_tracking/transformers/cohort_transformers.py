@@ -3,9 +3,9 @@ Transformers for all cohort related events.
 """
 
 from django.conf import settings
-from django.urls import reverse
 
 from openedx_caliper_tracking import utils
+from openedx_caliper_tracking.url_templates import reverse_url
 
 
 def edx_cohort_user_added(current_event, caliper_event):
@@ -25,10 +25,7 @@ def edx_cohort_user_added(current_event, caliper_event):
 
     user_link = '{lms_url}{profile_link}'.format(
         lms_url=settings.LMS_ROOT_URL,
-        profile_link=str(reverse(
-            'learner_profile',
-            kwargs={'username': username}
-        ))
+        profile_link=reverse_url('learner_profile', username=username)
     )
 
     caliper_object = {
@@ -135,10 +132,7 @@ def edx_cohort_user_removed(current_event, caliper_event):
 
     user_link = '{lms_url}{profile_link}'.format(
         lms_url=settings.LMS_ROOT_URL,
-        profile_link=str(reverse(
-            'learner_profile',
-            kwargs={'username': username}
-        ))
+        profile_link=reverse_url('learner_profile', username=username)
     )
 
     cohort_page_link = '{instructor_page}#view-cohort_management'.format(
@@ -1,7 +1,6 @@
 """
 Transformers for all Course Content Completion Events
 """
-import json
 
 
 def edx_done_toggled(current_event, caliper_event):
@@ -32,10 +31,6 @@ def edx_done_toggled(current_event, caliper_event):
 
     if current_event.get('event_source') == 'server':
         caliper_event['extensions']['extra_fields'].pop('session')
-        caliper_event['object']['extensions'] = current_event['event']
-    else:
-        caliper_event['object'].update({
-            'extensions': json.loads(current_event['event'])
-        })
+    caliper_event['object']['extensions'] = current_event.payload
 
     return caliper_event
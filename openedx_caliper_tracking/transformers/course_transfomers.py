@@ -2,8 +2,6 @@
 Transformers for all the course settings related events
 """
 
-import json
-
 
 def edx_course_home_resume_course_clicked(current_event, caliper_event):
     """
@@ -14,7 +12,7 @@ def edx_course_home_resume_course_clicked(current_event, caliper_event):
     :return: updated caliper_event.
     """
 
-    object_extensions = json.loads(current_event['event'])
+    object_extensions = current_event.payload
 
     object_extensions.update({
         'course_id': current_event['context']['course_id'],
@@ -3,7 +3,8 @@ Transformers for all course related events.
 """
 
 from django.conf import settings
-from django.urls import reverse
+
+from openedx_caliper_tracking.url_templates import reverse_url
 
 
 def edx_course_enrollment_activated(current_event, caliper_event):
@@ -56,10 +57,7 @@ def edx_course_enrollment_deactivated(current_event, caliper_event):
 
     course_link = '{lms_url}{profile_link}'.format(
         lms_url=settings.LMS_ROOT_URL,
-        profile_link=str(reverse(
-            'about_course',
-            kwargs={'course_id': course_id}
-        ))
+        profile_link=reverse_url('about_course', course_id=course_id)
     )
 
     caliper_object = {
@@ -1,7 +1,6 @@
 """
 Transformers for all the navigation events
 """
-import json
 
 
 def edx_ui_lms_link_clicked(current_event, caliper_event):
@@ -14,7 +13,7 @@ def edx_ui_lms_link_clicked(current_event, caliper_event):
     :return: updated caliper_event.
     """
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     caliper_event.update({
         'type': 'NavigationEvent',
         'action': 'NavigatedTo',
@@ -92,7 +91,7 @@ def edx_ui_lms_sequence_previous_selected(current_event, caliper_event):
     caliper_object = {
         'id': current_event['referer'],
         'type': 'WebPage',
-        'extensions': json.loads(current_event['event'])
+        'extensions': current_event.payload
     }
 
     caliper_event.update({
@@ -128,7 +127,7 @@ def edx_ui_lms_sequence_next_selected(current_event, caliper_event):
     caliper_object = {
         'id': current_event['referer'],
         'type': 'WebPage',
-        'extensions': json.loads(current_event['event'])
+        'extensions': current_event.payload
     }
 
     caliper_event.update({
@@ -164,7 +163,7 @@ def seq_next(current_event, caliper_event):
     caliper_object = {
         'id': current_event['referer'],
         'type': 'WebPage',
-        'extensions': json.loads(current_event['event'])
+        'extensions': current_event.payload
     }
 
     caliper_event.update({
@@ -202,7 +201,7 @@ def seq_prev(current_event, caliper_event):
     caliper_object = {
         'id': current_event['referer'],
         'type': 'WebPage',
-        'extensions': json.loads(current_event['event'])
+        'extensions': current_event.payload
     }
 
     caliper_event.update({
@@ -240,7 +239,7 @@ def edx_course_student_notes_notes_page_viewed(current_event, caliper_event):
     caliper_object = {
         'id': current_event['referer'],
         'type': 'WebPage',
-        'extensions': json.loads(current_event['event'])
+        'extensions': current_event.payload
     }
 
     caliper_object['extensions'].update({
@@ -281,7 +280,7 @@ def seq_goto(current_event, caliper_event):
     caliper_object = {
         'id': current_event['referer'],
         'type': 'Page',
-        'extensions': json.loads(current_event['event'])
+        'extensions': current_event.payload
     }
 
     caliper_event.update({
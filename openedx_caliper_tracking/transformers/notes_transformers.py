@@ -1,7 +1,6 @@
 """
 Transformers for all the navigation events
 """
-import json
 
 
 def edx_course_student_notes_edited(current_event, caliper_event):
@@ -14,7 +13,7 @@ def edx_course_student_notes_edited(current_event, caliper_event):
     :return: updated caliper_event.
     """
 
-    object_extensions = json.loads(current_event['event'])
+    object_extensions = current_event.payload
 
     object_extensions.update({
         'course_id': current_event['context']['course_id'],
@@ -63,7 +62,7 @@ def edx_course_student_notes_added(current_event, caliper_event):
             'object': {
                 'id': current_event['referer'],
                 'type': 'DigitalResource',
-                'extensions': json.loads(current_event['event'])
+                'extensions': current_event.payload
             }
         }
     )
@@ -93,7 +92,7 @@ def edx_course_student_notes_viewed(current_event, caliper_event):
     caliper_object = {
         'id': current_event['referer'],
         'type': 'Document',
-        'extensions': json.loads(current_event['event'])
+        'extensions': current_event.payload
     }
 
     caliper_object['extensions'].update({
@@ -132,7 +131,7 @@ def edx_course_student_notes_deleted(current_event, caliper_event):
     :return: updated caliper_event.
     """
 
-    object_extensions = json.loads(current_event['event'])
+    object_extensions = current_event.payload
 
     object_extensions.update({
         'course_id': current_event['context']['course_id'],
@@ -177,7 +176,7 @@ def edx_course_student_notes_searched(current_event, caliper_event):
     caliper_object = {
         'id': current_event['referer'],
         'type': 'Document',
-        'extensions': json.loads(current_event['event'])
+        'extensions': current_event.payload
     }
 
     caliper_object['extensions'].update({
@@ -218,7 +217,7 @@ def edx_course_student_notes_used_unit_link(current_event, caliper_event):
     caliper_object = {
         'id': current_event['referer'],
         'type': 'WebPage',
-        'extensions': json.loads(current_event['event'])
+        'extensions': current_event.payload
     }
 
     caliper_object['extensions'].update({
@@ -1,7 +1,6 @@
 """
 Transformers for all the problems events
 """
-import json
 import logging
 from django.conf import settings
 
@@ -53,7 +52,7 @@ def problem_show(current_event, caliper_event):
     :param caliper_event: caliper_event log having some basic attributes.
     :return: updated caliper_event.
     """
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
 
     caliper_object = {
         'id': current_event['referer'],
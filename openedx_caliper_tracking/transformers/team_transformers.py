@@ -2,7 +2,6 @@
 Transformers for all the team events
 """
 
-import json
 from openedx_caliper_tracking import utils
 
 
@@ -15,7 +14,7 @@ def edx_team_page_viewed(current_event, caliper_event):
     :return: updated caliper_event.
     """
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
 
     caliper_object = {
         'id': current_event['page'],
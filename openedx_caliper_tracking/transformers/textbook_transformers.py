@@ -1,7 +1,6 @@
 """
 Transformers for all the textbook interaction events
 """
-import json
 
 
 def textbook_pdf_page_scrolled(current_event, caliper_event):
@@ -26,7 +25,7 @@ def textbook_pdf_page_scrolled(current_event, caliper_event):
         'ip': current_event['ip'],
     })
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     current_event_details.pop('name')
 
     caliper_event_object = {
@@ -64,7 +63,7 @@ def textbook_pdf_search_executed(current_event, caliper_event):
         'ip': current_event['ip'],
     })
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     current_event_details.pop('name')
 
     caliper_event_object = {
@@ -104,7 +103,7 @@ def textbook_pdf_page_navigated(current_event, caliper_event):
         'ip': current_event['ip'],
     })
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
 
     caliper_event_object = {
         'id': current_event['referer'],
@@ -146,7 +145,7 @@ def textbook_pdf_zoom_menu_changed(current_event, caliper_event):
         'ip': current_event['ip'],
     })
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
 
     caliper_event_object = {
         'id': current_event['referer'],
@@ -183,7 +182,7 @@ def book(current_event, caliper_event):
         'ip': current_event['ip'],
     })
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
 
     caliper_event_object = {
         'id': current_event['referer'],
@@ -225,7 +224,7 @@ def textbook_pdf_search_navigatednext(current_event, caliper_event):
     caliper_event_object = {
         'id': current_event['referer'],
         'type': 'Document',
-        'extensions': json.loads(current_event['event'])
+        'extensions': current_event.payload
     }
 
     caliper_event.update({
@@ -259,7 +258,7 @@ def textbook_pdf_thumbnail_navigated(current_event, caliper_event):
         'ip': current_event['ip'],
     })
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     current_event_details.pop('name')
 
     caliper_event_object = {
@@ -297,7 +296,7 @@ def textbook_pdf_zoom_buttons_changed(current_event, caliper_event):
         'ip': current_event['ip'],
     })
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
 
     caliper_event_object = {
         'id': current_event['referer'],
@@ -334,7 +333,7 @@ def textbook_pdf_searchcasesensitivity_toggled(current_event, caliper_event):
         'ip': current_event['ip'],
     })
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
 
     caliper_event_object = {
         'id': current_event['referer'],
@@ -373,7 +372,7 @@ def textbook_pdf_search_highlight_toggled(current_event, caliper_event):
         'ip': current_event['ip'],
     })
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
 
     caliper_event_object = {
         'id': current_event['referer'],
@@ -400,7 +399,7 @@ def textbook_pdf_thumbnails_toggled(current_event, caliper_event):
     :return: updated caliper_event.
     """
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     current_event_details.pop('name')
 
     caliper_event['actor'].update({
@@ -452,7 +451,7 @@ def textbook_pdf_display_scaled(current_event, caliper_event):
         'ip': current_event['ip'],
     })
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
 
     caliper_event_object = {
         'id': current_event['referer'],
@@ -477,7 +476,7 @@ def textbook_pdf_outline_toggled(current_event, caliper_event):
     :return: updated caliper_event.
     """
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
 
     current_event_details.pop('name')
 
@@ -530,7 +529,7 @@ def textbook_pdf_chapter_navigated(current_event, caliper_event):
         'ip': current_event['ip'],
     })
 
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
 
     caliper_event_object = {
         'id': current_event['referer'],
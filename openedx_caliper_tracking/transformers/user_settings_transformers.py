@@ -1,7 +1,6 @@
 """
 Transformers for all the user setting events
 """
-import json
 
 
 def edx_user_settings_viewed(current_event, caliper_event):
@@ -13,7 +12,7 @@ def edx_user_settings_viewed(current_event, caliper_event):
     :return: updated caliper_event.
     """
 
-    object_extensions = json.loads(current_event['event'])
+    object_extensions = current_event.payload
 
     caliper_object = {
         'id': current_event['referer'],
@@ -90,7 +89,7 @@ def edx_bi_course_upgrade_sidebarupsell_displayed(current_event, caliper_event):
     :param caliper_event: caliper_event log having some basic attributes.
     :return: updated caliper_event.
     """
-    object_extensions = json.loads(current_event['event'])
+    object_extensions = current_event.payload
 
     caliper_object = {
         'id': current_event['referer'],
@@ -2,7 +2,6 @@
 Transformers for all the video events
 """
 
-import json
 from datetime import timedelta
 
 from isodate import duration_isoformat
@@ -20,7 +19,7 @@ def pause_video(current_event, caliper_event):
     :param caliper_event: caliper_event log having some basic attributes.
     :return: updated caliper_event.
     """
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     caliper_event.update({
         'action': 'Paused',
         'type': 'MediaEvent',
@@ -64,7 +63,7 @@ def stop_video(current_event, caliper_event):
     :param caliper_event: caliper_event log having some basic attributes.
     :return: updated caliper_event.
     """
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     caliper_object = {
         'id': current_event['referer'],
         'type': 'VideoObject',
@@ -114,7 +113,7 @@ def edx_video_speed_changed(current_event, caliper_event):
         'name': current_event.get('username'),
         'type': 'Person'
     })
-    event_info = json.loads(current_event['event'])
+    event_info = current_event.payload
     caliper_event['object'] = {
         'id': current_event.get('referer'),
         'type': 'VideoObject',
@@ -143,7 +142,7 @@ def play_video(current_event, caliper_event):
     :return: final created log
     """
 
-    event_info = json.loads(current_event['event'])
+    event_info = current_event.payload
 
     caliper_event.update({
         'action': 'Started',
@@ -209,7 +208,7 @@ def load_video(current_event, caliper_event):
         'type': 'Person'
     })
 
-    event_info = json.loads(current_event['event'])
+    event_info = current_event.payload
 
     caliper_event['object'] = {
         'id': current_event.get('referer'),
@@ -235,7 +234,7 @@ def seek_video(current_event, caliper_event):
     :param caliper_event: log containing both basic and default attribute
     :return: final created log
     """
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     caliper_event.update({
         'action': 'JumpedTo',
         'type': 'MediaEvent',
@@ -283,7 +282,7 @@ def edx_video_closed_captions_shown(current_event, caliper_event):
     :param caliper_event: log containing both basic and default attribute
     :return: final created log
     """
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     caliper_event.update({
         'action': 'EnabledClosedCaptioning',
         'type': 'MediaEvent',
@@ -325,7 +324,7 @@ def edx_video_closed_captions_hidden(current_event, caliper_event):
     :param caliper_event: log containing both basic and default attribute
     :return: final created log
     """
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     caliper_event.update({
         'action': 'DisabledClosedCaptioning',
         'type': 'MediaEvent',
@@ -367,7 +366,7 @@ def hide_transcript(current_event, caliper_event):
     :param caliper_event: log containing both basic and default attribute
     :return: final created log
     """
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     caliper_event.update({
         'action': 'DisabledClosedCaptioning',
         'type': 'MediaEvent',
@@ -409,7 +408,7 @@ def show_transcript(current_event, caliper_event):
     :param caliper_event: log containing both basic and default attribute
     :return: final created log
     """
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     caliper_event.update({
         'action': 'EnabledClosedCaptioning',
         'type': 'MediaEvent',
@@ -451,7 +450,7 @@ def video_hide_cc_menu(current_event, caliper_event):
     :param caliper_event: log containing both basic and default attribute
     :return: final created log
     """
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     caliper_event.update({
         'action': 'Hid',
         'type': 'Event',
@@ -488,7 +487,7 @@ def video_show_cc_menu(current_event, caliper_event):
     :param caliper_event: log containing both basic and default attribute
     :return: final created log
     """
-    current_event_details = json.loads(current_event['event'])
+    current_event_details = current_event.payload
     caliper_event.update({
         'action': 'Showed',
         'type': 'Event',
@@ -0,0 +1,153 @@
+"""
+Templates of the LMS links put in caliper events.
+
+The routes used by the transformers are registered when the app is ready.
+Each of them is reversed once, with placeholder arguments, and the resulting
+path is kept as a template that links are made from with plain string
+substitution instead of running the URL resolver for every event.
+
+Routes whose path does not contain every placeholder exactly once, and
+values holding characters that ``reverse`` would quote, are reversed as
+usual. Values are not checked against the pattern of the route.
+"""
+import logging
+import re
+import threading
+
+from django.core.signals import setting_changed
+from django.urls import reverse
+from django.urls.exceptions import NoReverseMatch
+
+LOGGER = logging.getLogger(__name__)
+
+PLACEHOLDER = 'caliperurlparam{}'
+# Values that ``reverse`` puts in paths as they are.
+SAFE_VALUE = re.compile(r'^[A-Za-z0-9_.:+@~-]+$')
+
+NOT_SIMPLE = 'not simple'
+MISSING = 'missing'
+
+
+def compile_url_template(name, params):
+    """
+    Reverse a route with placeholder arguments and return its path as a format string.
+
+    @params
+    name: (str) name of the route
+    params: (tuple) names of the keyword arguments of the route
+
+    Returns ``NOT_SIMPLE`` if the path cannot be made by substitution, and
+    ``MISSING`` if the route does not exist.
+    """
+    placeholders = dict((param, PLACEHOLDER.format(index)) for index, param in enumerate(params))
+    try:
+        path = str(reverse(name, kwargs=placeholders))
+    except NoReverseMatch:
+        LOGGER.info('No "{}" URL pattern found.'.format(name))
+        return MISSING
+
+    template = path.replace('{', '{{').replace('}', '}}')
+    for param, placeholder in placeholders.items():
+        if path.count(placeholder) != 1:
+            LOGGER.info('"{}" URL pattern is not simple, it is reversed for every link.'.format(name))
+            return NOT_SIMPLE
+        template = template.replace(placeholder, '{' + param + '}')
+    return template
+
+
+class UrlTemplateRegistry(object):
+    """
+    Path templates of the registered routes, compiled on first use.
+
+    ``generation`` changes whenever a route is registered or the templates
+    are cleared, callers caching paths made by the registry key them on it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._templates = {}
+        self.generation = 0
+
+    def register(self, name, *params):
+        """
+        Register a route made of the given keyword arguments.
+        """
+        with self._lock:
+            self._routes[name] = tuple(params)
+            self._templates.pop(name, None)
+            self.generation += 1
+
+    def reverse(self, name, **kwargs):
+        """
+        Return the path of a route like ``reverse(name, kwargs=kwargs)`` does.
+
+        Raises ``NoReverseMatch`` if the route does not exist.
+        """
+        path = self.get_path(name, **kwargs)
+        if path is MISSING:
+            raise NoReverseMatch('Reverse for "{}" not found.'.format(name))
+        return path
+
+    def get_path(self, name, **kwargs):
+        """
+        Return the path of a route like ``reverse`` does, or ``MISSING`` if a registered route is known not to exist.
+
+        Routes are only reversed again when the templates are cleared.
+        """
+        template = self._get_template(name)
+        if template is MISSING:
+            return MISSING
+
+        if template is not None and template is not NOT_SIMPLE and sorted(kwargs) == sorted(self._routes[name]):
+            values = dict((param, str(value)) for param, value in kwargs.items())
+            if all(SAFE_VALUE.match(value) for value in values.values()):
+                return template.format(**values)
+
+        return str(reverse(name, kwargs=kwargs))
+
+    def _get_template(self, name):
+        template = self._templates.get(name)
+        if template is None and name in self._routes:
+            template = compile_url_template(name, self._routes[name])
+            with self._lock:
+                self._templates[name] = template
+        return template
+
+    def clear(self):
+        """
+        Forget the compiled templates, the routes stay registered.
+        """
+        with self._lock:
+            self._templates.clear()
+            self.generation += 1
+
+
+URL_TEMPLATES = UrlTemplateRegistry()
+
+
+def register_url_templates():
+    """
+    Register the routes of the links made by the transformers.
+    """
+    URL_TEMPLATES.register('learner_profile', 'username')
+    URL_TEMPLATES.register('about_course', 'course_id')
+    URL_TEMPLATES.register('certificates:html_view', 'user_id', 'course_id')
+
+
+def reverse_url(name, **kwargs):
+    """
+    Return the path of a route, made from its template if it has one.
+    """
+    return URL_TEMPLATES.reverse(name, **kwargs)
+
+
+def clear_url_templates(**kwargs):
+    """
+    Forget the compiled templates, they are cleared whenever the URLconf changes.
+    """
+    if kwargs.get('setting') in (None, 'ROOT_URLCONF'):
+        URL_TEMPLATES.clear()
+
+
+setting_changed.connect(clear_url_templates)
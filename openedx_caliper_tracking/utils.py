@@ -2,17 +2,28 @@
 Utils required in transformers
 """
 import logging
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
 from smtplib import SMTPException
 
 from dateutil.parser import parse
-from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.mail import send_mail
-from django.urls import reverse
+from django.core.signals import setting_changed
 from django.urls.exceptions import NoReverseMatch
 
+from openedx_caliper_tracking.lookup_cache import TOPIC_ID_CACHE, USERNAME_CACHE
+from openedx_caliper_tracking.url_templates import MISSING, URL_TEMPLATES, reverse_url
+
 log = logging.getLogger(__name__)
 UTC_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+# Timestamps with a UTC offset, as emitted by edX: "2018-10-16T14:23:24.785148+00:00".
+ISO_DATETIME = re.compile(
+    r'([1-9]\d{3})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(?:\.(\d{1,6}))?(Z|[+-](?:[01]\d|2[0-3]):?[0-5]\d)'
+)
+
+USER_LINK_CACHE_SIZE = 10000
 
 
 def convert_datetime(current_datetime):
@@ -20,8 +31,26 @@ def convert_datetime(current_datetime):
     Convert provided datetime into UTC format
     @param datetime: datetime string.
     :return: UTC formatted datetime string.
+
+    The ISO-8601 strings emitted by edX are parsed with ``ISO_DATETIME``,
+    anything else with dateutil.
     """
+    if type(current_datetime) == str:
+        match = ISO_DATETIME.fullmatch(current_datetime)
+        if match is None:
+            return _convert_datetime_with_dateutil(current_datetime)
+
+        year, month, day, hour, minute, second, fraction, offset = match.groups()
+        utc_datetime = datetime(
+            int(year), int(month), int(day), int(hour), int(minute), int(second),
+            int(fraction.ljust(6, '0')) if fraction else 0
+        ) - _get_utc_offset(offset)
+        return '{}Z'.format(utc_datetime.isoformat(timespec='milliseconds'))
+
+    return _convert_datetime_with_dateutil(current_datetime)
+
 
+def _convert_datetime_with_dateutil(current_datetime):
     # convert current_datetime to a datetime object if it is string
     if type(current_datetime) == str:
         current_datetime = parse(current_datetime)
@@ -35,43 +64,74 @@ def convert_datetime(current_datetime):
     return formatted_datetime
 
 
+@lru_cache(maxsize=64)
+def _get_utc_offset(offset):
+    if offset == 'Z':
+        return timedelta(0)
+    utc_offset = timedelta(hours=int(offset[1:3]), minutes=int(offset[-2:]))
+    return -utc_offset if offset[0] == '-' else utc_offset
+
+
 def get_username_from_user_id(user_id):
     """
     @param : user_id
     :return: username from the given user_id.
-    """
 
-    User = get_user_model()
-    user = User.objects.get(id=user_id)
-    return str(user.username)
+    Usernames are cached by ``lookup_cache`` and dropped when the user is saved.
+    """
+    return USERNAME_CACHE.get(user_id)
 
 
 def get_user_link_from_username(username):
+    """
+    @param username: username of the user
+    :return: link of the learner profile of the user, "<LMS_ROOT_URL>/u/<username>" if it cannot be reversed.
+
+    Links are made from the template of the ``learner_profile`` route of
+    ``url_templates.URL_TEMPLATES`` and kept in a bounded LRU cache, which is
+    keyed on the generation of the registry so that re-registering the route
+    is picked up.
+    """
+    return _get_user_link(settings.LMS_ROOT_URL, URL_TEMPLATES.generation, username)
+
+
+@lru_cache(maxsize=USER_LINK_CACHE_SIZE)
+def _get_user_link(lms_url, generation, username):  # pylint: disable=unused-argument
     try:
-        link = '{lms_url}{profile_link}'.format(
-            lms_url=settings.LMS_ROOT_URL,
-            profile_link=str(reverse(
-                'learner_profile',
-                kwargs={'username': username}
-            ))
-        )
+        profile_link = URL_TEMPLATES.get_path('learner_profile', username=username)
     except NoReverseMatch:
-        link = '{lms_url}/u/{username}'.format(
-            lms_url=settings.LMS_ROOT_URL,
+        profile_link = MISSING
+
+    if profile_link is MISSING:
+        return '{lms_url}/u/{username}'.format(
+            lms_url=lms_url,
             username=username
         )
-    return link
+    return '{lms_url}{profile_link}'.format(
+        lms_url=lms_url,
+        profile_link=profile_link
+    )
+
+
+def clear_user_link_cache(**kwargs):
+    """
+    Forget the cached profile links, they are cleared whenever the LMS root URL or the URLconf changes.
+    """
+    if kwargs.get('setting') in (None, 'LMS_ROOT_URL', 'ROOT_URLCONF'):
+        _get_user_link.cache_clear()
+
+
+setting_changed.connect(clear_user_link_cache)
 
 
 def get_topic_id_from_team_id(team_id):
     """
     :param team_id: extracting from event logs
     :return: topic_id for making team url
-    """
-    from lms.djangoapps.teams.models import CourseTeam
-    user_team = CourseTeam.objects.get(team_id=team_id)
 
-    return user_team.topic_id
+    Topic ids are cached by ``lookup_cache`` and dropped when the team is saved.
+    """
+    return TOPIC_ID_CACHE.get(team_id)
 
 
 def get_team_url_from_team_id(referer, team_id):
@@ -98,13 +158,11 @@ def get_certificate_url(user_id, course_id):
     """
     certificate_uri = '{lms_url}{certificate_link}'.format(
         lms_url=settings.LMS_ROOT_URL,
-        certificate_link=str(reverse(
+        certificate_link=reverse_url(
             'certificates:html_view',
-            kwargs={
-                'user_id': user_id,
-                'course_id': course_id
-            }
-        ))
+            user_id=user_id,
+            course_id=course_id
+        )
     )
     return certificate_uri
 
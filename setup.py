@@ -20,6 +20,9 @@ setup(
     install_requires=[
         'kafka-python==2.0.1'
     ],
+    extras_require={
+        'async': ['aiohttp'],
+    },
     classifiers=[
         'Environment :: Web Environment',
         'Framework :: Django',